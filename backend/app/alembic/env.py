@@ -7,7 +7,9 @@ from alembic import context
 
 from app.models.models import (  # noqa
     User, Document, DocField, Radio, Signatory, ReminderSettings, SignatureRequest,
-    RequestDocumentLink, RequestSignatoryLink, AuditLog, Item
+    RequestDocumentLink, RequestSignatoryLink, AuditLog, Item,
+    FinalizationJob, FinalizationJobDocument, DocumentPage, PageRenderJob,
+    PageCacheEntry, PageCacheCounter, UploadSession, Blob
 )
 from app.models.models import SQLModel
 
@@ -0,0 +1,33 @@
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Room for the multipart boundaries and the other form fields
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject uploads to ``path_prefix`` announcing a body larger than
+    ``max_upload_bytes`` with 413, before their body is parsed and spooled.
+    Uploads without a ``Content-Length`` are checked while being saved.
+    """
+
+    def __init__(self, app: ASGIApp, path_prefix: str, max_upload_bytes: int):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_body_bytes = max_upload_bytes + MULTIPART_OVERHEAD_BYTES
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] == "http"
+            and scope["method"] in ("POST", "PUT")
+            and scope["path"].startswith(self.path_prefix)
+        ):
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            if content_length.isdigit() and int(content_length) > self.max_body_bytes:
+                response = JSONResponse(
+                    {"detail": "Request body too large"}, status_code=413
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
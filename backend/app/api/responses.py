@@ -0,0 +1,203 @@
+import os
+import re
+from pathlib import Path
+
+import anyio
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.services.storage import (
+    content_disposition,
+    get_storage,
+    presigned_download_url,
+)
+
+# Versioned URLs never change content, private as they are all authorized
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+BYTE_RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def file_version(sha256: str) -> str:
+    """
+    Short version of a file, from its SHA-256, for the URLs serving it.
+    """
+    return sha256[:16]
+
+
+def strong_etag(version: str) -> str:
+    return f'"{version}"'
+
+
+def cache_headers(etag: str, immutable: bool = False) -> dict[str, str]:
+    return {
+        "etag": etag,
+        "cache-control": IMMUTABLE_CACHE_CONTROL
+        if immutable
+        else REVALIDATE_CACHE_CONTROL,
+        "accept-ranges": "bytes",
+    }
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Whether the ``If-None-Match`` header of ``request`` names ``etag``.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def not_modified_response(etag: str, immutable: bool = False) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, immutable))
+
+
+def parse_byte_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """
+    First and last byte of the single range of a ``Range`` header, ``None``
+    for multiple or malformed ranges, which are answered with the whole file.
+    """
+    match = BYTE_RANGE_PATTERN.fullmatch(range_header.strip())
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range, the last bytes of the file
+        start, end = size - min(int(last), size), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    if start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"content-range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+class PartialFileResponse(FileResponse):
+    """
+    One byte range of a file, answered with 206 Partial Content.
+    """
+
+    def __init__(self, path: Path, start: int, end: int, size: int, **kwargs):
+        super().__init__(path, status_code=206, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start, os.SEEK_SET)
+            more_body = True
+            while more_body:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining -= len(chunk)
+                more_body = remaining > 0 and chunk != b""
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": more_body,
+                    }
+                )
+
+
+def cached_file_response(
+    request: Request,
+    path: Path,
+    etag: str,
+    media_type: str,
+    immutable: bool = False,
+    filename: str | None = None,
+) -> Response:
+    """
+    Serve ``path`` with a strong ``etag``, answering ``If-None-Match`` with
+    304 Not Modified and a single range ``Range`` with 206 Partial Content.
+    ``immutable`` lets clients cache it for good, for URLs embedding the
+    version of their content.
+    """
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, immutable)
+    headers = cache_headers(etag, immutable)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header is not None and if_range in (None, etag):
+        size = path.stat().st_size
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range is not None:
+            return PartialFileResponse(
+                path,
+                *byte_range,
+                size=size,
+                headers=headers,
+                media_type=media_type,
+                filename=filename,
+            )
+    return FileResponse(path, headers=headers, media_type=media_type, filename=filename)
+
+
+def stored_file_response(
+    request: Request,
+    key: str,
+    etag: str,
+    media_type: str,
+    immutable: bool = False,
+    filename: str | None = None,
+) -> Response:
+    """
+    Serve the stored file ``key`` like ``cached_file_response``: from disk
+    with the local storage backend, otherwise redirected to a presigned URL
+    with ``STORAGE_PRESIGNED_DOWNLOADS``, or streamed from the backend.
+    """
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, immutable)
+    storage = get_storage()
+    if storage.is_local:
+        path = storage.local_path(key)
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="File not found")
+        return cached_file_response(
+            request, path, etag, media_type, immutable, filename
+        )
+    url = presigned_download_url(key, filename, media_type)
+    if url is not None:
+        return RedirectResponse(url, status_code=307)
+    size = storage.size(key)
+    if size is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    headers = cache_headers(etag, immutable)
+    if filename is not None:
+        headers["content-disposition"] = content_disposition(filename)
+    start, end, status_code = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header is not None and request.headers.get("if-range") in (None, etag):
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range is not None:
+            (start, end), status_code = byte_range, 206
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+    return StreamingResponse(
+        storage.stream(key, start, end) if size else iter(()),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )
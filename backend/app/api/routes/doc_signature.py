@@ -1,7 +1,6 @@
 import logging
 import random
 from datetime import datetime, timedelta
-from pathlib import Path
 
 from fastapi import APIRouter, Form, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse, JSONResponse
@@ -9,24 +8,27 @@ from fastapi.templating import Jinja2Templates
 from sqlmodel import select
 
 from app.api.deps import SessionDep
-from app.crud import audit_log_crud, signed_document_crud
+from app.crud import (
+    audit_log_crud,
+    field_crud,
+    finalization_job_crud,
+    page_render_job_crud,
+)
 from app.models.models import (
     AuditLogAction,
     Document,
     DocumentStatus,
+    PageRenderStatus,
     Signatory,
     SignatureRequest,
-    SignatureRequestStatus,
 )
-from app.schemas.schemas import AuditLogCreate, DocumentSignatureDetailsCreate
+from app.schemas.schemas import AuditLogCreate, FinalizationJobOut
 from app.services.file_service import (
-    add_fields_to_pdf,
-    apply_pdf_security,
-    generate_pdf_hash,
     send_otp_code,
+    verify_document_access_token,
     verify_secure_link_token,
 )
-from app.services.file_utils import convert_pdf_to_images
+from app.services.render_service import document_page_manifest
 from app.utils import send_signature_request_notification_email
 
 templates = Jinja2Templates(directory="signature-templates")
@@ -34,7 +36,6 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 otp_store = {}
-STATIC_FILES_DIR = Path("/app/static/document_files")
 
 
 @router.get("/sign_document", response_class=HTMLResponse)
@@ -60,7 +61,7 @@ def access_document_with_token(
             status_code=400, detail="No signature_request id in the payload"
         )
 
-    document_urls = []
+    documents = []
     for document_id in document_ids:
         document_statement = select(Document).where(Document.id == int(document_id))
         document = session.exec(document_statement).first()
@@ -69,21 +70,13 @@ def access_document_with_token(
                 status_code=404,
                 detail="No Document corresponding to the payload document id",
             )
-        folder_name = f"{document.owner_id}_{document.title}"
-        image_folder = STATIC_FILES_DIR / folder_name
-
-        if not image_folder.exists():
-            convert_pdf_to_images(
-                STATIC_FILES_DIR / f"{document.owner_id}_{document.file}", image_folder
-            )
-
-        # Ensure the images are already converted and available
-
-        image_urls = [
-            f"/api/v1/static/document_files/{document.owner_id}_{document.title}/page_{i}.png"
-            for i in range(1, len(list(image_folder.glob("*.png"))) + 1)
-        ]
-        document_urls.append(image_urls)
+        # Each page is rendered on its first request, unless the render worker
+        # already did. Documents whose page count is not known yet show a
+        # placeholder and poll /document_pages until the worker recorded it.
+        pages = document_page_manifest(document, token)
+        if pages is None:
+            page_render_job_crud.enqueue_page_render(session, document)
+        documents.append({"document_id": document.id, "pages": pages or []})
 
         if document.status != DocumentStatus.VIEWED:
             document.status = DocumentStatus.VIEWED
@@ -120,7 +113,7 @@ def access_document_with_token(
         "main_pages/signature.html",
         {
             "request": request,
-            "document_urls": document_urls,
+            "documents": documents,
             "first_name": signatory.first_name,
             "last_name": signatory.last_name,
             "email": signatory.email,
@@ -130,6 +123,51 @@ def access_document_with_token(
     )
 
 
+@router.get("/document_pages", response_class=JSONResponse)
+def read_document_pages(
+    *, session: SessionDep, token: str = Query(...), document_id: int = Query(...)
+):
+    """
+    Page image manifest of a document of a signing link, once its pages are
+    known.
+    """
+    verify_document_access_token(token, document_id)
+    document = session.get(Document, document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    pages = document_page_manifest(document, token)
+    if pages is not None:
+        return JSONResponse(content={"status": "ready", "pages": pages})
+    job = page_render_job_crud.get_latest_render_job(session, document_id)
+    if job is None or job.status == PageRenderStatus.FAILED:
+        return JSONResponse(content={"status": "failed", "pages": []})
+    return JSONResponse(content={"status": "rendering", "pages": []})
+
+
+@router.get("/signed_document_pages", response_class=JSONResponse)
+def read_signed_document_pages(
+    *, session: SessionDep, token: str = Query(...), document_id: int = Query(...)
+):
+    """
+    Page image manifest of the preview of the signed copy of a document of a
+    signing link, once it is signed.
+    """
+    verify_document_access_token(token, document_id)
+    document = session.get(Document, document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if document.status != DocumentStatus.SIGNED or not document.signature_details:
+        raise HTTPException(status_code=404, detail="Document not signed yet")
+
+    stamped_pages = field_crud.get_document_field_pages(session, document_id)
+    pages = document_page_manifest(document, token, stamped_pages)
+    if pages is None:
+        page_render_job_crud.enqueue_page_render(session, document)
+        return JSONResponse(content={"status": "rendering", "pages": []})
+    return JSONResponse(content={"status": "ready", "pages": pages})
+
+
 @router.post("/send_otp", response_class=JSONResponse)
 def send_otp(
     request: Request,
@@ -189,58 +227,39 @@ def verify_otp(
     if not signature_request:
         raise HTTPException(status_code=404, detail="Signature request not found")
 
-    signature_request.status = SignatureRequestStatus.COMPLETED
-    session.commit()
-
-    for document in signature_request.documents:
-        document.status = DocumentStatus.SIGNED
-        session.commit()
+    job = finalization_job_crud.enqueue_finalization_job(
+        session, signature_request, request.client.host
+    )
 
-        final_pdf_path = (
-            STATIC_FILES_DIR
-            / "signed_documents"
-            / f"{document.owner_id}_{document.file}"
-        )
-        for signatory in signature_request.signatories:
-            for field in signatory.fields:
-                if field.document_id == document.id:
-                    add_fields_to_pdf(
-                        document.file, field, signatory, document.owner_id
-                    )
-        apply_pdf_security(str(final_pdf_path))
-
-        pdf_hash = generate_pdf_hash(str(final_pdf_path))
-        logger.info(f"Generated hash for document {document.id}: {pdf_hash}")
-
-        document_signature_details = DocumentSignatureDetailsCreate(
-            document_id=document.id,
-            signed_hash=pdf_hash,
-            timestamp=datetime.now(),
-            ip_address=request.client.host,
-        )
-        signed_document_crud.create_document_signature_details(
-            session, document_signature_details
-        )
+    return JSONResponse(
+        content={"message": "Document successfully signed!", "job_id": job.id}
+    )
 
-    signed_documents = [final_pdf_path for document in signature_request.documents]
-    recipients = [signature_request.sender.email] + [
-        signatory.email for signatory in signature_request.signatories
-    ]
-    for recipient in recipients:
-        send_signature_request_notification_email(
-            email_to=recipient,
-            signature_request_name=signature_request.name,
-            signature_request_id=signature_request_id,
-            status=signature_request.status.value,
-            documents=signed_documents,
-        )
 
-    return JSONResponse(content={"message": "Document successfully signed!"})
+@router.get("/finalization/{job_id}", response_model=FinalizationJobOut)
+def read_finalization_job(job_id: int, session: SessionDep, token: str = Query(...)):
+    """
+    Report the finalization status of a job and of each of its documents, to
+    the holders of a secure link of its signature request.
+    """
+    payload = verify_secure_link_token(token)
+    if payload is None:
+        raise HTTPException(status_code=403, detail="Invalid or expired token")
+    job = finalization_job_crud.get_finalization_job(session, job_id)
+    # Jobs of other signature requests are not disclosed
+    signature_request_id = payload.get("signature_request_id")
+    if (
+        job is None
+        or signature_request_id is None
+        or job.signature_request_id != int(signature_request_id)
+    ):
+        raise HTTPException(status_code=404, detail="Finalization job not found")
+    return job
 
 
 @router.get("/success", response_class=HTMLResponse)
 def signature_success(request: Request):
     return templates.TemplateResponse(
         "main_pages/signature_success.html",
-        {"request": request, "message": "Document successfully signed!"}
+        {"request": request, "message": "Document successfully signed!"},
     )
@@ -1,22 +1,95 @@
 import logging
+from concurrent.futures import BrokenExecutor
 from pathlib import Path
 from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from sqlmodel import Session
 
 from app.api.deps import get_current_user, get_db
-from app.crud import document_crud
-from app.models.models import Document, User
-from app.schemas.schemas import DocumentCreate, DocumentOut, DocumentUpdate
-from app.services.file_service import save_file
+from app.api.responses import (
+    cached_file_response,
+    file_version,
+    is_not_modified,
+    not_modified_response,
+    stored_file_response,
+    strong_etag,
+)
+from app.core.config import settings
+from app.crud import (
+    document_crud,
+    field_crud,
+    page_render_job_crud,
+    upload_session_crud,
+)
+from app.models.models import Document, DocumentStatus, Message, UploadSession, User
+from app.schemas.schemas import (
+    DocumentCreate,
+    DocumentOut,
+    DocumentUpdate,
+    UploadSessionCreate,
+    UploadSessionOut,
+)
+from app.services.blob_store import (
+    document_file_key,
+    document_file_path,
+    incoming_path,
+    release_document_blob,
+    release_document_blobs,
+    store_upload,
+)
+from app.services.file_service import (
+    SavedUpload,
+    save_file,
+    verify_document_access_token,
+)
+from app.services.file_utils import extract_page_geometry
+from app.services.render_scheduler import RenderPriority, RenderQueueFull
+from app.services.render_service import (
+    RENDER_TIERS,
+    TILE_PYRAMID,
+    ensure_document_metadata,
+    get_page_image,
+    get_tile_image,
+    page_image_version,
+    signed_page_source,
+)
+from app.services.upload_service import (
+    append_upload_chunk,
+    assemble_upload,
+    delete_upload_session,
+    expire_upload_sessions,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# Define the base directory for the static files
-STATIC_FILES_DIR = Path("/app/static/document_files")
+# Seconds an overloaded render scheduler asks viewers to wait before retrying
+RENDER_RETRY_AFTER_SECONDS = 2
+
+
+def read_page_geometry(file_location: str):
+    """
+    Page geometry of an uploaded file, ``None`` when it cannot be read; the
+    stamping then falls back to reading it from the file.
+    """
+    try:
+        return extract_page_geometry(file_location)
+    except Exception:
+        logger.exception(f"Could not read the pages of {file_location}")
+        return None
 
 
 @router.post("/", response_model=DocumentOut)
@@ -27,23 +100,204 @@ async def create_document(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
 ) -> DocumentOut:
-    file_location = save_file(file, current_user.id)
+    upload = await save_file(file, incoming_path())
+    return await run_in_threadpool(
+        create_uploaded_document,
+        db,
+        title,
+        status,
+        file.filename,
+        current_user.id,
+        upload,
+    )
+
+
+def create_uploaded_document(
+    db: Session,
+    title: str,
+    status: str,
+    filename: str,
+    owner_id: int,
+    upload: SavedUpload,
+) -> Document:
+    """
+    Store an upload and create its document. Blocking, the async routes run
+    it in the threadpool.
+    """
+    pages = read_page_geometry(upload.path)
+    file_key = store_upload(db, upload)
     document_in = DocumentCreate(
         title=title,
         status=status,
-        file=file.filename,
+        file=filename,
+        owner_id=owner_id,
+        file_url=file_key,
+    )
+    document = document_crud.create_document(
+        db=db,
+        obj_in=document_in,
+        pages=pages,
+        file_hash=upload.sha256,
+        blob_sha256=upload.sha256,
+    )
+    page_render_job_crud.enqueue_page_render(db, document)
+    return document
+
+
+def get_owned_upload_session(
+    db: Session, upload_id: str, current_user: User
+) -> UploadSession:
+    upload_session = upload_session_crud.get_upload_session(db, upload_id)
+    if upload_session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload_session.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return upload_session
+
+
+@router.post("/uploads", response_model=UploadSessionOut, status_code=201)
+def create_upload_session(
+    upload_in: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Start a resumable upload, for large files over unreliable connections.
+
+    The file is then sent in chunks with ``PATCH /uploads/{upload_id}``, and
+    turned into a document with ``POST /uploads/{upload_id}/finalize``.
+    """
+    if upload_in.size > settings.DOCUMENT_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=(
+                f"Files larger than {settings.DOCUMENT_MAX_UPLOAD_BYTES} bytes "
+                "cannot be uploaded"
+            ),
+        )
+    expire_upload_sessions(db)
+    return upload_session_crud.create_upload_session(
+        db,
         owner_id=current_user.id,
-        file_url=str(file_location),
+        title=upload_in.title,
+        status=upload_in.status.value,
+        # Only the name, never a path out of the upload directory
+        filename=Path(upload_in.filename).name,
+        size=upload_in.size,
+    )
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionOut)
+def read_upload_session(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Progress of a resumable upload: ``offset`` is where to resume it from.
+    """
+    return get_owned_upload_session(db, upload_id, current_user)
+
+
+@router.patch("/uploads/{upload_id}", response_model=UploadSessionOut)
+async def upload_document_chunk(
+    request: Request,
+    upload_id: str,
+    upload_offset: int = Header(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Append the raw bytes of the request body to a resumable upload. The
+    ``Upload-Offset`` header must be the current offset of the upload,
+    otherwise the request is answered with 409 and the offset to resume from.
+    An interrupted chunk keeps the bytes received before the interruption.
+
+    The upload session stays locked while the chunk is received: a chunk
+    sent while another one is still being appended is answered with 409.
+    """
+    await run_in_threadpool(get_owned_upload_session, db, upload_id, current_user)
+    upload_session = await run_in_threadpool(
+        upload_session_crud.lock_upload_session, db, upload_id
+    )
+    if upload_session is None:
+        raise HTTPException(
+            status_code=409,
+            detail="Another chunk of this upload is being received",
+        )
+    if upload_offset != upload_session.offset:
+        raise HTTPException(
+            status_code=409,
+            detail=f"The upload resumes at offset {upload_session.offset}",
+            headers={"upload-offset": str(upload_session.offset)},
+        )
+    try:
+        offset = await append_upload_chunk(upload_session, request.stream())
+    except HTTPException as e:
+        if e.status_code == 415:
+            await run_in_threadpool(delete_upload_session, db, upload_session)
+        raise
+    # Committed, which releases the lock
+    return await run_in_threadpool(
+        upload_session_crud.set_upload_offset, db, upload_session, offset
+    )
+
+
+@router.post("/uploads/{upload_id}/finalize", response_model=DocumentOut)
+async def finalize_document_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Create the document of a complete resumable upload.
+    """
+    upload_session = await run_in_threadpool(
+        get_owned_upload_session, db, upload_id, current_user
     )
-    document = document_crud.create_document(db=db, obj_in=document_in)
+    if upload_session.offset != upload_session.size:
+        raise HTTPException(
+            status_code=409,
+            detail=(
+                f"Only {upload_session.offset} of the {upload_session.size} "
+                "bytes were uploaded"
+            ),
+            headers={"upload-offset": str(upload_session.offset)},
+        )
+    try:
+        upload = await run_in_threadpool(assemble_upload, upload_session)
+    except HTTPException:
+        await run_in_threadpool(delete_upload_session, db, upload_session)
+        raise
+    document = await run_in_threadpool(
+        create_uploaded_document,
+        db,
+        upload_session.title,
+        upload_session.status,
+        upload_session.filename,
+        current_user.id,
+        upload,
+    )
+    await run_in_threadpool(delete_upload_session, db, upload_session)
     return document
 
 
+@router.delete("/uploads/{upload_id}")
+def cancel_document_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Message:
+    upload_session = get_owned_upload_session(db, upload_id, current_user)
+    delete_upload_session(db, upload_session)
+    return Message(message="Upload cancelled")
+
+
 @router.get("/{document_id}", response_model=DocumentOut)
 def read_document(
     document_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
 ):
     """
     Get document details by ID, including download URL.
@@ -60,16 +314,263 @@ def read_document(
         created_at=document.created_at,
         updated_at=document.updated_at,
         owner=document.owner,
+        page_count=document.page_count,
+        pages=document.pages,
     )
     document_out.file_url = f"/api/v1/documents/{document_id}/download"
+    if document.file_hash is not None:
+        document_out.file_url += f"?v={file_version(document.file_hash)}"
     return document_out
 
 
+def render_unavailable() -> HTTPException:
+    """
+    Answer for a render the scheduler could not fit in, or whose process
+    died, the API itself stays available and the viewer retries.
+    """
+    return HTTPException(
+        status_code=503,
+        detail="Page rendering is overloaded, try again shortly",
+        headers={"retry-after": str(RENDER_RETRY_AFTER_SECONDS)},
+    )
+
+
+def page_image_response(
+    request: Request,
+    db: Session,
+    pdf_path: Path,
+    file_hash: str,
+    page_number: int,
+    tier: str,
+    version: Optional[str],
+    page_count: Optional[int] = None,
+):
+    if tier not in RENDER_TIERS:
+        raise HTTPException(status_code=404, detail="Unknown render tier")
+    current_version = page_image_version(file_hash, RENDER_TIERS[tier])
+    etag = strong_etag(f"{current_version}-{page_number}")
+    immutable = version == current_version
+    # Revalidations never touch the page cache
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, immutable)
+    priority = RenderPriority.FIRST_PAGE if page_number == 1 else RenderPriority.VIEW
+    try:
+        page_path = get_page_image(
+            db,
+            pdf_path,
+            file_hash,
+            page_number,
+            RENDER_TIERS[tier],
+            priority,
+            page_count,
+        )
+    except (RenderQueueFull, TimeoutError, BrokenExecutor) as e:
+        raise render_unavailable() from e
+    return cached_file_response(
+        request, page_path, etag, RENDER_TIERS[tier].media_type, immutable
+    )
+
+
+def page_tile_response(
+    request: Request,
+    db: Session,
+    pdf_path: Path,
+    file_hash: str,
+    page_number: int,
+    level: int,
+    column: int,
+    row: int,
+    version: Optional[str],
+):
+    current_version = page_image_version(file_hash, TILE_PYRAMID)
+    etag = strong_etag(f"{current_version}-{page_number}-{level}-{column}-{row}")
+    immutable = version == current_version
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, immutable)
+    try:
+        tile_path = get_tile_image(
+            db, pdf_path, file_hash, page_number, level, column, row
+        )
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail="Tile not found") from e
+    except (RenderQueueFull, TimeoutError, BrokenExecutor) as e:
+        raise render_unavailable() from e
+    return cached_file_response(
+        request, tile_path, etag, TILE_PYRAMID.media_type, immutable
+    )
+
+
+def get_document_with_page(db: Session, document_id: int, page_number: int) -> Document:
+    document = document_crud.get_document_by_id(db, document_id)
+    ensure_document_metadata(db, document)
+    if not 1 <= page_number <= document.page_count:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return document
+
+
+def get_signed_page_source(
+    db: Session, document_id: int, page_number: int
+) -> tuple[Path, str]:
+    document = get_document_with_page(db, document_id, page_number)
+    if document.status != DocumentStatus.SIGNED or not document.signature_details:
+        raise HTTPException(status_code=404, detail="Document not signed yet")
+    stamped_pages = field_crud.get_document_field_pages(db, document_id)
+    return signed_page_source(document, page_number, stamped_pages)
+
+
+@router.get("/{document_id}/pages/{page_number}", response_class=FileResponse)
+def read_document_page(
+    request: Request,
+    document_id: int,
+    page_number: int,
+    token: str = Query(...),
+    tier: str = Query("screen"),
+    v: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    One rendered page of a document at a render tier (thumbnail, screen or
+    zoom), for the holder of a signing link.
+
+    The page is rendered on its first request only, later ones are served
+    from the page cache, shared by all the documents with the same file.
+    Requested with the current version ``v`` of the images of the file, as
+    in the page manifest, it can be cached for good.
+    """
+    verify_document_access_token(token, document_id)
+    document = get_document_with_page(db, document_id, page_number)
+    return page_image_response(
+        request,
+        db,
+        document_file_path(document),
+        document.file_hash,
+        page_number,
+        tier,
+        v,
+        document.page_count,
+    )
+
+
+@router.get(
+    "/{document_id}/pages/{page_number}/tiles/{level}/{column}/{row}",
+    response_class=FileResponse,
+)
+def read_document_page_tile(
+    request: Request,
+    document_id: int,
+    page_number: int,
+    level: int,
+    column: int,
+    row: int,
+    token: str = Query(...),
+    v: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    One tile of the deep zoom pyramid of a page, for the holder of a signing
+    link. Level 0 holds the whole page in a single tile, each next level
+    doubles its resolution.
+    """
+    verify_document_access_token(token, document_id)
+    document = get_document_with_page(db, document_id, page_number)
+    return page_tile_response(
+        request,
+        db,
+        document_file_path(document),
+        document.file_hash,
+        page_number,
+        level,
+        column,
+        row,
+        v,
+    )
+
+
+@router.get("/{document_id}/signed-pages/{page_number}", response_class=FileResponse)
+def read_signed_document_page(
+    request: Request,
+    document_id: int,
+    page_number: int,
+    token: str = Query(...),
+    tier: str = Query("screen"),
+    v: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    One rendered page of the signed copy of a document, for the holder of a
+    signing link. Pages without fields are served from the renders of the
+    original, only the stamped ones are rendered from the signed copy.
+    """
+    verify_document_access_token(token, document_id)
+    pdf_path, file_hash = get_signed_page_source(db, document_id, page_number)
+    return page_image_response(request, db, pdf_path, file_hash, page_number, tier, v)
+
+
+@router.get(
+    "/{document_id}/signed-pages/{page_number}/tiles/{level}/{column}/{row}",
+    response_class=FileResponse,
+)
+def read_signed_document_page_tile(
+    request: Request,
+    document_id: int,
+    page_number: int,
+    level: int,
+    column: int,
+    row: int,
+    token: str = Query(...),
+    v: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """
+    One tile of a page of the signed copy of a document, for the holder of a
+    signing link.
+    """
+    verify_document_access_token(token, document_id)
+    pdf_path, file_hash = get_signed_page_source(db, document_id, page_number)
+    return page_tile_response(
+        request, db, pdf_path, file_hash, page_number, level, column, row, v
+    )
+
+
+def document_file_response(
+    request: Request,
+    db: Session,
+    document: Document,
+    filename: str,
+    version: Optional[str],
+):
+    file_key = document_file_key(document)
+    if file_key is not None:
+        return stored_file_response(
+            request,
+            file_key,
+            strong_etag(document.file_hash),
+            "application/pdf",
+            immutable=version == file_version(document.file_hash),
+            filename=filename,
+        )
+    # Stored before the blob store, on the local disk
+    file_path = document_file_path(document)
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    ensure_document_metadata(db, document)
+    return cached_file_response(
+        request,
+        file_path,
+        strong_etag(document.file_hash),
+        "application/pdf",
+        immutable=version == file_version(document.file_hash),
+        filename=filename,
+    )
+
+
 @router.get("/{document_id}/download", response_class=FileResponse)
 def download_document(
+    request: Request,
     document_id: int,
+    v: Optional[str] = Query(None),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
 ):
     """
     Download the PDF file by document ID.
@@ -78,28 +579,23 @@ def download_document(
     if not current_user.is_superuser and document.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    file_path = STATIC_FILES_DIR / f"{document.owner_id}_{document.file}"
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(path=file_path, filename=document.file, media_type="application/pdf")
+    return document_file_response(request, db, document, document.file, v)
 
 
 @router.get("/{document_id}/file", response_class=FileResponse)
 def get_document_file(
+    request: Request,
     document_id: int,
+    v: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> FileResponse:
+):
     document = document_crud.get_document_by_id(db, document_id)
     if not current_user.is_superuser and document.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    file_path = STATIC_FILES_DIR / f"{document.owner_id}_{document.file}"
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-
-    return FileResponse(
-        path=file_path, filename=file_path.name, media_type="application/pdf"
+    return document_file_response(
+        request, db, document, f"{document.owner_id}_{document.file}", v
     )
 
 
@@ -122,6 +618,8 @@ def read_documents(
             updated_at=doc.updated_at,
             owner=doc.owner,
             file_url=doc.file_url,
+            page_count=doc.page_count,
+            pages=doc.pages,
         )
         results.append(doc_out)
     return results
@@ -136,19 +634,57 @@ async def update_document(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> Any:
+    document = await run_in_threadpool(
+        get_owned_document, db, document_id, current_user
+    )
+    upload = None
+    if new_file:
+        upload = await save_file(new_file, incoming_path())
+    return await run_in_threadpool(
+        update_uploaded_document,
+        db,
+        document,
+        title,
+        status,
+        new_file.filename if new_file else None,
+        upload,
+    )
+
+
+def get_owned_document(db: Session, document_id: int, current_user: User) -> Document:
     document = db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     if not current_user.is_superuser and document.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    return document
 
-    if new_file:
-        file_location = save_file(new_file, current_user.id)
+
+def update_uploaded_document(
+    db: Session,
+    document: Document,
+    title: str | None,
+    status: str | None,
+    filename: str | None,
+    upload: SavedUpload | None,
+) -> Document:
+    """
+    Update a document, replacing its file with ``upload`` when one is given.
+    Blocking, the async routes run it in the threadpool.
+    """
+    pages = None
+    file_hash = None
+    if upload is not None:
+        pages = read_page_geometry(upload.path)
+        file_key = store_upload(db, upload)
+        file_hash = upload.sha256
+        # The replaced file is deleted if no other document shares it
+        release_document_blob(db, document)
         document_in = DocumentUpdate(
             title=title,
             status=status,
-            file=new_file.filename,
-            file_url=file_location,
+            file=filename,
+            file_url=file_key,
         )
     else:
         document_in = DocumentUpdate(
@@ -159,8 +695,15 @@ async def update_document(
         )
 
     updated_document = document_crud.update_document(
-        db=db, db_obj=document, obj_in=document_in
+        db=db,
+        db_obj=document,
+        obj_in=document_in,
+        pages=pages,
+        file_hash=file_hash,
+        blob_sha256=file_hash,
     )
+    if upload is not None:
+        page_render_job_crud.enqueue_page_render(db, updated_document)
     return updated_document
 
 
@@ -176,6 +719,7 @@ def delete_document(
     if not current_user.is_superuser and document.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
+    release_document_blobs(db, document)
     db.delete(document)
     db.commit()
     return {"message": "Document deleted successfully"}
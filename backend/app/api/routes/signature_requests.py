@@ -1,13 +1,23 @@
 import logging
 import sys
-from pathlib import Path
+from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import FileResponse
 from sqlmodel import Session, select
 
 from app.api.deps import get_current_user, get_db
-from app.crud import audit_log_crud, document_crud
+from app.api.responses import (
+    cached_file_response,
+    stored_file_response,
+    strong_etag,
+)
+from app.crud import (
+    audit_log_crud,
+    document_crud,
+    page_render_job_crud,
+    signed_document_crud,
+)
 from app.crud.signature_request_crud import (
     create_signature_request,
     delete_signature_request,
@@ -28,13 +38,15 @@ from app.models.models import (
 from app.schemas.schemas import (
     AuditLogCreate,
     DocumentOut,
+    DocumentSignatureDetailsCreate,
     ReminderSettingsSchema,
     SignatoryOut,
     SignatureRequestCreate,
     SignatureRequestRead,
     SignatureRequestUpdate,
 )
-from app.services.file_service import generate_secure_link
+from app.services.blob_store import signed_document_key, signed_document_path
+from app.services.file_service import generate_pdf_hash, generate_secure_link
 from app.utils import (
     send_signature_request_email,
     send_signature_request_notification_email,
@@ -49,7 +61,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-STATIC_FILES_DIR = Path("/app/static/document_files")
 
 
 @router.get("/", response_model=list[SignatureRequestRead])
@@ -85,6 +96,9 @@ def initiate_signature_request(
     signature_request_data = create_signature_request(
         db=db, request_data=signature_request, sender_id=current_user.id
     )
+    # Make sure the pages are rendered by the time the signers open their link
+    for document in signature_request_data.documents:
+        page_render_job_crud.enqueue_page_render(db, document)
 
     email_response = None
     if len(signature_request.signatories) == 1:
@@ -169,7 +183,7 @@ def initiate_signature_request(
     else:
         # Email sending failed, raise an error
         error_message = f"""
-            Failed to send email: {email_response.status_text if email_response else 'No response'}
+            Failed to send email: {email_response.status_text if email_response else "No response"}
         """
         logging.error(error_message)
         raise HTTPException(
@@ -285,9 +299,16 @@ def list_signature_request_signers(request_id: int, db: Session = Depends(get_db
     "/{signature_request_id}/documents/{document_id}/download",
     response_class=FileResponse,
 )
-async def download_signed_document(
-    signature_request_id: int, document_id: int, db: Session = Depends(get_db)
+def download_signed_document(
+    request: Request,
+    signature_request_id: int,
+    document_id: int,
+    db: Session = Depends(get_db),
 ):
+    """
+    Download a signed document. It is revalidated against the hash of the
+    signed file.
+    """
     # Verify if the document is associated with the signature request and is signed
     document = db.exec(
         select(Document).where(
@@ -302,11 +323,37 @@ async def download_signed_document(
             status_code=404, detail="Document not found or not signed yet"
         )
 
-    pdf_path = (
-        STATIC_FILES_DIR / "signed_documents" / f"{document.owner_id}_{document.file}"
-    )
-
-    # Assuming document.file_url is the path to the file on disk
-    return FileResponse(
-        path=pdf_path, filename=document.title, media_type="application/pdf"
+    signed_key = signed_document_key(document)
+    if signed_key is not None:
+        # Stored under its hash
+        return stored_file_response(
+            request,
+            signed_key,
+            strong_etag(document.signed_blob_sha256),
+            "application/pdf",
+            filename=document.title,
+        )
+    # Signed before the blob store, on the local disk
+    pdf_path = signed_document_path(document)
+    if not pdf_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+
+    if document.signature_details is None:
+        # Signed before its details were recorded: hashed once, when the
+        # signed copy is first downloaded
+        signed_document_crud.create_document_signature_details(
+            db,
+            DocumentSignatureDetailsCreate(
+                document_id=document.id,
+                signed_hash=generate_pdf_hash(pdf_path),
+                timestamp=datetime.fromtimestamp(pdf_path.stat().st_mtime),
+            ),
+        )
+        db.refresh(document)
+    return cached_file_response(
+        request,
+        pdf_path,
+        strong_etag(document.signature_details.signed_hash),
+        "application/pdf",
+        filename=document.title,
     )
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
-from app.api.deps import get_current_active_superuser
+from app.api.deps import SessionDep, get_current_active_superuser
 from app.models.models import Message
+from app.services.page_cache import page_cache_stats
+from app.services.render_service import get_render_scheduler
 from app.utils import generate_test_email, send_email
 
 router = APIRouter()
@@ -24,3 +26,27 @@ def test_email(email_to: EmailStr) -> Message:
         html_content=email_data.html_content,
     )
     return Message(message="Test email sent")
+
+
+@router.get(
+    "/page-cache-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def read_page_cache_stats(session: SessionDep) -> dict:
+    """
+    Size of the page image cache of the node answering, and hit, miss and
+    eviction counts of all of them.
+    """
+    return page_cache_stats(session)
+
+
+@router.get(
+    "/render-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def read_render_stats() -> dict:
+    """
+    Queue depth and counters of the page render scheduler of the API process
+    answering, each process having its own.
+    """
+    return get_render_scheduler().stats()
@@ -1,4 +1,6 @@
+import os
 import secrets
+import socket
 import warnings
 import logging
 from typing import Annotated, Any, Literal
@@ -43,9 +45,9 @@ class Settings(BaseSettings):
             return f"http://{self.DOMAIN}"
         return f"https://{self.DOMAIN}"
 
-    BACKEND_CORS_ORIGINS: Annotated[list[AnyUrl] | str, BeforeValidator(parse_cors)] = (
-        []
-    )
+    BACKEND_CORS_ORIGINS: Annotated[
+        list[AnyUrl] | str, BeforeValidator(parse_cors)
+    ] = []
 
     PROJECT_NAME: str
     SENTRY_DSN: HttpUrl | None = None
@@ -89,13 +91,15 @@ class Settings(BaseSettings):
     @property
     def emails_enabled(self) -> bool:
         logging.info("enabled email")
-        return all([
-            self.SMTP_HOST,
-            self.SMTP_PORT,
-            self.EMAILS_FROM_EMAIL,
-            self.SMTP_USER,
-            self.SMTP_PASSWORD,
-        ])
+        return all(
+            [
+                self.SMTP_HOST,
+                self.SMTP_PORT,
+                self.EMAILS_FROM_EMAIL,
+                self.SMTP_USER,
+                self.SMTP_PASSWORD,
+            ]
+        )
 
     EMAIL_TEST_USER: str = "test@example.com"
     FIRST_SUPERUSER: str
@@ -105,6 +109,119 @@ class Settings(BaseSettings):
     LAST_NAME: str
     ROLE: str
 
+    # Uploaded documents are streamed to disk and rejected once they grow
+    # past this size
+    DOCUMENT_MAX_UPLOAD_BYTES: int = 200 * 1024 * 1024
+    # Resumable uploads not sent a chunk for this long are deleted
+    UPLOAD_SESSION_TTL_SECONDS: int = 24 * 60 * 60
+
+    # Where the documents and their signed copies are stored, see
+    # app/services/storage.py: on the local disk, or in an S3-compatible
+    # object store shared by all the API nodes
+    STORAGE_BACKEND: Literal["local", "s3"] = "local"
+    # Local files: the stored files with the local backend, and with any
+    # backend the uploads being received, the page cache and the local copies
+    # of the stored files being rendered or signed
+    STORAGE_LOCAL_DIR: str = "/app/static/document_files"
+    STORAGE_S3_BUCKET: str | None = None
+    # Endpoint of an S3-compatible store such as MinIO, AWS when unset
+    STORAGE_S3_ENDPOINT_URL: str | None = None
+    STORAGE_S3_REGION: str = "us-east-1"
+    STORAGE_S3_ACCESS_KEY_ID: str | None = None
+    STORAGE_S3_SECRET_ACCESS_KEY: str | None = None
+    # Redirect downloads to short-lived presigned URLs of the object store,
+    # rather than streaming them through the API
+    STORAGE_PRESIGNED_DOWNLOADS: bool = False
+    STORAGE_PRESIGN_EXPIRES_SECONDS: int = 300
+    # Disk budget, on each node, of the local copies of the files of a remote
+    # backend; the least recently used are evicted past it
+    STORAGE_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+
+    @model_validator(mode="after")
+    def _require_storage_bucket(self) -> Self:
+        if self.STORAGE_BACKEND == "s3" and not self.STORAGE_S3_BUCKET:
+            raise ValueError("STORAGE_S3_BUCKET is required by the s3 backend")
+        return self
+
+    # Library drawing the fields onto the documents, see app/services/stamping.py
+    STAMPING_BACKEND: Literal["reportlab", "pymupdf"] = "reportlab"
+    # Restrict signed documents to printing with an owner password
+    SIGNED_PDF_ENCRYPTION: bool = True
+    # Memory budget of the decoded signature images kept by each process
+    SIGNATURE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Signed-document finalization runs in worker processes polling the
+    # finalizationjob table (see app/finalization_worker.py)
+    FINALIZATION_WORKERS: int = 2
+    FINALIZATION_POLL_INTERVAL_SECONDS: float = 2.0
+    # A running job not heard of for this long is considered abandoned by a
+    # crashed worker and handed to another one
+    FINALIZATION_JOB_TIMEOUT_SECONDS: int = 15 * 60
+    # Running jobs report progress this often, even while a single long
+    # document is being finalized; keep it well below the timeout
+    FINALIZATION_HEARTBEAT_SECONDS: int = 60
+    # Failed or abandoned jobs are queued again until they reach this number
+    # of attempts
+    FINALIZATION_MAX_ATTEMPTS: int = 3
+    # Size of the process pool each worker spreads the documents of a job on
+    FINALIZATION_PROCESS_POOL_SIZE: int = os.cpu_count() or 1
+    # Address space ceiling of each finalization process, unlimited when unset.
+    # A document going over it fails with a MemoryError instead of the whole
+    # worker being killed by the OOM killer.
+    FINALIZATION_MEMORY_LIMIT_BYTES: int | None = None
+    # Documents above this size are always finalized with the PyMuPDF backend,
+    # which only loads the pages receiving fields and copies the rest of the
+    # file through unchanged
+    FINALIZATION_STREAMING_THRESHOLD_BYTES: int = 50 * 1024 * 1024
+
+    # Pages of the documents are rasterized for the signing view by worker
+    # processes polling the pagerenderjob table (see app/render_worker.py)
+    RENDER_WORKERS: int = 1
+    RENDER_POLL_INTERVAL_SECONDS: float = 1.0
+    RENDER_JOB_TIMEOUT_SECONDS: int = 10 * 60
+    RENDER_MAX_ATTEMPTS: int = 3
+    # Processes each render worker splits the pages of a large document across
+    RENDER_PROCESS_POOL_SIZE: int = os.cpu_count() or 1
+    # Below this number of pages to render, a single process is faster
+    RENDER_PARALLEL_MIN_PAGES: int = 16
+    # Pages the API renders on demand go through a scheduler per API process,
+    # rendering at most this many at once in its own processes so that a
+    # burst of signers never starves the API of CPU
+    RENDER_MAX_CONCURRENCY: int = max(1, (os.cpu_count() or 1) // 2)
+    # Renders waiting for a free slot, past which prefetches are dropped and
+    # views answered with 503 Service Unavailable and Retry-After
+    RENDER_MAX_QUEUE_DEPTH: int = 64
+    # A view waiting longer gets a 503 too, the render goes on for its retry
+    RENDER_WAIT_TIMEOUT_SECONDS: float = 10.0
+    # Pages rendered ahead, at a lower priority, after a page missing from
+    # the cache is viewed
+    RENDER_PREFETCH_PAGES: int = 2
+    # Page images are rendered in three tiers: thumbnails for the page strip,
+    # screen-width images and high resolution images to zoom into
+    PAGE_IMAGE_FORMAT: Literal["webp", "png"] = "webp"
+    PAGE_IMAGE_QUALITY: int = 80
+    PAGE_THUMBNAIL_WIDTH: int = 160
+    PAGE_SCREEN_WIDTH: int = 1024
+    PAGE_ZOOM_DPI: int = 200
+    # Tiers the render workers render ahead, the others on first request
+    PAGE_PRERENDER_TIERS: list[str] = ["thumbnail", "screen"]
+    # Large-format pages (drawings, plans) are also cut into a pyramid of
+    # tiles, rendered on demand, so that viewers only fetch the visible part
+    # at the resolution they display it at, instead of a zoom tier image
+    PAGE_TILES_ENABLED: bool = True
+    # Longest side, in PDF points, from which pages are tiled: A1 and larger
+    PAGE_TILES_MIN_PAGE_SIZE: int = 2000
+    PAGE_TILE_SIZE: int = 256
+    PAGE_TILE_MAX_DPI: int = 300
+    # Disk budget of the page cache, the least recently served images are
+    # evicted past it
+    PAGE_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+    # The page cache lives on the local disk of each node, its index entries
+    # are kept under the node name. Set a stable name when the cache
+    # directory outlives the host, e.g. on a volume reattached to new
+    # containers.
+    PAGE_CACHE_NODE_NAME: str = socket.gethostname()
+
     def _check_default_secret(self, var_name: str, value: str | None) -> None:
         if value == "changethis":
             message = (
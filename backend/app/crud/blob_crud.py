@@ -0,0 +1,54 @@
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.models.models import Blob
+
+
+def get_blob(session: Session, sha256: str) -> Blob | None:
+    return session.get(Blob, sha256)
+
+
+def acquire_blob(session: Session, sha256: str, size_bytes: int) -> None:
+    """
+    Count one more reference to a blob, recording it on its first one.
+    """
+    statement = (
+        update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1)
+    )
+    if session.exec(statement).rowcount == 0:
+        session.add(Blob(sha256=sha256, size_bytes=size_bytes, ref_count=1))
+
+
+def release_blob(session: Session, sha256: str) -> bool:
+    """
+    Drop one reference to a blob and return whether it was the last one.
+    The row is kept, without references, until its file is deleted once the
+    transaction is committed.
+    """
+    statement = select(Blob).where(Blob.sha256 == sha256).with_for_update()
+    blob = session.exec(statement).first()
+    if blob is None:
+        return False
+    blob.ref_count -= 1
+    session.add(blob)
+    return blob.ref_count <= 0
+
+
+def lock_unreferenced_blob(session: Session, sha256: str) -> Blob | None:
+    """
+    Lock a blob that has no reference left, so that nobody takes a new one
+    while its file is deleted. ``None`` when it got one meanwhile.
+    """
+    statement = (
+        select(Blob).where(Blob.sha256 == sha256, Blob.ref_count <= 0).with_for_update()
+    )
+    return session.exec(statement).first()
+
+
+def get_unreferenced_blobs(session: Session, limit: int = 100) -> list[Blob]:
+    statement = select(Blob).where(Blob.ref_count <= 0).limit(limit)
+    return list(session.exec(statement).all())
+
+
+def delete_blob(session: Session, blob: Blob) -> None:
+    session.delete(blob)
@@ -1,11 +1,35 @@
-from sqlmodel import Session, select
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, func, select
 from fastapi import HTTPException
-from app.models.models import Document, User
+from app.models.models import Document, DocumentPage, DocumentStatus, User
 from app.schemas.schemas import DocumentCreate, DocumentUpdate
-from app.services.file_utils import generate_file_url
+from app.services.file_utils import PageGeometry, generate_file_url
 
 
-def create_document(db: Session, *, obj_in: DocumentCreate) -> Document:
+def set_document_pages(db_obj: Document, pages: list[PageGeometry]) -> None:
+    db_obj.page_count = len(pages)
+    db_obj.pages = [
+        DocumentPage(
+            page_number=page.page_number,
+            width=page.width,
+            height=page.height,
+            rotation=page.rotation,
+            origin_x=page.origin_x,
+            origin_y=page.origin_y,
+        )
+        for page in pages
+    ]
+
+
+def create_document(
+    db: Session,
+    *,
+    obj_in: DocumentCreate,
+    pages: list[PageGeometry] | None = None,
+    file_hash: str | None = None,
+    blob_sha256: str | None = None,
+) -> Document:
     file_url = generate_file_url(obj_in.file)
     db_obj = Document(
         title=obj_in.title,
@@ -13,14 +37,26 @@ def create_document(db: Session, *, obj_in: DocumentCreate) -> Document:
         file=obj_in.file,
         file_url=file_url,
         owner_id=obj_in.owner_id,
+        file_hash=file_hash,
+        blob_sha256=blob_sha256,
     )
+    if pages is not None:
+        set_document_pages(db_obj, pages)
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
     return db_obj
 
 
-def update_document(db: Session, *, db_obj: Document, obj_in: DocumentUpdate) -> Document:
+def update_document(
+    db: Session,
+    *,
+    db_obj: Document,
+    obj_in: DocumentUpdate,
+    pages: list[PageGeometry] | None = None,
+    file_hash: str | None = None,
+    blob_sha256: str | None = None,
+) -> Document:
     if obj_in.title is not None:
         db_obj.title = obj_in.title
     if obj_in.status is not None:
@@ -28,6 +64,12 @@ def update_document(db: Session, *, db_obj: Document, obj_in: DocumentUpdate) ->
     if obj_in.file is not None:
         db_obj.file = obj_in.file
         db_obj.file_url = generate_file_url(obj_in.file)
+    if pages is not None:
+        set_document_pages(db_obj, pages)
+    if file_hash is not None:
+        db_obj.file_hash = file_hash
+    if blob_sha256 is not None:
+        db_obj.blob_sha256 = blob_sha256
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
@@ -49,8 +91,83 @@ def get_document_by_id(db: Session, document_id: int) -> Document:
     return document
 
 
-def get_documents_by_user(db: Session, user: User, skip: int, limit: int) -> list[Document]:
-    statement = select(Document).offset(skip).limit(limit)
+def get_documents_by_user(
+    db: Session, user: User, skip: int, limit: int
+) -> list[Document]:
+    statement = (
+        select(Document).options(selectinload(Document.pages)).offset(skip).limit(limit)
+    )
     if not user.is_superuser:
         statement = statement.where(Document.owner_id == user.id)
     return db.exec(statement).all()
+
+
+def has_legacy_file():
+    return Document.blob_sha256.is_(None)
+
+
+def has_legacy_signed_file():
+    return and_(
+        Document.status == DocumentStatus.SIGNED,
+        Document.signed_blob_sha256.is_(None),
+    )
+
+
+def get_documents_with_legacy_files(
+    db: Session, after_id: int, limit: int
+) -> list[Document]:
+    """
+    Documents whose file or signed copy is stored where it was before the
+    blob store, by id from ``after_id`` on.
+    """
+    statement = (
+        select(Document)
+        .where(Document.id > after_id, or_(has_legacy_file(), has_legacy_signed_file()))
+        .order_by(Document.id)
+        .limit(limit)
+    )
+    return db.exec(statement).all()
+
+
+def get_document_page(
+    db: Session, document_id: int, page_number: int
+) -> DocumentPage | None:
+    statement = select(DocumentPage).where(
+        DocumentPage.document_id == document_id,
+        DocumentPage.page_number == page_number,
+    )
+    return db.exec(statement).first()
+
+
+def lock_document(db: Session, document_id: int) -> Document | None:
+    """
+    Lock a document until the transaction ends, unless another transaction
+    already holds it.
+    """
+    statement = (
+        select(Document)
+        .where(Document.id == document_id)
+        .with_for_update(skip_locked=True)
+        .execution_options(populate_existing=True)
+    )
+    return db.exec(statement).first()
+
+
+def count_documents_sharing_legacy_file(
+    db: Session, document: Document, signed: bool = False
+) -> int:
+    """
+    Count the other documents still stored at the same place as ``document``
+    was before the blob store: files were named after their owner and name.
+    """
+    statement = (
+        select(func.count())
+        .select_from(Document)
+        .where(
+            Document.id != document.id,
+            Document.owner_id == document.owner_id,
+            Document.file == document.file,
+            has_legacy_signed_file() if signed else has_legacy_file(),
+        )
+    )
+    return db.exec(statement).one()
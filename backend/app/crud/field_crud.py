@@ -1,14 +1,66 @@
 import logging
 
 from fastapi import HTTPException
-from sqlmodel import Session
+from sqlmodel import Session, select
 
-from app.models.models import DocField, FieldType, Radio
+from app.crud.document_crud import get_document_page
+from app.models.models import DocField, Document, FieldType, Radio
 from app.schemas.schemas import FieldCreate, FieldUpdate
+from app.services.file_utils import upright_size
 
 logger = logging.getLogger(__name__)
 
 
+def get_document_field_pages(session: Session, document_id: int) -> set[int]:
+    """
+    Numbers of the pages of a document carrying at least one field.
+    """
+    statement = (
+        select(DocField.page).where(DocField.document_id == document_id).distinct()
+    )
+    return set(session.exec(statement).all())
+
+
+def validate_field_placement(
+    db: Session, document: Document | None, field_data: FieldCreate
+) -> None:
+    """
+    Check that a field lands on an existing page and inside it, as displayed,
+    when the page geometry of the document is known.
+    """
+    if document is None or document.page_count is None:
+        return
+    if not 1 <= field_data.page <= document.page_count:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Page {field_data.page} does not exist, the document has "
+            f"{document.page_count} pages",
+        )
+    page = get_document_page(db, document.id, field_data.page)
+    if page is None:
+        return
+    # Fields on rotated pages are placed in their upright frame
+    width, height = upright_size(page)
+    points = [(field_data.x, field_data.y)]
+    if field_data.x is not None and field_data.y is not None:
+        points.append(
+            (
+                field_data.x + (field_data.width or 0),
+                field_data.y + (field_data.height or 0),
+            )
+        )
+    points.extend((radio.x, radio.y) for radio in field_data.radios or [])
+    for x, y in points:
+        if x is None or y is None:
+            continue
+        if not (0 <= x <= width and 0 <= y <= height):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Field coordinates ({x}, {y}) are outside page "
+                f"{page.page_number} ({width} x {height})",
+            )
+
+
 def create_field(
     db: Session, field_data: FieldCreate, signature_request_id: int, document_id: int
 ) -> DocField:
@@ -21,6 +73,7 @@ def create_field(
         field_data.validate_fields()
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    validate_field_placement(db, db.get(Document, document_id), field_data)
 
     # Create the DocField explicitly
     db_field = DocField(
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, or_, select
+
+from app.core.config import settings
+from app.models.models import (
+    FinalizationJob,
+    FinalizationJobDocument,
+    FinalizationJobStatus,
+    SignatureRequest,
+)
+
+
+def enqueue_finalization_job(
+    session: Session, signature_request: SignatureRequest, ip_address: str | None
+) -> FinalizationJob:
+    """
+    Queue the finalization of every document of a signature request.
+
+    A request that already has a pending job gets that job back instead of
+    a duplicate.
+    """
+    statement = select(FinalizationJob).where(
+        FinalizationJob.signature_request_id == signature_request.id,
+        FinalizationJob.status.in_(
+            [FinalizationJobStatus.QUEUED, FinalizationJobStatus.RUNNING]
+        ),
+    )
+    pending_job = session.exec(statement).first()
+    if pending_job:
+        return pending_job
+
+    job = FinalizationJob(
+        signature_request_id=signature_request.id, ip_address=ip_address
+    )
+    job.documents = [
+        FinalizationJobDocument(document_id=document.id)
+        for document in signature_request.documents
+    ]
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def claim_next_job(session: Session) -> FinalizationJob | None:
+    """
+    Lock the oldest queued job and mark it running.
+
+    Running jobs whose worker has not reported progress for
+    ``FINALIZATION_JOB_TIMEOUT_SECONDS`` are claimed again as well: their
+    worker crashed. Those that already used all their attempts, such as a
+    document crashing its worker every time, are marked failed instead.
+    ``SKIP LOCKED`` lets any number of workers poll the table concurrently
+    without handing the same job to two of them.
+    """
+    stale_before = datetime.now() - timedelta(
+        seconds=settings.FINALIZATION_JOB_TIMEOUT_SECONDS
+    )
+    statement = (
+        select(FinalizationJob)
+        .where(
+            or_(
+                FinalizationJob.status == FinalizationJobStatus.QUEUED,
+                (FinalizationJob.status == FinalizationJobStatus.RUNNING)
+                & (FinalizationJob.updated_at < stale_before),
+            )
+        )
+        .order_by(FinalizationJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    while True:
+        job = session.exec(statement).first()
+        if job is None:
+            return None
+        if (
+            job.status != FinalizationJobStatus.RUNNING
+            or job.attempts < settings.FINALIZATION_MAX_ATTEMPTS
+        ):
+            break
+        fail_abandoned_job(session, job)
+
+    job.status = FinalizationJobStatus.RUNNING
+    job.started_at = datetime.now()
+    job.updated_at = job.started_at
+    job.attempts += 1
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def fail_abandoned_job(session: Session, job: FinalizationJob) -> None:
+    error = f"Worker lost {job.attempts} times"
+    for job_document in job.documents:
+        if job_document.status == FinalizationJobStatus.RUNNING:
+            job_document.status = FinalizationJobStatus.FAILED
+            job_document.error = error
+            session.add(job_document)
+    set_job_status(session, job, FinalizationJobStatus.FAILED, error)
+
+
+def get_finalization_job(session: Session, job_id: int) -> FinalizationJob | None:
+    return session.get(FinalizationJob, job_id)
+
+
+def set_job_status(
+    session: Session,
+    job: FinalizationJob | FinalizationJobDocument,
+    status: FinalizationJobStatus,
+    error: str | None = None,
+) -> None:
+    job.status = status
+    job.error = error
+    if isinstance(job, FinalizationJob):
+        job.updated_at = datetime.now()
+        if status in (FinalizationJobStatus.DONE, FinalizationJobStatus.FAILED):
+            job.finished_at = datetime.now()
+    session.add(job)
+    session.commit()
+
+
+def touch_job(session: Session, job: FinalizationJob) -> None:
+    """
+    Record that the worker running ``job`` is still alive. Not committed.
+    """
+    job.updated_at = datetime.now()
+    session.add(job)
+
+
+def retry_or_fail_job(session: Session, job: FinalizationJob, error: str) -> None:
+    """
+    Queue a failed job again, unless it used all its attempts.
+    """
+    if job.attempts < settings.FINALIZATION_MAX_ATTEMPTS:
+        set_job_status(session, job, FinalizationJobStatus.QUEUED, error)
+    else:
+        set_job_status(session, job, FinalizationJobStatus.FAILED, error)
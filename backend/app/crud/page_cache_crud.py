@@ -0,0 +1,126 @@
+from datetime import datetime
+
+from sqlalchemy import String, delete, func, literal, update
+from sqlmodel import Session, select
+
+from app.models.models import PageCacheCounter, PageCacheEntry
+
+COUNTERS = ("hits", "misses", "evictions")
+
+
+def get_entry(session: Session, node: str, key: str) -> PageCacheEntry | None:
+    return session.get(PageCacheEntry, (node, key))
+
+
+def upsert_entry(
+    session: Session, node: str, key: str, file_hash: str, size_bytes: int
+) -> PageCacheEntry:
+    entry = session.get(PageCacheEntry, (node, key))
+    if entry is None:
+        entry = PageCacheEntry(
+            node=node, key=key, file_hash=file_hash, size_bytes=size_bytes
+        )
+    else:
+        entry.size_bytes = size_bytes
+        entry.last_accessed_at = datetime.now()
+    session.add(entry)
+    return entry
+
+
+def touch_entry(session: Session, entry: PageCacheEntry) -> None:
+    entry.last_accessed_at = datetime.now()
+    session.add(entry)
+
+
+def get_total_size(session: Session, node: str) -> int:
+    statement = select(func.coalesce(func.sum(PageCacheEntry.size_bytes), 0)).where(
+        PageCacheEntry.node == node
+    )
+    return session.exec(statement).one()
+
+
+def count_entries(session: Session, node: str) -> int:
+    statement = (
+        select(func.count())
+        .select_from(PageCacheEntry)
+        .where(PageCacheEntry.node == node)
+    )
+    return session.exec(statement).one()
+
+
+def lock_least_recently_used(
+    session: Session, node: str, limit: int, exclude: list[str] | None = None
+) -> list[PageCacheEntry]:
+    """
+    Lock the ``limit`` least recently served entries of a node, skipping
+    those another process is already evicting.
+    """
+    statement = select(PageCacheEntry).where(PageCacheEntry.node == node)
+    if exclude:
+        statement = statement.where(PageCacheEntry.key.not_in(exclude))
+    statement = (
+        statement.order_by(PageCacheEntry.last_accessed_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return list(session.exec(statement).all())
+
+
+def delete_entries(session: Session, node: str, keys: list[str]) -> None:
+    session.exec(
+        delete(PageCacheEntry).where(
+            PageCacheEntry.node == node, PageCacheEntry.key.in_(keys)
+        )
+    )
+
+
+def move_entries(session: Session, node: str, old_prefix: str, new_prefix: str) -> int:
+    """
+    Rewrite the keys of a node starting with ``old_prefix`` to start with
+    ``new_prefix`` instead, and return how many there were.
+    """
+    new_key = literal(new_prefix, String) + func.substr(
+        PageCacheEntry.key, len(old_prefix) + 1
+    )
+    statement = (
+        update(PageCacheEntry)
+        .where(
+            PageCacheEntry.node == node,
+            PageCacheEntry.key.startswith(old_prefix, autoescape=True),
+        )
+        .values(key=new_key)
+        .execution_options(synchronize_session=False)
+    )
+    return session.exec(statement).rowcount
+
+
+def delete_entries_with_prefix(session: Session, node: str, prefix: str) -> int:
+    statement = (
+        delete(PageCacheEntry)
+        .where(
+            PageCacheEntry.node == node,
+            PageCacheEntry.key.startswith(prefix, autoescape=True),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return session.exec(statement).rowcount
+
+
+def increment_counter(session: Session, name: str, amount: int = 1) -> None:
+    if amount == 0:
+        return
+    statement = (
+        update(PageCacheCounter)
+        .where(PageCacheCounter.name == name)
+        .values(value=PageCacheCounter.value + amount)
+    )
+    # The migration creates the counters, this only covers fresh test tables
+    if session.exec(statement).rowcount == 0:
+        session.add(PageCacheCounter(name=name, value=amount))
+
+
+def get_counters(session: Session) -> dict[str, int]:
+    counters = dict.fromkeys(COUNTERS, 0)
+    for counter in session.exec(select(PageCacheCounter)).all():
+        counters[counter.name] = counter.value
+    return counters
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, or_, select
+
+from app.core.config import settings
+from app.models.models import Document, PageRenderJob, PageRenderStatus
+
+
+def enqueue_page_render(session: Session, document: Document) -> PageRenderJob:
+    """
+    Queue the rendering of the pages of a document, unless it is already
+    pending.
+    """
+    statement = select(PageRenderJob).where(
+        PageRenderJob.document_id == document.id,
+        PageRenderJob.status.in_([PageRenderStatus.QUEUED, PageRenderStatus.RUNNING]),
+    )
+    pending_job = session.exec(statement).first()
+    if pending_job:
+        return pending_job
+
+    job = PageRenderJob(document_id=document.id)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def claim_next_render_job(session: Session) -> PageRenderJob | None:
+    """
+    Lock the oldest queued render job, or one abandoned by a crashed worker,
+    and mark it running. Abandoned jobs that already used all their attempts,
+    such as a document crashing the renderer every time, are marked failed
+    instead.
+    """
+    stale_before = datetime.now() - timedelta(
+        seconds=settings.RENDER_JOB_TIMEOUT_SECONDS
+    )
+    statement = (
+        select(PageRenderJob)
+        .where(
+            or_(
+                PageRenderJob.status == PageRenderStatus.QUEUED,
+                (PageRenderJob.status == PageRenderStatus.RUNNING)
+                & (PageRenderJob.updated_at < stale_before),
+            )
+        )
+        .order_by(PageRenderJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    while True:
+        job = session.exec(statement).first()
+        if job is None:
+            return None
+        if (
+            job.status != PageRenderStatus.RUNNING
+            or job.attempts < settings.RENDER_MAX_ATTEMPTS
+        ):
+            break
+        set_render_job_status(
+            session, job, PageRenderStatus.FAILED, f"Worker lost {job.attempts} times"
+        )
+
+    job.status = PageRenderStatus.RUNNING
+    job.started_at = datetime.now()
+    job.updated_at = job.started_at
+    job.attempts += 1
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def get_latest_render_job(session: Session, document_id: int) -> PageRenderJob | None:
+    statement = (
+        select(PageRenderJob)
+        .where(PageRenderJob.document_id == document_id)
+        .order_by(PageRenderJob.created_at.desc())
+        .limit(1)
+    )
+    return session.exec(statement).first()
+
+
+def set_render_job_status(
+    session: Session,
+    job: PageRenderJob,
+    status: PageRenderStatus,
+    error: str | None = None,
+) -> None:
+    job.status = status
+    job.error = error
+    job.updated_at = datetime.now()
+    if status in (PageRenderStatus.DONE, PageRenderStatus.FAILED):
+        job.finished_at = datetime.now()
+    session.add(job)
+    session.commit()
+
+
+def retry_or_fail_render_job(session: Session, job: PageRenderJob, error: str) -> None:
+    """
+    Queue a failed render job again, unless it used all its attempts.
+    """
+    if job.attempts < settings.RENDER_MAX_ATTEMPTS:
+        set_render_job_status(session, job, PageRenderStatus.QUEUED, error)
+    else:
+        set_render_job_status(session, job, PageRenderStatus.FAILED, error)
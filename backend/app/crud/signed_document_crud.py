@@ -6,8 +6,24 @@ from app.schemas.schemas import DocumentSignatureDetailsCreate
 def create_document_signature_details(
     session: Session, signature_details_create: DocumentSignatureDetailsCreate
 ) -> DocumentSignatureDetails:
-    signature_details = DocumentSignatureDetails(**signature_details_create.model_dump())
+    signature_details = DocumentSignatureDetails(
+        **signature_details_create.model_dump()
+    )
     session.add(signature_details)
     session.commit()
     session.refresh(signature_details)
     return signature_details
+
+
+def add_document_signature_details(
+    session: Session, signature_details_create: DocumentSignatureDetailsCreate
+) -> DocumentSignatureDetails:
+    """
+    Stage the signature details in the session without committing, so they
+    can be written in the same transaction as other finalization results.
+    """
+    signature_details = DocumentSignatureDetails(
+        **signature_details_create.model_dump()
+    )
+    session.add(signature_details)
+    return signature_details
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.models import UploadSession
+
+
+def session_expiry() -> datetime:
+    return datetime.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS)
+
+
+def create_upload_session(
+    session: Session,
+    *,
+    owner_id: int,
+    title: str,
+    status: str,
+    filename: str,
+    size: int,
+) -> UploadSession:
+    upload_session = UploadSession(
+        owner_id=owner_id,
+        title=title,
+        status=status,
+        filename=filename,
+        size=size,
+        expires_at=session_expiry(),
+    )
+    session.add(upload_session)
+    session.commit()
+    session.refresh(upload_session)
+    return upload_session
+
+
+def get_upload_session(session: Session, upload_id: str) -> UploadSession | None:
+    """
+    An upload session, ``None`` once it expired.
+    """
+    upload_session = session.get(UploadSession, upload_id)
+    if upload_session is None or upload_session.expires_at < datetime.now():
+        return None
+    return upload_session
+
+
+def lock_upload_session(session: Session, upload_id: str) -> UploadSession | None:
+    """
+    Lock an upload session until the transaction ends, so that a single
+    chunk is appended to it at a time. ``None`` when another transaction
+    already holds it.
+    """
+    statement = (
+        select(UploadSession)
+        .where(UploadSession.id == upload_id)
+        .with_for_update(skip_locked=True)
+        .execution_options(populate_existing=True)
+    )
+    return session.exec(statement).first()
+
+
+def set_upload_offset(
+    session: Session, upload_session: UploadSession, offset: int
+) -> UploadSession:
+    upload_session.offset = offset
+    upload_session.updated_at = datetime.now()
+    # Each chunk received extends the session
+    upload_session.expires_at = session_expiry()
+    session.add(upload_session)
+    session.commit()
+    session.refresh(upload_session)
+    return upload_session
+
+
+def get_expired_upload_sessions(
+    session: Session, limit: int = 100
+) -> list[UploadSession]:
+    statement = (
+        select(UploadSession)
+        .where(UploadSession.expires_at < datetime.now())
+        .limit(limit)
+    )
+    return list(session.exec(statement).all())
+
+
+def delete_upload_session(session: Session, upload_session: UploadSession) -> None:
+    session.delete(upload_session)
+    session.commit()
@@ -0,0 +1,64 @@
+import logging
+import multiprocessing
+import time
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.crud import finalization_job_crud
+from app.models.models import FinalizationJob
+from app.services.finalization_service import run_finalization_job
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_job(session: Session, job: FinalizationJob) -> None:
+    """
+    Run a claimed job, queueing it again when it fails so that one failing
+    job never takes the worker down.
+    """
+    logger.info(f"Running finalization job {job.id}")
+    try:
+        run_finalization_job(session, job)
+    except Exception as exc:
+        logger.exception(f"Finalization job {job.id} failed")
+        session.rollback()
+        finalization_job_crud.retry_or_fail_job(
+            session, job, str(exc) or type(exc).__name__
+        )
+
+
+def work() -> None:
+    # Connections inherited from the parent process must not be shared
+    engine.dispose(close=False)
+    logger.info("Finalization worker ready")
+    while True:
+        try:
+            with Session(engine) as session:
+                job = finalization_job_crud.claim_next_job(session)
+                if job is not None:
+                    run_job(session, job)
+                    continue
+        except Exception:
+            # Database unavailable: jobs left running are claimed again once
+            # they time out
+            logger.exception("Finalization worker failed")
+        time.sleep(settings.FINALIZATION_POLL_INTERVAL_SECONDS)
+
+
+def main() -> None:
+    logger.info(f"Starting {settings.FINALIZATION_WORKERS} finalization workers")
+    workers = [
+        multiprocessing.Process(target=work, name=f"finalization-worker-{i}")
+        for i in range(settings.FINALIZATION_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
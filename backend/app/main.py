@@ -8,6 +8,7 @@ from fastapi.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
+from app.api.middleware import UploadSizeLimitMiddleware
 from app.core.config import settings
 
 # Configure logging
@@ -36,6 +37,13 @@ app.mount("/api/v1/static", StaticFiles(directory="static"), name="static")
 
 # app.include_router(api_router, prefix="/api/v1")
 
+# Added first so that the CORS middleware also wraps its rejections
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_prefix=f"{settings.API_V1_STR}/documents",
+    max_upload_bytes=settings.DOCUMENT_MAX_UPLOAD_BYTES,
+)
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -0,0 +1,50 @@
+"""
+Move the files stored before the sharded layout into it, while the
+application runs: document files and signed copies into the blob store, on
+the configured storage backend, and cached page images into their sharded
+directories.
+
+Blobs left without references by a process that died before deleting them
+are deleted as well.
+"""
+
+import argparse
+import logging
+
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.services.blob_store import delete_unreferenced_blobs
+from app.services.storage_migration import migrate_document_files, migrate_page_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument(
+        "--batch-size", type=int, default=100, help="documents or files per batch"
+    )
+    parser.add_argument(
+        "--pause",
+        type=float,
+        default=1.0,
+        help="seconds to pause between batches, to spare the disk",
+    )
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        stats = migrate_document_files(session, args.batch_size, args.pause)
+        logger.info(
+            f"Documents migrated: {stats.moved} files moved, {stats.missing} "
+            f"missing, {stats.skipped} skipped until the next run"
+        )
+        moved = migrate_page_cache(session, args.batch_size, args.pause)
+        logger.info(f"Page cache migrated: the pages of {moved} files moved")
+        deleted = delete_unreferenced_blobs(session)
+        logger.info(f"Unreferenced blobs deleted: {deleted}")
+
+
+if __name__ == "__main__":
+    main()
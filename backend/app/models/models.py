@@ -1,8 +1,9 @@
+import uuid
 from datetime import datetime
 from enum import Enum
 from typing import Optional, List
 
-from sqlalchemy import Enum as SAEnum
+from sqlalchemy import BigInteger, Column, Enum as SAEnum, Index
 from sqlmodel import Field, Relationship, SQLModel
 import enum
 
@@ -27,11 +28,9 @@ class User(UserBase, table=True):
     documents: List["Document"] = Relationship(back_populates="owner")
     signatories: List["Signatory"] = Relationship(
         back_populates="creator",
-        sa_relationship_kwargs={"foreign_keys": "Signatory.creator_id"}
-    )
-    requests: List["SignatureRequest"] = Relationship(
-        back_populates="sender"
+        sa_relationship_kwargs={"foreign_keys": "Signatory.creator_id"},
     )
+    requests: List["SignatureRequest"] = Relationship(back_populates="sender")
 
 
 # Enum definitions
@@ -91,13 +90,61 @@ class Document(BaseModel, table=True):
     file_url: Optional[str] = None
     status: DocumentStatus = Field(sa_column=SAEnum(DocumentStatus))
     owner_id: int = Field(foreign_key="user.id")
+    file_hash: Optional[str] = Field(
+        default=None, description="SHA-256 of the uploaded file"
+    )
+    # Blob holding the file, unset for files stored before the blob store
+    blob_sha256: Optional[str] = Field(
+        default=None, foreign_key="blob.sha256", index=True
+    )
+    # Blob holding the signed copy, unset until signed and for copies signed
+    # before the blob store
+    signed_blob_sha256: Optional[str] = Field(
+        default=None, foreign_key="blob.sha256", index=True
+    )
+    page_count: Optional[int] = None
 
     owner: User = Relationship(back_populates="documents")
+    pages: List["DocumentPage"] = Relationship(
+        back_populates="document",
+        sa_relationship_kwargs={
+            "cascade": "all, delete-orphan",
+            "order_by": "DocumentPage.page_number",
+        },
+    )
+    render_jobs: List["PageRenderJob"] = Relationship(
+        back_populates="document",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan"},
+    )
     signature_requests: List["SignatureRequest"] = Relationship(
-        back_populates="documents",
-        link_model=RequestDocumentLink
+        back_populates="documents", link_model=RequestDocumentLink
+    )
+    signature_details: Optional["DocumentSignatureDetails"] = Relationship(
+        back_populates="document"
     )
-    signature_details: Optional["DocumentSignatureDetails"] = Relationship(back_populates="document")
+
+
+class DocumentPage(SQLModel, table=True):
+    """
+    Media box and rotation of one page of a document, in PDF points, recorded
+    when the file is uploaded.
+    """
+
+    # Pages are looked up by document and number
+    __table_args__ = (
+        Index("ix_documentpage_document_id_page_number", "document_id", "page_number"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    document_id: int = Field(foreign_key="document.id")
+    page_number: int
+    width: float
+    height: float
+    rotation: int = 0
+    origin_x: float = 0
+    origin_y: float = 0
+
+    document: Document = Relationship(back_populates="pages")
 
 
 class DocumentSignatureDetails(SQLModel, table=True):
@@ -105,10 +152,15 @@ class DocumentSignatureDetails(SQLModel, table=True):
     document_id: int = Field(foreign_key="document.id")
     signed_hash: str = Field(description="SHA-256 hash of the signed document")
     timestamp: datetime = Field(
-        default_factory=datetime.now, description="The time when the document was signed"
+        default_factory=datetime.now,
+        description="The time when the document was signed",
+    )
+    certified_timestamp: Optional[str] = Field(
+        default=None, description="Certified timestamp if available"
+    )
+    ip_address: Optional[str] = Field(
+        default=None, description="IP address of the signer"
     )
-    certified_timestamp: Optional[str] = Field(default=None, description="Certified timestamp if available")
-    ip_address: Optional[str] = Field(default=None, description="IP address of the signer")
 
     document: Document = Relationship(back_populates="signature_details")
 
@@ -170,12 +222,11 @@ class Signatory(BaseModel, table=True):
     )
     creator: User = Relationship(
         sa_relationship_kwargs={"foreign_keys": "Signatory.creator_id"},
-        back_populates="signatories"
+        back_populates="signatories",
     )
     fields: List[DocField] = Relationship(back_populates="signatory")
     signature_requests: List["SignatureRequest"] = Relationship(
-        back_populates="signatories",
-        link_model=RequestSignatoryLink
+        back_populates="signatories", link_model=RequestSignatoryLink
     )
 
 
@@ -204,12 +255,10 @@ class SignatureRequest(BaseModel, table=True):
 
     sender: User = Relationship()
     documents: List[Document] = Relationship(
-        back_populates="signature_requests",
-        link_model=RequestDocumentLink
+        back_populates="signature_requests", link_model=RequestDocumentLink
     )
     signatories: List[Signatory] = Relationship(
-        back_populates="signature_requests",
-        link_model=RequestSignatoryLink
+        back_populates="signature_requests", link_model=RequestSignatoryLink
     )
     audit_logs: List["AuditLog"] = Relationship(back_populates="signature_request")
     reminder_settings: Optional[ReminderSettings] = Relationship(
@@ -217,6 +266,126 @@ class SignatureRequest(BaseModel, table=True):
     )
 
 
+class FinalizationJobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class FinalizationJob(BaseModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    signature_request_id: int = Field(foreign_key="signaturerequest.id", index=True)
+    status: FinalizationJobStatus = Field(
+        default=FinalizationJobStatus.QUEUED, sa_column=SAEnum(FinalizationJobStatus)
+    )
+    ip_address: Optional[str] = None
+    attempts: int = Field(default=0)
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    signature_request: SignatureRequest = Relationship()
+    documents: List["FinalizationJobDocument"] = Relationship(back_populates="job")
+
+
+class FinalizationJobDocument(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="finalizationjob.id", index=True)
+    document_id: int = Field(foreign_key="document.id")
+    status: FinalizationJobStatus = Field(
+        default=FinalizationJobStatus.QUEUED, sa_column=SAEnum(FinalizationJobStatus)
+    )
+    error: Optional[str] = None
+    signed_hash: Optional[str] = None
+    peak_memory_bytes: Optional[int] = Field(
+        default=None,
+        sa_column=Column(BigInteger),
+        description="Peak resident memory of the process that finalized the document",
+    )
+
+    job: FinalizationJob = Relationship(back_populates="documents")
+    document: Document = Relationship()
+
+
+class PageRenderStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class PageRenderJob(BaseModel, table=True):
+    """
+    Rasterization of the pages of a document for the signing view, run by
+    the render workers (see app/render_worker.py).
+    """
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    document_id: int = Field(foreign_key="document.id", index=True)
+    status: PageRenderStatus = Field(
+        default=PageRenderStatus.QUEUED, sa_column=SAEnum(PageRenderStatus)
+    )
+    attempts: int = Field(default=0)
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    document: Document = Relationship(back_populates="render_jobs")
+
+
+class PageCacheEntry(SQLModel, table=True):
+    """
+    Index of the page images in the page cache of each node, for its LRU
+    eviction.
+    """
+
+    node: str = Field(primary_key=True)
+    key: str = Field(primary_key=True)
+    file_hash: str = Field(index=True)
+    size_bytes: int = Field(sa_column=Column(BigInteger, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.now)
+    last_accessed_at: datetime = Field(default_factory=datetime.now, index=True)
+
+
+class PageCacheCounter(SQLModel, table=True):
+    """
+    Hits, misses and evictions of the page cache, shared by every process.
+    """
+
+    name: str = Field(primary_key=True)
+    value: int = Field(default=0, sa_column=Column(BigInteger, nullable=False))
+
+
+class Blob(SQLModel, table=True):
+    """
+    File of the content-addressed blob store, shared by every document with
+    the same content and deleted along with its last reference.
+    """
+
+    sha256: str = Field(primary_key=True)
+    size_bytes: int = Field(sa_column=Column(BigInteger, nullable=False))
+    ref_count: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.now)
+
+
+class UploadSession(BaseModel, table=True):
+    """
+    Document upload sent in chunks, resumed from ``offset`` after a failure
+    and turned into a ``Document`` once complete.
+    """
+
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, primary_key=True)
+    owner_id: int = Field(foreign_key="user.id", index=True)
+    title: str
+    # Value of the DocumentStatus the document is created with
+    status: str
+    filename: str
+    size: int = Field(sa_column=Column(BigInteger, nullable=False))
+    offset: int = Field(default=0, sa_column=Column(BigInteger, nullable=False))
+    expires_at: datetime = Field(index=True)
+
+
 class AuditLogAction(str, Enum):
     DOCUMENT_UPLOADED = "document uploaded"
     SIGNATURE_REQUESTED = "signature requested"
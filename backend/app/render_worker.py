@@ -0,0 +1,64 @@
+import logging
+import multiprocessing
+import time
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine
+from app.crud import page_render_job_crud
+from app.models.models import PageRenderJob
+from app.services.render_service import run_page_render_job
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_job(session: Session, job: PageRenderJob) -> None:
+    """
+    Run a claimed job, queueing it again when it fails so that one failing
+    job never takes the worker down.
+    """
+    logger.info(f"Rendering the pages of document {job.document_id}")
+    try:
+        run_page_render_job(session, job)
+    except Exception as exc:
+        logger.exception(f"Render job {job.id} failed")
+        session.rollback()
+        page_render_job_crud.retry_or_fail_render_job(
+            session, job, str(exc) or type(exc).__name__
+        )
+
+
+def work() -> None:
+    # Connections inherited from the parent process must not be shared
+    engine.dispose(close=False)
+    logger.info("Render worker ready")
+    while True:
+        try:
+            with Session(engine) as session:
+                job = page_render_job_crud.claim_next_render_job(session)
+                if job is not None:
+                    run_job(session, job)
+                    continue
+        except Exception:
+            # Database unavailable: jobs left running are claimed again once
+            # they time out
+            logger.exception("Render worker failed")
+        time.sleep(settings.RENDER_POLL_INTERVAL_SECONDS)
+
+
+def main() -> None:
+    logger.info(f"Starting {settings.RENDER_WORKERS} render workers")
+    workers = [
+        multiprocessing.Process(target=work, name=f"render-worker-{i}")
+        for i in range(settings.RENDER_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ from ..models.models import (  # noqa
     DocumentSignatureDetails,
     DocumentStatus,
     FieldType,
+    FinalizationJobStatus,
     SignatureRequestStatus,
     UserBase,
 )
@@ -152,6 +153,16 @@ class DocumentSignatureDetailsOut(DocumentSignatureDetailsBase):
     id: int
 
 
+class DocumentPageOut(BaseModel):
+    page_number: int = Field(..., description="1-indexed page number")
+    width: float = Field(..., description="Width of the page in PDF points")
+    height: float = Field(..., description="Height of the page in PDF points")
+    rotation: int = Field(0, description="Rotation of the page in degrees")
+
+    class Config:
+        from_attributes = True
+
+
 class DocumentOut(DocumentBase):
     id: int = Field(..., description="Unique identifier for the document")
     created_at: datetime = Field(
@@ -162,6 +173,12 @@ class DocumentOut(DocumentBase):
     )
     owner: UserOut = Field(..., description="User information of the owner")
     signature_details: DocumentSignatureDetailsOut | None = None
+    page_count: int | None = Field(
+        None, description="Number of pages, unknown for older documents"
+    )
+    pages: list[DocumentPageOut] = Field(
+        default_factory=list, description="Size and rotation of each page"
+    )
 
     @validator("file_url")
     def validate_file_url(cls, value):
@@ -172,6 +189,26 @@ class DocumentOut(DocumentBase):
         from_attributes = True
 
 
+class UploadSessionCreate(BaseModel):
+    title: str = Field(..., description="Title of the document")
+    status: DocumentStatus = Field(..., description="Status of the document")
+    filename: str = Field(..., description="Name of the uploaded file")
+    size: int = Field(..., gt=0, description="Size of the file in bytes")
+
+
+class UploadSessionOut(BaseModel):
+    id: str = Field(..., description="Identifier of the upload session")
+    filename: str = Field(..., description="Name of the uploaded file")
+    size: int = Field(..., description="Size of the file in bytes")
+    offset: int = Field(..., description="Bytes received so far")
+    expires_at: datetime = Field(
+        ..., description="Time after which an unfinished upload is deleted"
+    )
+
+    class Config:
+        from_attributes = True
+
+
 class FieldBase(BaseModel):
     type: FieldType
     page: int
@@ -365,3 +402,29 @@ class AuditLogRead(AuditLogBase):
 
     class Config:
         from_attributes = True
+
+
+class FinalizationJobDocumentOut(BaseModel):
+    document_id: int
+    status: FinalizationJobStatus
+    error: str | None = None
+    signed_hash: str | None = None
+    peak_memory_bytes: int | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class FinalizationJobOut(BaseModel):
+    id: int
+    signature_request_id: int
+    status: FinalizationJobStatus
+    attempts: int
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    documents: list[FinalizationJobDocumentOut]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,206 @@
+import logging
+import uuid
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.crud import blob_crud
+from app.models.models import Document
+from app.services.file_service import UPLOAD_DIR, SavedUpload
+from app.services.storage import get_storage
+from app.services.storage_layout import sharded_path
+
+logger = logging.getLogger(__name__)
+
+# Uploaded files and their signed copies are stored once per content, named
+# after their SHA-256 in sharded directories
+BLOB_PREFIX = "blobs"
+# Uploads being received and copies being signed, on the local disk whatever
+# the storage backend, stored once their hash is known
+INCOMING_DIR = UPLOAD_DIR / BLOB_PREFIX / "incoming"
+# Key of the session info listing the blobs whose last reference was dropped
+# in the current transaction
+RELEASED_BLOBS = "released_blobs"
+
+
+def blob_key(sha256: str) -> str:
+    return sharded_path(Path(BLOB_PREFIX), sha256).as_posix()
+
+
+def blob_path(sha256: str) -> Path:
+    """
+    Local path of a blob, a copy of it fetched on first use with a remote
+    storage backend.
+    """
+    return get_storage().local_path(blob_key(sha256))
+
+
+def incoming_path() -> Path:
+    INCOMING_DIR.mkdir(parents=True, exist_ok=True)
+    return INCOMING_DIR / uuid.uuid4().hex
+
+
+def legacy_document_path(document: Document) -> Path:
+    return UPLOAD_DIR / f"{document.owner_id}_{document.file}"
+
+
+def legacy_signed_document_path(document: Document) -> Path:
+    return UPLOAD_DIR / "signed_documents" / f"{document.owner_id}_{document.file}"
+
+
+def signed_document_filename(document: Document) -> str:
+    """
+    Name the signed copy of a document is sent under: its blob is named after
+    its hash.
+    """
+    return f"{Path(document.file or document.title).stem}_signed.pdf"
+
+
+def document_file_path(document: Document) -> Path:
+    """
+    Path of the uploaded file of a document, from the hash of its blob, or
+    where it was stored before the blob store.
+    """
+    if document.blob_sha256 is not None:
+        return blob_path(document.blob_sha256)
+    return legacy_document_path(document)
+
+
+def signed_document_path(document: Document) -> Path:
+    """
+    Path of the signed copy of a document, from the hash of its blob, or
+    where it was stored before the blob store.
+    """
+    if document.signed_blob_sha256 is not None:
+        return blob_path(document.signed_blob_sha256)
+    return legacy_signed_document_path(document)
+
+
+def document_file_key(document: Document) -> str | None:
+    """
+    Storage key of the uploaded file of a document, ``None`` for files stored
+    before the blob store, which are only on the local disk.
+    """
+    if document.blob_sha256 is None:
+        return None
+    return blob_key(document.blob_sha256)
+
+
+def signed_document_key(document: Document) -> str | None:
+    if document.signed_blob_sha256 is None:
+        return None
+    return blob_key(document.signed_blob_sha256)
+
+
+def store_upload(session: Session, upload: SavedUpload) -> str:
+    """
+    Take a reference to the blob of an upload, moving the uploaded file to
+    the storage backend unless the same content is already stored, and
+    return its key. The reference is committed first, so that the blob
+    cannot be deleted by the release of its last other reference meanwhile.
+    """
+    try:
+        blob_crud.acquire_blob(session, upload.sha256, upload.size)
+        session.commit()
+    except IntegrityError:
+        # Somebody else stored the same content at the same time
+        session.rollback()
+        blob_crud.acquire_blob(session, upload.sha256, upload.size)
+        session.commit()
+    key = blob_key(upload.sha256)
+    storage = get_storage()
+    if storage.exists(key):
+        Path(upload.path).unlink(missing_ok=True)
+    else:
+        storage.put(key, Path(upload.path), move=True)
+    return key
+
+
+def store_signed_copy(
+    session: Session, document: Document, signed_copy: SavedUpload
+) -> str:
+    """
+    Store the signed copy of a document and reference it from the document,
+    dropping the reference to a previous one. The caller commits.
+    """
+    key = store_upload(session, signed_copy)
+    release_blob(session, document.signed_blob_sha256)
+    document.signed_blob_sha256 = signed_copy.sha256
+    session.add(document)
+    return key
+
+
+def release_blob(session: Session, sha256: str | None) -> None:
+    """
+    Drop a reference to a blob. Its file is deleted with the last one, once
+    the caller committed: a rolled back transaction keeps it.
+    """
+    if sha256 is None:
+        return
+    if blob_crud.release_blob(session, sha256):
+        session.info.setdefault(RELEASED_BLOBS, set()).add(sha256)
+
+
+def delete_unreferenced_blob(session: Session, sha256: str) -> bool:
+    """
+    Delete the file and row of a blob left without references, in a
+    transaction of its own, and return whether it did. The row is locked
+    meanwhile, a blob referenced again before is kept.
+    """
+    blob = blob_crud.lock_unreferenced_blob(session, sha256)
+    if blob is None:
+        session.rollback()
+        return False
+    get_storage().delete(blob_key(sha256))
+    blob_crud.delete_blob(session, blob)
+    session.commit()
+    logger.info(f"Deleted blob {sha256}, no longer referenced")
+    return True
+
+
+def delete_unreferenced_blobs(session: Session) -> int:
+    """
+    Delete the blobs left without references by a process that died between
+    committing their release and deleting them, and return how many.
+    """
+    deleted = 0
+    while blobs := blob_crud.get_unreferenced_blobs(session):
+        for sha256 in [blob.sha256 for blob in blobs]:
+            deleted += delete_unreferenced_blob(session, sha256)
+    return deleted
+
+
+@event.listens_for(Session, "after_commit")
+def delete_released_blobs(session: Session) -> None:
+    released = session.info.pop(RELEASED_BLOBS, None)
+    if not released:
+        return
+    # The committed session cannot run queries from this hook
+    with Session(session.get_bind()) as cleanup_session:
+        for sha256 in released:
+            try:
+                delete_unreferenced_blob(cleanup_session, sha256)
+            except Exception:
+                # Left to delete_unreferenced_blobs
+                cleanup_session.rollback()
+                logger.exception(f"Could not delete blob {sha256}")
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_released_blobs(session: Session) -> None:
+    session.info.pop(RELEASED_BLOBS, None)
+
+
+def release_document_blob(session: Session, document: Document) -> None:
+    release_blob(session, document.blob_sha256)
+
+
+def release_document_blobs(session: Session, document: Document) -> None:
+    """
+    Drop the references of a document being deleted to its file and signed
+    copy. The caller commits.
+    """
+    release_blob(session, document.blob_sha256)
+    release_blob(session, document.signed_blob_sha256)
@@ -2,21 +2,49 @@ import io
 import logging
 import os
 import PyPDF2
+from PyPDF2._security import _alg35
+from PyPDF2.generic import (
+    ArrayObject,
+    ByteStringObject,
+    ContentStream,
+    DictionaryObject,
+    NameObject,
+)
 import random
 import string
 import hashlib
+import tempfile
 from app.models.models import FieldType
 from pathlib import Path
-from typing import Optional, List
+from typing import BinaryIO, NamedTuple, Optional, List
 from jose import JWTError, jwt
 from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.services.file_utils import (
+    PageGeometry,
+    atomic_output,
+    upright_transformation,
+)
+from app.services.signature_cache import (
+    get_signature_image_reader,
+    signature_form_name,
+)
+from app.services.stamping import (
+    HANDWRITING_FONT_SIZE,
+    PyMuPDFStampingBackend,
+    StampingBackend,
+    document_file_id,
+    group_fields_by_page,
+    pdf_owner_password,
+    update_hash_from_file,
+)
 from app.utils import send_email
 from datetime import datetime
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase.pdfmetrics import registerFont
+from reportlab.pdfbase.pdfmetrics import registerFont, stringWidth
 from reportlab.lib.colors import black
 
 # Register a handwriting-like font
@@ -24,16 +52,76 @@ registerFont(TTFont("Handwriting", "static/fonts/Allura-Regular.ttf"))
 
 logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = Path("/app/static/document_files")
+UPLOAD_DIR = Path(settings.STORAGE_LOCAL_DIR)
 
 
-def save_file(file: UploadFile, user_id: int) -> str:
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-    new_filename = f"{user_id}_{file.filename}"
-    save_path = UPLOAD_DIR / new_filename
-    with open(save_path, "wb") as f:
-        f.write(file.file.read())
-    return str(save_path)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# PDF readers accept a header anywhere in the first kilobyte of the file
+PDF_HEADER = b"%PDF-"
+PDF_HEADER_SEARCH_BYTES = 1024
+
+
+class SavedUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+
+def copy_upload(source: BinaryIO, output_path: Path, max_bytes: int) -> SavedUpload:
+    """
+    Copy an uploaded PDF to ``output_path`` chunk by chunk, hashing and
+    counting its bytes on the way. Files that do not start like a PDF or grow
+    past ``max_bytes`` are rejected as soon as that shows, and nothing is
+    left at ``output_path``.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(
+        dir=output_path.parent,
+        prefix=f".{output_path.name}.",
+        suffix=".upload",
+        delete=False,
+    ) as temp_file:
+        temp_path = Path(temp_file.name)
+        try:
+            head = b""
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Files larger than {max_bytes} bytes cannot be uploaded",
+                    )
+                if len(head) < PDF_HEADER_SEARCH_BYTES:
+                    head += chunk[: PDF_HEADER_SEARCH_BYTES - len(head)]
+                    if len(head) >= PDF_HEADER_SEARCH_BYTES and PDF_HEADER not in head:
+                        raise not_a_pdf()
+                sha256.update(chunk)
+                temp_file.write(chunk)
+            if PDF_HEADER not in head:
+                raise not_a_pdf()
+        except BaseException:
+            temp_file.close()
+            temp_path.unlink(missing_ok=True)
+            raise
+    os.replace(temp_path, output_path)
+    return SavedUpload(str(output_path), sha256.hexdigest(), size)
+
+
+def not_a_pdf() -> HTTPException:
+    return HTTPException(status_code=415, detail="Only PDF files can be uploaded")
+
+
+async def save_file(file: UploadFile, output_path: Path) -> SavedUpload:
+    """
+    Store an uploaded PDF at ``output_path``, streamed to disk in a worker
+    thread so that large uploads never block the event loop nor sit in
+    memory, and return its path, SHA-256 and size.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    return await run_in_threadpool(
+        copy_upload, file.file, output_path, settings.DOCUMENT_MAX_UPLOAD_BYTES
+    )
 
 
 def file_existence(file_path: str) -> bool:
@@ -57,6 +145,18 @@ def verify_secure_link_token(token: str) -> Optional[dict]:
         return None
 
 
+def verify_document_access_token(token: str, document_id: int) -> dict:
+    """
+    Check that a secure link token is valid and grants access to a document.
+    """
+    payload = verify_secure_link_token(token)
+    if payload is None:
+        raise HTTPException(status_code=403, detail="Invalid or expired token")
+    if document_id not in [int(id) for id in payload.get("document_ids") or []]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return payload
+
+
 def generate_otp() -> str:
     return "".join(random.choices(string.digits, k=6))
 
@@ -64,8 +164,7 @@ def generate_otp() -> str:
 def send_otp_code(email: str, otp: int) -> bool:
     subject = "Your OTP Code"
     html_content = f"<p>Your OTP code is: {otp}</p>"
-    response = send_email(email_to=email, subject=subject,
-                          html_content=html_content)
+    response = send_email(email_to=email, subject=subject, html_content=html_content)
     return response.status_code == 250
 
 
@@ -89,6 +188,69 @@ def generate_secure_link(
     return secure_link
 
 
+# Combine permissions for printing and high-resolution printing
+PDF_PERMISSIONS_FLAG = (
+    0b0100 | 0b0001_0000_0000_0000  # Printing  # Printing in High Resolution
+)
+
+
+class HashingWriter:
+    """
+    Write-only binary sink that tees every byte written to ``stream`` into a
+    SHA-256 digest, so a file is fingerprinted while it is being written.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.sha256.update(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.bytes_written
+
+    def hexdigest(self):
+        return self.sha256.hexdigest()
+
+
+def encrypt_pdf_writer(writer, file_id: Optional[bytes] = None):
+    """
+    Restrict a PDF being written to printing and high resolution printing.
+
+    PyPDF2 draws the file /ID, and with it the encryption key, from the clock;
+    given a ``file_id`` both are derived from it instead, so that the same
+    document is always encrypted to the same bytes. PyPDF2 has no public way
+    to do so: this sets the attributes ``PdfWriter.encrypt`` sets, as of the
+    pinned PyPDF2 3.0.1, and refuses to run on a writer without them.
+    """
+    writer.encrypt(
+        user_password="",
+        owner_password=pdf_owner_password(),
+        use_128bit=True,
+        permissions_flag=PDF_PERMISSIONS_FLAG,
+    )
+    if file_id is not None:
+        if not all(
+            hasattr(writer, name) for name in ("_ID", "_encrypt", "_encrypt_key")
+        ):
+            raise RuntimeError(
+                f"Unsupported PyPDF2 {PyPDF2.__version__}: cannot pin the file /ID"
+            )
+        file_id = ByteStringObject(file_id)
+        encrypt = writer._encrypt.get_object()
+        user_entry, key = _alg35(
+            "", 3, 16, encrypt["/O"], encrypt["/P"], file_id, False
+        )
+        writer._ID = ArrayObject((file_id, file_id))
+        encrypt[NameObject("/U")] = ByteStringObject(user_entry)
+        writer._encrypt_key = key
+
+
 def apply_pdf_security(pdf_path: str):
     """
     Apply security settings to a PDF to allow only printing and printing in high resolution.
@@ -99,17 +261,7 @@ def apply_pdf_security(pdf_path: str):
     for page in reader.pages:
         writer.add_page(page)
 
-    # Combine permissions for printing and high-resolution printing
-    permissions_flag = (
-        0b0100 | 0b0001_0000_0000_0000  # Printing  # Printing in High Resolution
-    )
-
-    writer.encrypt(
-        user_password="",
-        owner_password=settings.SECRET_KEY,
-        use_128bit=True,
-        permissions_flag=permissions_flag,
-    )
+    encrypt_pdf_writer(writer)
 
     with open(pdf_path, "wb") as f:
         writer.write(f)
@@ -123,17 +275,35 @@ def draw_signature_field(c, field, signatory):
         with dimensions ({field.width}, {field.height})
         """
     )
+    # The appearance is drawn once per overlay as a form XObject, every other
+    # placement of the same signature only references it
+    form_name = signature_form_name(signatory)
+    if not c.hasForm(form_name):
+        if signatory.signature_image:
+            logger.info(f"Using signature image at {signatory.signature_image}")
+            c.beginForm(form_name, 0, 0, 1, 1)
+            c.drawImage(get_signature_image_reader(signatory), 0, 0, 1, 1)
+        else:
+            logger.info("Using handwritten font for signature")
+            name = f"{signatory.first_name} {signatory.last_name}"
+            c.beginForm(
+                form_name,
+                0,
+                -HANDWRITING_FONT_SIZE,
+                stringWidth(name, "Handwriting", HANDWRITING_FONT_SIZE),
+                HANDWRITING_FONT_SIZE,
+            )
+            c.setFont("Handwriting", HANDWRITING_FONT_SIZE)
+            c.setFillColor(black)
+            c.drawString(0, 0, name)
+        c.endForm()
+
+    c.saveState()
+    c.translate(field.x, field.y)
     if signatory.signature_image:
-        logger.info(f"Using signature image at {signatory.signature_image}")
-        c.drawImage(
-            signatory.signature_image, field.x, field.y, field.width, field.height
-        )
-    else:
-        logger.info("Using handwritten font for signature")
-        c.setFont("Handwriting", 24)
-        c.setFillColor(black)
-        c.drawString(field.x, field.y,
-                     f"{signatory.first_name} {signatory.last_name}")
+        c.scale(field.width, field.height)
+    c.doForm(form_name)
+    c.restoreState()
     # c.rect(field.x, field.y - 10, field.width, field.height)
 
 
@@ -189,49 +359,174 @@ def draw_doc_field(c, field, signatory):
         draw_radio_group_field(c, field)
 
 
-def add_fields_to_pdf(document_filename, field, signatory, owner_id):
-    base_path = UPLOAD_DIR / f"{owner_id}_{document_filename}"
-    signed_path = UPLOAD_DIR / "signed_documents" / f"{owner_id}_{document_filename}"
+def read_page_boxes(reader, page_numbers):
+    """
+    Geometry of the given pages read from the PDF itself, for documents
+    stored before their geometry was recorded.
+    """
+    page_boxes = {}
+    for page_number in page_numbers:
+        mediabox = reader.pages[page_number - 1].mediabox
+        page_boxes[page_number] = PageGeometry(
+            page_number=page_number,
+            width=float(mediabox.width),
+            height=float(mediabox.height),
+            rotation=reader.pages[page_number - 1].get("/Rotate", 0),
+            origin_x=float(mediabox.left),
+            origin_y=float(mediabox.bottom),
+        )
+    return page_boxes
 
-    # Check if file exists in 'signed_documents'
-    file_path = signed_path if signed_path.exists() else base_path
 
-    logger.info(f"Adding fields to PDF: {file_path}")
+def render_fields_overlay(fields_by_page, page_boxes):
+    """
+    Render every field into a single overlay PDF holding one page per
+    affected document page, in the same order as ``fields_by_page``, each
+    sized like the media box of the page it will be merged into. Fields are
+    drawn in the upright frame of rotated pages.
+    """
     packet = io.BytesIO()
-    can = canvas.Canvas(packet, pagesize=letter)
-
-    draw_doc_field(can, field, signatory)
+    can = canvas.Canvas(packet, pagesize=letter, invariant=1)
+    for page_number, page_placements in fields_by_page.items():
+        box = page_boxes[page_number]
+        can.setPageSize((box.width, box.height))
+        can.transform(*upright_transformation(box))
+        for field, signatory in page_placements:
+            draw_doc_field(can, field, signatory)
+        can.showPage()
     can.save()
-
-    # Process the PDF modifications
     packet.seek(0)
-    new_pdf = PyPDF2.PdfReader(packet)
-    existing_pdf = PyPDF2.PdfReader(open(file_path, "rb"))
-    output = PyPDF2.PdfWriter()
+    return PyPDF2.PdfReader(packet)
+
+
+def prefix_overlay_resources(overlay_page, prefix="Stamp"):
+    """
+    Rename the resources of an overlay page so that none clashes with those
+    of the page it is merged into: PyPDF2 would rename the clashing ones with
+    a random suffix, and the output would differ on every run.
+    """
+    resources = overlay_page["/Resources"].get_object()
+    renamed = {}
+    for category in list(resources):
+        entries = resources[category].get_object()
+        if not isinstance(entries, DictionaryObject):
+            continue
+        prefixed_entries = DictionaryObject()
+        for name, value in entries.items():
+            renamed[name] = NameObject(f"/{prefix}{name[1:]}")
+            prefixed_entries[renamed[name]] = value
+        resources[NameObject(category)] = prefixed_entries
+
+    content = ContentStream(overlay_page.get_contents(), overlay_page.pdf)
+    for operands, _operator in content.operations:
+        for index, operand in enumerate(operands):
+            if isinstance(operand, NameObject) and operand in renamed:
+                operands[index] = renamed[operand]
+    overlay_page[NameObject("/Contents")] = content
+    return overlay_page
+
+
+def build_stamped_pdf(source_path, placements, page_boxes=None):
+    """
+    Merge one overlay page into each page of ``source_path`` carrying fields
+    and return the resulting writer, ready to be written once. Only the pages
+    with fields are parsed.
+    """
+    fields_by_page = group_fields_by_page(placements)
+    logger.info(
+        f"Adding {len(placements)} fields on {len(fields_by_page)} pages to PDF: "
+        f"{source_path}"
+    )
+    existing_pdf = PyPDF2.PdfReader(source_path)
+    if page_boxes is None:
+        page_boxes = read_page_boxes(existing_pdf, fields_by_page)
+    overlay_pdf = render_fields_overlay(fields_by_page, page_boxes)
+    for page_number, overlay_page in zip(
+        fields_by_page, overlay_pdf.pages, strict=True
+    ):
+        existing_pdf.pages[page_number - 1].merge_page(
+            prefix_overlay_resources(overlay_page)
+        )
 
-    target_page_index = field.page - 1  # Assuming 'page' is 1-indexed
-    for page_number, page in enumerate(existing_pdf.pages):
-        if page_number == target_page_index:
-            if new_pdf.pages:
-                page.merge_page(new_pdf.pages[0])
+    output = PyPDF2.PdfWriter()
+    for page in existing_pdf.pages:
         output.add_page(page)
+    return output
 
-    # Saving the modified PDF
-    if "signed_documents" not in str(file_path):
-        new_folder_path = file_path.parent / "signed_documents"
-        new_folder_path.mkdir(exist_ok=True)
-        new_file_name = file_path.name
-        new_file_path = new_folder_path / new_file_name
-    else:
-        new_file_path = file_path
 
-    with open(new_file_path, "wb") as outputStream:
+def stamp_pdf(source_path, output_path, placements, page_boxes=None):
+    """
+    Stamp all the (field, signatory) placements onto ``source_path`` in one
+    pass: the source is read once and ``output_path`` is written once.
+    """
+    output = build_stamped_pdf(source_path, placements, page_boxes)
+    Path(output_path).parent.mkdir(exist_ok=True)
+    with open(output_path, "wb") as outputStream:
         output.write(outputStream)
 
-    logger.info(f"Written updated PDF to {new_file_path}")
+    logger.info(f"Written updated PDF to {output_path}")
+    return Path(output_path)
+
+
+def finalize_pdf(source_path, output_path, placements, page_boxes=None):
+    """
+    Produce the signed copy of a document in a single streaming write: the
+    fields are stamped, the security settings applied while writing and the
+    SHA-256 of the written bytes is returned.
+    """
+    output = build_stamped_pdf(source_path, placements, page_boxes)
+    if settings.SIGNED_PDF_ENCRYPTION:
+        encrypt_pdf_writer(output, document_file_id(source_path, placements))
+    Path(output_path).parent.mkdir(exist_ok=True)
+    with open(output_path, "wb") as outputStream:
+        sink = HashingWriter(outputStream)
+        output.write(sink)
+
+    logger.info(f"Written signed PDF to {output_path}")
+    return sink.hexdigest()
+
+
+class ReportlabStampingBackend(StampingBackend):
+    """
+    Renders the fields into reportlab overlay pages merged with PyPDF2.
+    """
+
+    name = "reportlab"
+
+    def draw_doc_field(self, target, field, signatory):
+        draw_doc_field(target, field, signatory)
+
+    def stamp(self, source_path, output_path, placements, page_boxes=None):
+        return stamp_pdf(source_path, output_path, placements, page_boxes)
+
+    def finalize(self, source_path, output_path, placements, page_boxes=None):
+        return finalize_pdf(source_path, output_path, placements, page_boxes)
+
+
+STAMPING_BACKENDS = {
+    backend.name: backend
+    for backend in (ReportlabStampingBackend, PyMuPDFStampingBackend)
+}
+
+
+def get_stamping_backend(name: Optional[str] = None) -> StampingBackend:
+    """
+    Return the stamping backend selected by ``STAMPING_BACKEND``.
+    """
+    return STAMPING_BACKENDS[name or settings.STAMPING_BACKEND]()
+
+
+def add_fields_to_pdf(document_filename, placements, owner_id, page_boxes=None):
+    """
+    Stamp all the placements of an uploaded document into its copy under
+    ``signed_documents/``, always starting from the original upload.
+    """
+    base_path = UPLOAD_DIR / f"{owner_id}_{document_filename}"
+    signed_path = UPLOAD_DIR / "signed_documents" / f"{owner_id}_{document_filename}"
+    with atomic_output(signed_path) as temp_path:
+        get_stamping_backend().stamp(base_path, temp_path, placements, page_boxes)
+    return signed_path
 
 
 def generate_pdf_hash(file_path):
-    with open(file_path, "rb") as f:
-        file_content = f.read()
-    return hashlib.sha256(file_content).hexdigest()
+    return update_hash_from_file(hashlib.sha256(), file_path).hexdigest()
@@ -1,21 +1,315 @@
+import io
+import math
+import os
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
 
 import fitz
+from PIL import Image
 
 STATIC_IMG_FILES_DIR = Path("/app/static/document_files_images")
 
 
+@dataclass(frozen=True)
+class PageGeometry:
+    """
+    Media box and rotation of one page, in PDF user space units.
+    """
+
+    page_number: int
+    width: float
+    height: float
+    rotation: int = 0
+    origin_x: float = 0
+    origin_y: float = 0
+
+
+def upright_size(page) -> tuple[float, float]:
+    """
+    Width and height of a page as it is displayed: a quarter turn swaps the
+    sides of its media box.
+    """
+    if page.rotation % 180:
+        return page.height, page.width
+    return page.width, page.height
+
+
+def upright_transformation(page) -> tuple[float, ...]:
+    """
+    Matrix mapping coordinates on a page as it is displayed, from its
+    bottom-left corner, to its user space.
+    """
+    x, y = page.origin_x, page.origin_y
+    rotation = page.rotation % 360
+    if rotation == 90:
+        return (0, 1, -1, 0, x + page.width, y)
+    if rotation == 180:
+        return (-1, 0, 0, -1, x + page.width, y + page.height)
+    if rotation == 270:
+        return (0, -1, 1, 0, x, y + page.height)
+    return (1, 0, 0, 1, x, y)
+
+
+def extract_page_geometry(pdf_path) -> list[PageGeometry]:
+    """
+    Read the media box and rotation of every page of a PDF, without parsing
+    the page contents.
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        return [
+            PageGeometry(
+                page_number=page.number + 1,
+                width=page.mediabox.width,
+                height=page.mediabox.height,
+                rotation=page.rotation,
+                origin_x=page.mediabox.x0,
+                origin_y=page.mediabox.y0,
+            )
+            for page in pdf_document
+        ]
+
+
 def generate_file_url(file_path: str) -> str:
     return f"http://localhost/static/document_files/{file_path}"
 
 
-def convert_pdf_to_images(pdf_path, output_dir):
-    pdf_document = fitz.open(pdf_path)
+@dataclass(frozen=True)
+class RenderTier:
+    """
+    Resolution and encoding pages are rendered at, either to a fixed pixel
+    ``width`` or at a fixed ``dpi``.
+    """
+
+    name: str
+    width: int | None = None
+    dpi: int | None = None
+    image_format: str = "png"
+    quality: int = 80
+
+    @property
+    def key(self) -> str:
+        # Part of the cache path, so changing a tier never serves stale images
+        size = f"w{self.width}" if self.width else f"{self.dpi}dpi"
+        quality = f"-q{self.quality}" if self.image_format == "webp" else ""
+        return f"{self.name}-{size}{quality}"
+
+    @property
+    def extension(self) -> str:
+        return self.image_format
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.image_format}"
+
+    def zoom(self, page_width: float) -> float:
+        if self.width:
+            return self.width / page_width
+        return (self.dpi or 72) / 72
+
+    def pixel_size(self, page_width: float, page_height: float) -> tuple[int, int]:
+        # MuPDF rounds the rendered area outwards, within a small tolerance
+        zoom = self.zoom(page_width)
+        return (
+            math.ceil(page_width * zoom - 0.001),
+            math.ceil(page_height * zoom - 0.001),
+        )
+
+
+DEFAULT_RENDER_TIER = RenderTier(name="default", dpi=72)
+
+
+@dataclass(frozen=True)
+class TilePyramid:
+    """
+    Deep zoom levels large pages are cut into square tiles of ``tile_size``
+    pixels at. Level 0 fits the whole page in one tile and each next level
+    doubles the resolution, up to ``max_dpi``.
+    """
+
+    tile_size: int = 256
+    max_dpi: int = 300
+    image_format: str = "png"
+    quality: int = 80
+
+    @property
+    def key(self) -> str:
+        quality = f"-q{self.quality}" if self.image_format == "webp" else ""
+        return f"tiles-{self.tile_size}px-{self.max_dpi}dpi{quality}"
+
+    @property
+    def extension(self) -> str:
+        return self.image_format
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.image_format}"
+
+    def level_count(self, page_width: float, page_height: float) -> int:
+        max_pixels = max(page_width, page_height) * self.max_dpi / 72
+        return max(math.ceil(math.log2(max_pixels / self.tile_size)), 0) + 1
+
+    def zoom(self, level: int, page_width: float, page_height: float) -> float:
+        level_zoom = self.tile_size * 2**level / max(page_width, page_height)
+        return min(level_zoom, self.max_dpi / 72)
+
+    def pixel_size(
+        self, level: int, page_width: float, page_height: float
+    ) -> tuple[int, int]:
+        zoom = self.zoom(level, page_width, page_height)
+        return (
+            math.ceil(page_width * zoom - 0.001),
+            math.ceil(page_height * zoom - 0.001),
+        )
+
+    def grid(
+        self, level: int, page_width: float, page_height: float
+    ) -> tuple[int, int]:
+        """
+        Number of columns and rows of tiles at ``level``.
+        """
+        width, height = self.pixel_size(level, page_width, page_height)
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+
+def encode_pixmap(pixmap, tier: RenderTier | TilePyramid) -> bytes:
+    if tier.image_format == "webp":
+        # MuPDF cannot write WebP
+        mode = "RGBA" if pixmap.alpha else "RGB"
+        image = Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples)
+        buffer = io.BytesIO()
+        image.save(buffer, "WEBP", quality=tier.quality, method=4)
+        return buffer.getvalue()
+    return pixmap.tobytes("png")
+
+
+@contextmanager
+def atomic_output(output_path) -> Iterator[Path]:
+    """
+    Yield a temporary path next to ``output_path``, moved over it only once
+    the block succeeded. A crash never leaves a half-written file behind at
+    ``output_path``. The temporary path is unique to the call, threads and
+    processes may write the same file at once.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = output_path.with_name(f".{output_path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def write_image(output_path, data: bytes) -> Path:
+    """
+    Write ``data`` to ``output_path`` atomically, so that a reader never sees
+    a partial image.
+    """
+    with atomic_output(output_path) as temp_path:
+        temp_path.write_bytes(data)
+    return Path(output_path)
+
+
+def render_pdf_page(
+    pdf_document, page_number: int, output_path, tier: RenderTier = DEFAULT_RENDER_TIER
+) -> Path:
+    """
+    Render one page of an open PDF at ``tier`` to ``output_path``.
+    """
+    page = pdf_document.load_page(page_number - 1)
+    zoom = tier.zoom(page.rect.width)
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    return write_image(output_path, encode_pixmap(pixmap, tier))
+
+
+def render_pdf_tile(
+    pdf_document,
+    page_number: int,
+    pyramid: TilePyramid,
+    level: int,
+    column: int,
+    row: int,
+    output_path,
+) -> Path:
+    """
+    Render one tile of a page of an open PDF to ``output_path``. Only the
+    area of the tile is rasterized, whatever the size of the page.
+    """
+    page = pdf_document.load_page(page_number - 1)
+    width, height = page.rect.width, page.rect.height
+    columns, rows = pyramid.grid(level, width, height)
+    if not (
+        0 <= level < pyramid.level_count(width, height)
+        and 0 <= column < columns
+        and 0 <= row < rows
+    ):
+        raise IndexError(f"Page {page_number} has no tile {level}/{column}/{row}")
+    zoom = pyramid.zoom(level, width, height)
+    tile_points = pyramid.tile_size / zoom
+    clip = (
+        fitz.Rect(
+            column * tile_points,
+            row * tile_points,
+            (column + 1) * tile_points,
+            (row + 1) * tile_points,
+        )
+        & page.rect
+    )
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip)
+    return write_image(output_path, encode_pixmap(pixmap, pyramid))
+
+
+def render_page_range(pdf_path, targets, tier: RenderTier = DEFAULT_RENDER_TIER) -> int:
+    """
+    Render the ``(page_number, output_path)`` targets of one PDF, opened once.
+    Runs in the rasterization pool processes.
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        for page_number, output_path in targets:
+            render_pdf_page(pdf_document, page_number, output_path, tier)
+    return len(targets)
+
+
+def split_into_ranges(items: list, parts: int) -> list[list]:
+    """
+    Split ``items`` into at most ``parts`` contiguous ranges of similar size.
+    """
+    size = max(-(-len(items) // max(parts, 1)), 1)
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def render_pdf_pages(
+    pdf_path,
+    targets,
+    executor=None,
+    workers: int = 1,
+    tier: RenderTier = DEFAULT_RENDER_TIER,
+) -> int:
+    """
+    Render the ``(page_number, output_path)`` targets of a PDF, split into one
+    contiguous range per worker of ``executor`` when one is given. Each worker
+    opens the file on its own, MuPDF documents cannot be shared.
+    """
+    targets = list(targets)
+    if executor is None or workers <= 1 or len(targets) < 2:
+        return render_page_range(pdf_path, targets, tier)
+    futures = [
+        executor.submit(render_page_range, str(pdf_path), page_range, tier)
+        for page_range in split_into_ranges(targets, workers)
+    ]
+    return sum(future.result() for future in futures)
+
+
+def convert_pdf_to_images(pdf_path, output_dir, executor=None, workers: int = 1):
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
-
-    for page_num in range(len(pdf_document)):
-        page = pdf_document.load_page(page_num)
-        pix = page.get_pixmap()
-        output_path = output_dir / f"page_{page_num + 1}.png"
-        pix.save(output_path)
+    with fitz.open(pdf_path) as pdf_document:
+        page_count = pdf_document.page_count
+    targets = [
+        (page_number, output_dir / f"page_{page_number}.png")
+        for page_number in range(1, page_count + 1)
+    ]
+    return render_pdf_pages(pdf_path, targets, executor, workers)
@@ -0,0 +1,420 @@
+import logging
+import os
+import resource
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.crud import finalization_job_crud, page_render_job_crud, signed_document_crud
+from app.models.models import (
+    DocField,
+    Document,
+    DocumentStatus,
+    FieldType,
+    FinalizationJob,
+    FinalizationJobStatus,
+    Signatory,
+    SignatureRequest,
+    SignatureRequestStatus,
+)
+from app.schemas.schemas import DocumentSignatureDetailsCreate
+from app.services.blob_store import (
+    document_file_path,
+    incoming_path,
+    signed_document_filename,
+    signed_document_path,
+    store_signed_copy,
+)
+from app.services.file_service import SavedUpload, get_stamping_backend
+from app.services.file_utils import PageGeometry, atomic_output
+from app.utils import send_signature_request_notification_email
+
+logger = logging.getLogger(__name__)
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+# Plain descriptors of what has to be drawn: only these and file paths are sent
+# to the finalization processes, never ORM objects or sessions.
+@dataclass(frozen=True)
+class SignatoryDescriptor:
+    id: int
+    first_name: str
+    last_name: str
+    signature_image: str | None = None
+
+
+@dataclass(frozen=True)
+class RadioDescriptor:
+    x: int
+    y: int
+    size: int
+    checked: bool = False
+
+
+@dataclass(frozen=True)
+class FieldDescriptor:
+    type: FieldType
+    page: int
+    x: int | None = None
+    y: int | None = None
+    width: int | None = None
+    height: int | None = None
+    text: str | None = None
+    mention: str | None = None
+    checked: bool | None = None
+    size: int | None = None
+    radios: tuple[RadioDescriptor, ...] = ()
+
+
+@dataclass
+class DocumentFinalizationTask:
+    document_id: int
+    source_path: str
+    output_path: str
+    placements: list[tuple[FieldDescriptor, SignatoryDescriptor]] = field(
+        default_factory=list
+    )
+    # Recorded geometry of the pages carrying fields, read from the PDF
+    # by the stamping backend when missing
+    page_boxes: dict[int, PageGeometry] | None = None
+
+
+@dataclass
+class DocumentFinalizationResult:
+    document_id: int
+    output_path: str
+    signed_hash: str
+    peak_memory_bytes: int | None = None
+
+
+def describe_signatory(signatory: Signatory) -> SignatoryDescriptor:
+    return SignatoryDescriptor(
+        id=signatory.id,
+        first_name=signatory.first_name,
+        last_name=signatory.last_name,
+        signature_image=signatory.signature_image,
+    )
+
+
+def describe_field(field: DocField) -> FieldDescriptor:
+    return FieldDescriptor(
+        type=field.type,
+        page=field.page,
+        x=field.x,
+        y=field.y,
+        width=field.width,
+        height=field.height,
+        text=field.text,
+        mention=field.mention,
+        checked=field.checked,
+        size=field.width or field.height or 24,
+        radios=tuple(
+            RadioDescriptor(
+                x=radio.x,
+                y=radio.y,
+                size=radio.size or 24,
+                checked=bool(getattr(radio, "checked", False)),
+            )
+            for radio in field.radios
+        ),
+    )
+
+
+def describe_page_boxes(document: Document, page_numbers) -> dict | None:
+    page_boxes = {
+        page.page_number: PageGeometry(
+            page_number=page.page_number,
+            width=page.width,
+            height=page.height,
+            rotation=page.rotation,
+            origin_x=page.origin_x,
+            origin_y=page.origin_y,
+        )
+        for page in document.pages
+        if page.page_number in page_numbers
+    }
+    if set(page_numbers) - page_boxes.keys():
+        return None
+    return page_boxes
+
+
+def build_finalization_task(
+    signature_request: SignatureRequest, document: Document
+) -> DocumentFinalizationTask:
+    placements = [
+        (describe_field(field), describe_signatory(signatory))
+        for signatory in signature_request.signatories
+        for field in signatory.fields
+        if field.document_id == document.id
+    ]
+    return DocumentFinalizationTask(
+        document_id=document.id,
+        source_path=str(document_file_path(document)),
+        output_path=str(incoming_path()),
+        placements=placements,
+        page_boxes=describe_page_boxes(
+            document, {field.page for field, _ in placements}
+        ),
+    )
+
+
+def reset_peak_memory() -> None:
+    # Linux only: resets the VmHWM high-water mark of this process, so that
+    # each document processed by a reused pool process is measured on its own
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory_bytes() -> int:
+    """
+    Peak resident memory of this process since the last reset.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Lifetime peak; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def limit_process_memory(limit_bytes: int | None) -> None:
+    """
+    Cap the address space of a pool process, so that a document too large for
+    the worker fails with a MemoryError rather than getting it OOM-killed.
+    """
+    if limit_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+
+
+def select_stamping_backend(source_path: str):
+    """
+    Stamping backend finalizing ``source_path``: the PyMuPDF one past
+    ``FINALIZATION_STREAMING_THRESHOLD_BYTES``, encrypted or not, as it
+    copies the untouched pages without parsing them.
+    """
+    if os.path.getsize(source_path) > settings.FINALIZATION_STREAMING_THRESHOLD_BYTES:
+        # PyPDF2 holds the whole object graph of the document in memory
+        return get_stamping_backend("pymupdf")
+    return get_stamping_backend()
+
+
+def finalize_document_file(
+    task: DocumentFinalizationTask,
+) -> DocumentFinalizationResult:
+    """
+    Stamp, secure and fingerprint one document. Runs in a pool process.
+
+    The signed copy is written next to ``output_path`` and only moved over it
+    once complete.
+    """
+    reset_peak_memory()
+    backend = select_stamping_backend(task.source_path)
+    with atomic_output(task.output_path) as temp_path:
+        pdf_hash = backend.finalize(
+            task.source_path, temp_path, task.placements, task.page_boxes
+        )
+    peak_memory = peak_memory_bytes()
+    logger.info(
+        f"Generated hash for document {task.document_id} with the {backend.name} "
+        f"backend: {pdf_hash}, peak memory {peak_memory / 2**20:.1f} MiB"
+    )
+    return DocumentFinalizationResult(
+        document_id=task.document_id,
+        output_path=task.output_path,
+        signed_hash=pdf_hash,
+        peak_memory_bytes=peak_memory,
+    )
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.FINALIZATION_PROCESS_POOL_SIZE,
+            initializer=limit_process_memory,
+            initargs=(settings.FINALIZATION_MEMORY_LIMIT_BYTES,),
+        )
+    return _process_pool
+
+
+def discard_process_pool() -> None:
+    """
+    Drop a pool broken by a process that died, e.g. killed by the OOM killer;
+    the next job starts a new one.
+    """
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False)
+        _process_pool = None
+
+
+def as_completed_with_heartbeat(futures, heartbeat, interval_seconds: float):
+    """
+    Yield ``futures`` as they complete, calling ``heartbeat`` whenever none
+    did for ``interval_seconds``, so that a job finalizing a single long
+    document is still known to be alive.
+    """
+    pending = set(futures)
+    while pending:
+        done, pending = wait(
+            pending, timeout=interval_seconds, return_when=FIRST_COMPLETED
+        )
+        if not done:
+            heartbeat()
+        yield from done
+
+
+def notify_signature_request_completed(
+    signature_request: SignatureRequest, signed_documents: list[tuple[str, Path]]
+) -> None:
+    recipients = [signature_request.sender.email] + [
+        signatory.email for signatory in signature_request.signatories
+    ]
+    for recipient in recipients:
+        # Failing to reach one party neither keeps the others from being
+        # notified nor fails the completed request
+        try:
+            send_signature_request_notification_email(
+                email_to=recipient,
+                signature_request_name=signature_request.name,
+                signature_request_id=signature_request.id,
+                status=signature_request.status.value,
+                documents=signed_documents,
+            )
+        except Exception:
+            logger.exception(
+                f"Notifying {recipient} of the completion of signature request "
+                f"{signature_request.id} failed"
+            )
+
+
+def run_finalization_job(session: Session, job: FinalizationJob) -> None:
+    """
+    Finalize the documents of a claimed job, then complete the signature
+    request and notify all the parties.
+
+    The documents are processed in parallel on the finalization process pool
+    and each one is committed as soon as its signed copy is in place, so a job
+    picked up again after a crash or a failure only redoes the documents that
+    were not finished. Finalizing is deterministic: a redone document gets the
+    same hash.
+    """
+    signature_request = job.signature_request
+    pending_documents = {
+        job_document.document_id: job_document
+        for job_document in job.documents
+        if job_document.status != FinalizationJobStatus.DONE
+    }
+    tasks = [
+        build_finalization_task(signature_request, job_document.document)
+        for job_document in pending_documents.values()
+    ]
+    for job_document in pending_documents.values():
+        job_document.status = FinalizationJobStatus.RUNNING
+        job_document.error = None
+        session.add(job_document)
+    session.commit()
+
+    errors: dict[int, str] = {}
+    futures = {}
+    if tasks:
+        pool = get_process_pool()
+        futures = {pool.submit(finalize_document_file, task): task for task in tasks}
+
+    def heartbeat() -> None:
+        finalization_job_crud.touch_job(session, job)
+        session.commit()
+
+    for future in as_completed_with_heartbeat(
+        futures, heartbeat, settings.FINALIZATION_HEARTBEAT_SECONDS
+    ):
+        job_document = pending_documents[futures[future].document_id]
+        try:
+            result = future.result()
+        except MemoryError:
+            logger.exception(
+                f"Finalization of document {job_document.document_id} ran out of memory"
+            )
+            errors[job_document.document_id] = (
+                "Memory limit of "
+                f"{settings.FINALIZATION_MEMORY_LIMIT_BYTES} bytes exceeded"
+            )
+        except Exception as exc:
+            logger.exception(
+                f"Finalization of document {job_document.document_id} failed"
+            )
+            if isinstance(exc, BrokenProcessPool):
+                discard_process_pool()
+            errors[job_document.document_id] = str(exc) or type(exc).__name__
+        else:
+            signed_copy = SavedUpload(
+                result.output_path,
+                result.signed_hash,
+                os.path.getsize(result.output_path),
+            )
+            store_signed_copy(session, job_document.document, signed_copy)
+            job_document.status = FinalizationJobStatus.DONE
+            job_document.signed_hash = result.signed_hash
+            job_document.peak_memory_bytes = result.peak_memory_bytes
+
+        if job_document.document_id in errors:
+            job_document.status = FinalizationJobStatus.FAILED
+            job_document.error = errors[job_document.document_id]
+        session.add(job_document)
+        finalization_job_crud.touch_job(session, job)
+        session.commit()
+
+    if errors:
+        finalization_job_crud.retry_or_fail_job(
+            session, job, f"Documents {sorted(errors)} could not be finalized"
+        )
+        return
+
+    # Already completed when the worker died before marking the job done
+    if signature_request.status != SignatureRequestStatus.COMPLETED:
+        for job_document in job.documents:
+            signed_document_crud.add_document_signature_details(
+                session,
+                DocumentSignatureDetailsCreate(
+                    document_id=job_document.document_id,
+                    signed_hash=job_document.signed_hash,
+                    timestamp=datetime.now(),
+                    ip_address=job.ip_address,
+                ),
+            )
+            job_document.document.status = DocumentStatus.SIGNED
+            session.add(job_document.document)
+        signature_request.status = SignatureRequestStatus.COMPLETED
+        session.add(signature_request)
+        session.commit()
+        # Render the preview of the signed copies, only their stamped pages
+        # differ from the already rendered originals
+        for job_document in job.documents:
+            page_render_job_crud.enqueue_page_render(session, job_document.document)
+
+    # Done before the emails are sent: a job run again would notify the
+    # parties already notified
+    finalization_job_crud.set_job_status(session, job, FinalizationJobStatus.DONE)
+    notify_signature_request_completed(
+        signature_request,
+        [
+            (
+                signed_document_filename(job_document.document),
+                signed_document_path(job_document.document),
+            )
+            for job_document in job.documents
+        ],
+    )
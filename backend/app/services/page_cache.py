@@ -0,0 +1,156 @@
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.crud import page_cache_crud
+from app.models.models import PageCacheEntry
+from app.services.file_service import UPLOAD_DIR
+from app.services.file_utils import RenderTier, TilePyramid
+from app.services.storage_layout import sharded_path
+
+logger = logging.getLogger(__name__)
+
+# Rendered pages are keyed by the SHA-256 of the PDF they come from and the
+# render parameters, so a replaced file never serves stale pages and
+# identical files, whoever uploaded them, share theirs. Each node caches them
+# on its own disk, and indexes and evicts only its own under
+# PAGE_CACHE_NODE_NAME.
+PAGE_CACHE_DIR = UPLOAD_DIR / "page_cache"
+# Recording every hit would turn each page view into a write
+TOUCH_INTERVAL = timedelta(minutes=1)
+# Eviction goes a bit below the budget, so that the next renders do not
+# immediately evict again
+EVICTION_TARGET_RATIO = 0.9
+EVICTION_BATCH_SIZE = 100
+
+
+def page_cache_path(file_hash: str, page_number: int, tier: RenderTier) -> Path:
+    return (
+        sharded_path(PAGE_CACHE_DIR, file_hash)
+        / tier.key
+        / f"page_{page_number}.{tier.extension}"
+    )
+
+
+def tile_cache_path(
+    file_hash: str,
+    page_number: int,
+    pyramid: TilePyramid,
+    level: int,
+    column: int,
+    row: int,
+) -> Path:
+    return (
+        sharded_path(PAGE_CACHE_DIR, file_hash)
+        / pyramid.key
+        / f"page_{page_number}"
+        / str(level)
+        / f"{column}_{row}.{pyramid.extension}"
+    )
+
+
+def page_cache_key(path: Path) -> str:
+    return path.relative_to(PAGE_CACHE_DIR).as_posix()
+
+
+def get_cache_entry(session: Session, path: Path) -> PageCacheEntry | None:
+    return page_cache_crud.get_entry(
+        session, settings.PAGE_CACHE_NODE_NAME, page_cache_key(path)
+    )
+
+
+def record_hit(session: Session, path: Path, file_hash: str) -> None:
+    node = settings.PAGE_CACHE_NODE_NAME
+    key = page_cache_key(path)
+    entry = page_cache_crud.get_entry(session, node, key)
+    if entry is None:
+        # Rendered before the index existed
+        page_cache_crud.upsert_entry(session, node, key, file_hash, path.stat().st_size)
+    elif datetime.now() - entry.last_accessed_at > TOUCH_INTERVAL:
+        page_cache_crud.touch_entry(session, entry)
+    page_cache_crud.increment_counter(session, "hits")
+    session.commit()
+
+
+def record_renders(
+    session: Session, paths: list[Path], file_hash: str, misses: int = 0
+) -> None:
+    """
+    Index freshly rendered page images, then evict the least recently served
+    ones if the cache went over its budget. ``misses`` counts the renders a
+    request waited for, as opposed to ones rendered ahead.
+    """
+    for path in paths:
+        page_cache_crud.upsert_entry(
+            session,
+            settings.PAGE_CACHE_NODE_NAME,
+            page_cache_key(path),
+            file_hash,
+            path.stat().st_size,
+        )
+    page_cache_crud.increment_counter(session, "misses", misses)
+    session.commit()
+    evict_page_cache(session, keep=[page_cache_key(path) for path in paths])
+
+
+def remove_cached_file(path: Path) -> None:
+    path.unlink(missing_ok=True)
+    # Drop the directories of the document and tier once they are empty
+    for parent in path.parents:
+        if parent == PAGE_CACHE_DIR:
+            break
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+
+
+def evict_page_cache(session: Session, keep: list[str] | None = None) -> int:
+    """
+    Delete the least recently served page images of this node until its
+    cache fits in ``PAGE_CACHE_MAX_BYTES`` again, never the ``keep`` ones,
+    and return the number of images deleted.
+    """
+    node = settings.PAGE_CACHE_NODE_NAME
+    total_size = page_cache_crud.get_total_size(session, node)
+    if total_size <= settings.PAGE_CACHE_MAX_BYTES:
+        return 0
+
+    target_size = settings.PAGE_CACHE_MAX_BYTES * EVICTION_TARGET_RATIO
+    evicted = 0
+    while total_size > target_size:
+        entries = page_cache_crud.lock_least_recently_used(
+            session, node, EVICTION_BATCH_SIZE, exclude=keep
+        )
+        if not entries:
+            break
+        keys = []
+        for entry in entries:
+            if total_size <= target_size:
+                break
+            remove_cached_file(PAGE_CACHE_DIR / entry.key)
+            keys.append(entry.key)
+            total_size -= entry.size_bytes
+        page_cache_crud.delete_entries(session, node, keys)
+        page_cache_crud.increment_counter(session, "evictions", len(keys))
+        session.commit()
+        evicted += len(keys)
+    logger.info(f"Evicted {evicted} page images, {total_size} bytes left")
+    return evicted
+
+
+def page_cache_stats(session: Session) -> dict:
+    """
+    Size of the page cache of this node, and counters of all the nodes.
+    """
+    node = settings.PAGE_CACHE_NODE_NAME
+    return {
+        "node": node,
+        "entries": page_cache_crud.count_entries(session, node),
+        "bytes": page_cache_crud.get_total_size(session, node),
+        "max_bytes": settings.PAGE_CACHE_MAX_BYTES,
+        **page_cache_crud.get_counters(session),
+    }
@@ -0,0 +1,219 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import BrokenExecutor, Executor, Future
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class RenderPriority(IntEnum):
+    """
+    Order in which queued renders start, lowest first.
+    """
+
+    # The first page of a document, what a signer opening a link waits for
+    FIRST_PAGE = 0
+    # Any other page or tile somebody is looking at
+    VIEW = 1
+    # Pages rendered ahead of being viewed, dropped first under load
+    PREFETCH = 2
+
+
+class RenderQueueFull(Exception):
+    """
+    Raised for a render that cannot be queued, or that was dropped from the
+    queue for a more urgent one.
+    """
+
+
+@dataclass
+class RenderTask:
+    key: str
+    priority: RenderPriority
+    function: Callable[..., Any]
+    args: tuple
+    future: Future = field(default_factory=Future)
+    queued_at: float = field(default_factory=time.monotonic)
+    started_at: float | None = None
+
+
+class RenderScheduler:
+    """
+    Runs renders on ``executor``, at most ``max_concurrency`` at once, the
+    others waiting in a priority queue of at most ``max_queue_depth``.
+
+    Renders are identified by a key, the path of the image they write: a
+    render already queued or running is shared by everybody asking for it,
+    and moved up the queue if a more urgent request comes in.
+
+    An executor broken by a process that died, e.g. killed by the OOM killer
+    on a huge page, fails the renders it was running with a
+    ``BrokenExecutor`` and is replaced by a new one from
+    ``executor_factory``, when given.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        max_concurrency: int,
+        max_queue_depth: int,
+        executor_factory: Callable[[], Executor] | None = None,
+    ) -> None:
+        self.executor = executor
+        self.executor_factory = executor_factory
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self._lock = threading.Lock()
+        # Heap of (priority, sequence, task), with stale entries left behind
+        # when a task is moved up or dropped
+        self._queue: list[tuple[int, int, RenderTask]] = []
+        self._sequence = itertools.count()
+        self._queued: dict[str, RenderTask] = {}
+        self._running: dict[str, RenderTask] = {}
+        self._counters: Counter[str] = Counter()
+        self._wait_seconds = 0.0
+
+    def submit(
+        self,
+        key: str,
+        priority: RenderPriority,
+        function: Callable[..., Any],
+        *args: Any,
+    ) -> Future:
+        """
+        Schedule ``function(*args)`` under ``key`` and return a future of its
+        result. Raises ``RenderQueueFull`` when the queue is full of renders
+        at least as urgent.
+        """
+        with self._lock:
+            self._counters["submitted"] += 1
+            task = self._running.get(key) or self._queued.get(key)
+            if task is not None:
+                self._counters["deduplicated"] += 1
+                if task.started_at is None and priority < task.priority:
+                    task.priority = priority
+                    self._push(task)
+                return task.future
+            task = RenderTask(key, priority, function, args)
+            if len(self._running) >= self.max_concurrency:
+                if len(self._queued) >= self.max_queue_depth:
+                    self._drop_for(task)
+                self._queued[key] = task
+                self._push(task)
+                return task.future
+            self._reserve(task)
+        self._execute(task)
+        return task.future
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued_by_priority = dict.fromkeys(
+                (priority.name.lower() for priority in RenderPriority), 0
+            )
+            for task in self._queued.values():
+                queued_by_priority[task.priority.name.lower()] += 1
+            now = time.monotonic()
+            started = self._counters["completed"] + self._counters["failed"]
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue_depth": self.max_queue_depth,
+                "running": len(self._running),
+                "queued": len(self._queued),
+                "queued_by_priority": queued_by_priority,
+                "oldest_queued_seconds": max(
+                    (now - task.queued_at for task in self._queued.values()),
+                    default=0.0,
+                ),
+                "average_wait_seconds": self._wait_seconds / started
+                if started
+                else 0.0,
+                **{
+                    name: self._counters[name]
+                    for name in (
+                        "submitted",
+                        "deduplicated",
+                        "rejected",
+                        "dropped",
+                        "completed",
+                        "failed",
+                        "executors_replaced",
+                    )
+                },
+            }
+
+    def _push(self, task: RenderTask) -> None:
+        heapq.heappush(self._queue, (task.priority, next(self._sequence), task))
+
+    def _drop_for(self, task: RenderTask) -> None:
+        # Make room by dropping the least urgent, most recent queued render
+        victim = max(
+            self._queued.values(),
+            key=lambda queued: (queued.priority, queued.queued_at),
+        )
+        if victim.priority <= task.priority:
+            self._counters["rejected"] += 1
+            raise RenderQueueFull(f"{len(self._queued)} renders already queued")
+        del self._queued[victim.key]
+        self._counters["dropped"] += 1
+        logger.info(f"Render queue full, dropped {victim.key}")
+        victim.future.set_exception(
+            RenderQueueFull(f"Dropped for a more urgent render than {victim.key}")
+        )
+
+    def _reserve(self, task: RenderTask) -> None:
+        task.started_at = time.monotonic()
+        self._running[task.key] = task
+
+    def _execute(self, task: RenderTask) -> None:
+        # Outside of the lock, as the callback runs right away for renders
+        # that are already done
+        executor = self.executor
+        try:
+            execution = executor.submit(task.function, *task.args)
+        except Exception as exc:
+            execution = Future()
+            execution.set_exception(exc)
+        execution.add_done_callback(lambda done: self._finish(task, done, executor))
+
+    def _replace_broken_executor(self, executor: Executor) -> None:
+        # Only once for all the renders the broken executor was running
+        with self._lock:
+            if self.executor_factory is None or self.executor is not executor:
+                return
+            self.executor = self.executor_factory()
+            self._counters["executors_replaced"] += 1
+        logger.warning("Render executor broken, replaced by a new one")
+        executor.shutdown(wait=False)
+
+    def _next_task(self) -> RenderTask | None:
+        while self._queue:
+            priority, _, task = heapq.heappop(self._queue)
+            if self._queued.get(task.key) is task and task.priority == priority:
+                del self._queued[task.key]
+                return task
+        return None
+
+    def _finish(self, task: RenderTask, execution: Future, executor: Executor) -> None:
+        if isinstance(execution.exception(), BrokenExecutor):
+            self._replace_broken_executor(executor)
+        with self._lock:
+            del self._running[task.key]
+            self._wait_seconds += task.started_at - task.queued_at
+            exception = execution.exception()
+            self._counters["failed" if exception else "completed"] += 1
+            next_task = self._next_task()
+            if next_task is not None:
+                self._reserve(next_task)
+        if exception is not None:
+            task.future.set_exception(exception)
+        else:
+            task.future.set_result(execution.result())
+        if next_task is not None:
+            self._execute(next_task)
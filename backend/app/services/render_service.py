@@ -0,0 +1,506 @@
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import fitz
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.crud import document_crud, field_crud, page_render_job_crud
+from app.models.models import (
+    Document,
+    DocumentStatus,
+    PageRenderJob,
+    PageRenderStatus,
+)
+from app.services.blob_store import document_file_path, signed_document_path
+from app.services.file_service import generate_pdf_hash
+from app.services.file_utils import (
+    RenderTier,
+    TilePyramid,
+    extract_page_geometry,
+    render_pdf_page,
+    render_pdf_pages,
+    render_pdf_tile,
+    upright_size,
+)
+from app.services.page_cache import (
+    page_cache_path,
+    record_hit,
+    record_renders,
+    tile_cache_path,
+)
+from app.services.render_scheduler import (
+    RenderPriority,
+    RenderQueueFull,
+    RenderScheduler,
+)
+
+logger = logging.getLogger(__name__)
+
+PAGE_URL_TEMPLATE = "/api/v1/documents/{document_id}/pages/{page_number}"
+SIGNED_PAGE_URL_TEMPLATE = "/api/v1/documents/{document_id}/signed-pages/{page_number}"
+RENDER_TIERS = {
+    tier.name: tier
+    for tier in (
+        RenderTier(
+            name="thumbnail",
+            width=settings.PAGE_THUMBNAIL_WIDTH,
+            image_format=settings.PAGE_IMAGE_FORMAT,
+            quality=settings.PAGE_IMAGE_QUALITY,
+        ),
+        RenderTier(
+            name="screen",
+            width=settings.PAGE_SCREEN_WIDTH,
+            image_format=settings.PAGE_IMAGE_FORMAT,
+            quality=settings.PAGE_IMAGE_QUALITY,
+        ),
+        RenderTier(
+            name="zoom",
+            dpi=settings.PAGE_ZOOM_DPI,
+            image_format=settings.PAGE_IMAGE_FORMAT,
+            quality=settings.PAGE_IMAGE_QUALITY,
+        ),
+    )
+}
+
+TILE_PYRAMID = TilePyramid(
+    tile_size=settings.PAGE_TILE_SIZE,
+    max_dpi=settings.PAGE_TILE_MAX_DPI,
+    image_format=settings.PAGE_IMAGE_FORMAT,
+    quality=settings.PAGE_IMAGE_QUALITY,
+)
+
+_render_pool: ProcessPoolExecutor | None = None
+_render_scheduler: RenderScheduler | None = None
+
+
+def signed_page_source(
+    document: Document, page_number: int, stamped_pages: set[int]
+) -> tuple[Path, str]:
+    """
+    File and SHA-256 a page of the signed copy of a document is rendered
+    from. Pages without fields look the same as in the original, so they
+    share its renders and only the stamped ones come from the signed copy.
+    """
+    if page_number in stamped_pages:
+        return signed_document_path(document), document.signature_details.signed_hash
+    return document_file_path(document), document.file_hash
+
+
+def page_image_version(file_hash: str, tier: RenderTier | TilePyramid) -> str:
+    """
+    Version of the images of a file at a render tier, part of their URLs so
+    that these can be cached for good.
+    """
+    return hashlib.sha256(f"{file_hash}/{tier.key}".encode()).hexdigest()[:16]
+
+
+def rasterize_page(
+    pdf_path: Path, page_number: int, output_path: Path, tier: RenderTier
+) -> Path:
+    with fitz.open(pdf_path) as pdf_document:
+        if not 1 <= page_number <= pdf_document.page_count:
+            raise IndexError(f"{pdf_path} has no page {page_number}")
+        logger.info(f"Rendering page {page_number} of {pdf_path} at {tier.key}")
+        return render_pdf_page(pdf_document, page_number, output_path, tier)
+
+
+def render_page(
+    pdf_path: Path, file_hash: str, page_number: int, tier: RenderTier
+) -> Path:
+    """
+    Path of the rendered page ``page_number`` of ``pdf_path`` at ``tier``,
+    only rendering that page on a cache miss.
+    """
+    cache_path = page_cache_path(file_hash, page_number, tier)
+    if cache_path.exists():
+        return cache_path
+    return rasterize_page(pdf_path, page_number, cache_path, tier)
+
+
+def create_render_executor() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=settings.RENDER_MAX_CONCURRENCY)
+
+
+def get_render_scheduler() -> RenderScheduler:
+    global _render_scheduler
+    if _render_scheduler is None:
+        _render_scheduler = RenderScheduler(
+            create_render_executor(),
+            settings.RENDER_MAX_CONCURRENCY,
+            settings.RENDER_MAX_QUEUE_DEPTH,
+            executor_factory=create_render_executor,
+        )
+    return _render_scheduler
+
+
+def prefetch_pages(
+    pdf_path: Path, file_hash: str, page_numbers: list[int], tier: RenderTier
+) -> None:
+    """
+    Queue the renders of ``page_numbers`` missing from the cache behind the
+    pages being viewed. They are indexed in the page cache on their first
+    hit.
+    """
+    scheduler = get_render_scheduler()
+    for page_number in page_numbers:
+        cache_path = page_cache_path(file_hash, page_number, tier)
+        if cache_path.exists():
+            continue
+        try:
+            scheduler.submit(
+                str(cache_path),
+                RenderPriority.PREFETCH,
+                rasterize_page,
+                pdf_path,
+                page_number,
+                cache_path,
+                tier,
+            )
+        except RenderQueueFull:
+            return
+
+
+def get_page_image(
+    session: Session,
+    pdf_path: Path,
+    file_hash: str,
+    page_number: int,
+    tier: RenderTier,
+    priority: RenderPriority = RenderPriority.VIEW,
+    page_count: int | None = None,
+) -> Path:
+    """
+    Like ``render_page``, rendering through the render scheduler and
+    recording the hit or miss in the page cache index. Given the
+    ``page_count``, a miss also prefetches the next pages.
+
+    Raises ``RenderQueueFull`` under load, ``TimeoutError`` when the render
+    takes longer than ``RENDER_WAIT_TIMEOUT_SECONDS`` and ``BrokenExecutor``
+    when a render process died.
+    """
+    cache_path = page_cache_path(file_hash, page_number, tier)
+    if cache_path.exists():
+        record_hit(session, cache_path, file_hash)
+        return cache_path
+    render = get_render_scheduler().submit(
+        str(cache_path),
+        priority,
+        rasterize_page,
+        pdf_path,
+        page_number,
+        cache_path,
+        tier,
+    )
+    if page_count is not None:
+        last_page = min(page_number + settings.RENDER_PREFETCH_PAGES, page_count)
+        prefetch_pages(
+            pdf_path, file_hash, list(range(page_number + 1, last_page + 1)), tier
+        )
+    render.result(timeout=settings.RENDER_WAIT_TIMEOUT_SECONDS)
+    record_renders(session, [cache_path], file_hash, misses=1)
+    return cache_path
+
+
+def is_tiled_page(width: float, height: float) -> bool:
+    return (
+        settings.PAGE_TILES_ENABLED
+        and max(width, height) >= settings.PAGE_TILES_MIN_PAGE_SIZE
+    )
+
+
+def rasterize_tile(
+    pdf_path: Path,
+    page_number: int,
+    level: int,
+    column: int,
+    row: int,
+    output_path: Path,
+) -> Path:
+    with fitz.open(pdf_path) as pdf_document:
+        if not 1 <= page_number <= pdf_document.page_count:
+            raise IndexError(f"{pdf_path} has no page {page_number}")
+        return render_pdf_tile(
+            pdf_document, page_number, TILE_PYRAMID, level, column, row, output_path
+        )
+
+
+def render_tile(
+    pdf_path: Path, file_hash: str, page_number: int, level: int, column: int, row: int
+) -> Path:
+    """
+    Path of one tile of the page ``page_number`` of ``pdf_path``, only
+    rendering that tile on a cache miss.
+    """
+    cache_path = tile_cache_path(
+        file_hash, page_number, TILE_PYRAMID, level, column, row
+    )
+    if cache_path.exists():
+        return cache_path
+    return rasterize_tile(pdf_path, page_number, level, column, row, cache_path)
+
+
+def get_tile_image(
+    session: Session,
+    pdf_path: Path,
+    file_hash: str,
+    page_number: int,
+    level: int,
+    column: int,
+    row: int,
+) -> Path:
+    """
+    Like ``render_tile``, rendering through the render scheduler and
+    recording the hit or miss in the page cache index.
+    """
+    cache_path = tile_cache_path(
+        file_hash, page_number, TILE_PYRAMID, level, column, row
+    )
+    if cache_path.exists():
+        record_hit(session, cache_path, file_hash)
+        return cache_path
+    get_render_scheduler().submit(
+        str(cache_path),
+        RenderPriority.VIEW,
+        rasterize_tile,
+        pdf_path,
+        page_number,
+        level,
+        column,
+        row,
+        cache_path,
+    ).result(timeout=settings.RENDER_WAIT_TIMEOUT_SECONDS)
+    record_renders(session, [cache_path], file_hash, misses=1)
+    return cache_path
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(
+            max_workers=settings.RENDER_PROCESS_POOL_SIZE
+        )
+    return _render_pool
+
+
+def discard_render_pool() -> None:
+    """
+    Drop a pool broken by a process that died, e.g. killed by the OOM killer;
+    the next large document starts a new one.
+    """
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False)
+        _render_pool = None
+
+
+def render_document_pages(
+    pdf_path: Path,
+    file_hash: str,
+    tiers: list[RenderTier] | None = None,
+    page_numbers: list[int] | None = None,
+) -> list[Path]:
+    """
+    Render the pages of ``pdf_path``, all of them unless ``page_numbers`` are
+    given, missing from the cache at each of ``tiers``, the prerendered tiers
+    by default, and return the paths of the rendered images. Large documents
+    are split across the render pool.
+    """
+    if tiers is None:
+        tiers = [RENDER_TIERS[name] for name in settings.PAGE_PRERENDER_TIERS]
+    with fitz.open(pdf_path) as pdf_document:
+        page_count = pdf_document.page_count
+    if page_numbers is None:
+        page_numbers = range(1, page_count + 1)
+    rendered = []
+    for tier in tiers:
+        missing = [
+            (page_number, page_cache_path(file_hash, page_number, tier))
+            for page_number in page_numbers
+            if not page_cache_path(file_hash, page_number, tier).exists()
+        ]
+        if (
+            len(missing) >= settings.RENDER_PARALLEL_MIN_PAGES
+            and settings.RENDER_PROCESS_POOL_SIZE > 1
+        ):
+            try:
+                render_pdf_pages(
+                    pdf_path,
+                    missing,
+                    get_render_pool(),
+                    settings.RENDER_PROCESS_POOL_SIZE,
+                    tier,
+                )
+            except BrokenProcessPool:
+                discard_render_pool()
+                raise
+        else:
+            render_pdf_pages(pdf_path, missing, tier=tier)
+        rendered.extend(cache_path for _, cache_path in missing)
+        logger.info(
+            f"Rendered {len(missing)} of the {page_count} pages of {pdf_path} "
+            f"at {tier.key}"
+        )
+    return rendered
+
+
+def render_signed_preview(
+    document: Document,
+    stamped_pages: set[int],
+    tiers: list[RenderTier] | None = None,
+) -> dict[str, list[Path]]:
+    """
+    Render the pages of the signed copy of a document missing from the page
+    cache, and return the paths of the rendered images by the hash of the
+    file they come from. Once the original is cached, as the render workers
+    do on upload, only the stamped pages are rasterized.
+    """
+    untouched_pages = [
+        page_number
+        for page_number in range(1, document.page_count + 1)
+        if page_number not in stamped_pages
+    ]
+    signed_hash = document.signature_details.signed_hash
+    return {
+        document.file_hash: render_document_pages(
+            document_file_path(document),
+            document.file_hash,
+            tiers,
+            untouched_pages,
+        ),
+        signed_hash: render_document_pages(
+            signed_document_path(document),
+            signed_hash,
+            tiers,
+            sorted(stamped_pages),
+        ),
+    }
+
+
+def ensure_document_metadata(session: Session, document: Document) -> None:
+    """
+    Record the hash and page geometry of documents uploaded before they were.
+    """
+    if document.file_hash is not None and document.page_count is not None:
+        return
+    source_path = document_file_path(document)
+    document.file_hash = generate_pdf_hash(source_path)
+    document_crud.set_document_pages(document, extract_page_geometry(source_path))
+    session.add(document)
+    session.commit()
+    session.refresh(document)
+
+
+def tile_levels(width: float, height: float) -> list[dict]:
+    """
+    Pixel size and grid of tiles of each level of the tile pyramid of an
+    upright page of ``width`` by ``height`` points.
+    """
+    levels = []
+    for level in range(TILE_PYRAMID.level_count(width, height)):
+        pixel_width, pixel_height = TILE_PYRAMID.pixel_size(level, width, height)
+        columns, rows = TILE_PYRAMID.grid(level, width, height)
+        levels.append(
+            {
+                "width": pixel_width,
+                "height": pixel_height,
+                "columns": columns,
+                "rows": rows,
+            }
+        )
+    return levels
+
+
+def image_versions(file_hash: str) -> dict[str, str]:
+    versions = {
+        tier.name: page_image_version(file_hash, tier) for tier in RENDER_TIERS.values()
+    }
+    versions["tiles"] = page_image_version(file_hash, TILE_PYRAMID)
+    return versions
+
+
+def document_page_manifest(
+    document: Document, token: str, stamped_pages: set[int] | None = None
+) -> list[dict] | None:
+    """
+    URL and pixel size of every render tier of every page of a document, for
+    the signing view; ``None`` while its pages are not known yet. Each image
+    is rendered on its first request, unless the render worker already did.
+
+    Large-format pages come with their tile pyramid instead of the zoom tier:
+    the URL template of their tiles and the size and grid of each level.
+
+    Given the ``stamped_pages`` of a signed document, the manifest is the one
+    of the preview of its signed copy.
+    """
+    if document.page_count is None or document.file_hash is None:
+        return None
+    url_template = PAGE_URL_TEMPLATE
+    versions = {document.file_hash: image_versions(document.file_hash)}
+    if stamped_pages is not None:
+        url_template = SIGNED_PAGE_URL_TEMPLATE
+        signed_hash = document.signature_details.signed_hash
+        versions[signed_hash] = image_versions(signed_hash)
+    manifest = []
+    for page in document.pages:
+        # Rendered images are upright, rotated pages swap their sides
+        width, height = upright_size(page)
+        url = url_template.format(document_id=document.id, page_number=page.page_number)
+        if stamped_pages and page.page_number in stamped_pages:
+            page_versions = versions[signed_hash]
+        else:
+            page_versions = versions[document.file_hash]
+        page_manifest = {"page_number": page.page_number}
+        tiled = is_tiled_page(width, height)
+        for tier in RENDER_TIERS.values():
+            if tiled and tier.name == "zoom":
+                continue
+            pixel_width, pixel_height = tier.pixel_size(width, height)
+            page_manifest[tier.name] = {
+                "url": (
+                    f"{url}?tier={tier.name}&v={page_versions[tier.name]}&token={token}"
+                ),
+                "width": pixel_width,
+                "height": pixel_height,
+            }
+        if tiled:
+            # The viewer fills in the level, column and row of each tile
+            page_manifest["tiles"] = {
+                "url": (
+                    f"{url}/tiles/{{level}}/{{column}}/{{row}}"
+                    f"?v={page_versions['tiles']}&token={token}"
+                ),
+                "tile_size": TILE_PYRAMID.tile_size,
+                "levels": tile_levels(width, height),
+            }
+        manifest.append(page_manifest)
+    return manifest
+
+
+def run_page_render_job(session: Session, job: PageRenderJob) -> None:
+    """
+    Warm the page cache of a document, and of the preview of its signed copy
+    once it is signed, so that nobody waits for a page to be rendered.
+    """
+    document = job.document
+    try:
+        ensure_document_metadata(session, document)
+        rendered = render_document_pages(
+            document_file_path(document), document.file_hash
+        )
+        record_renders(session, rendered, document.file_hash)
+        if document.status == DocumentStatus.SIGNED and document.signature_details:
+            stamped_pages = field_crud.get_document_field_pages(session, document.id)
+            for file_hash, paths in render_signed_preview(
+                document, stamped_pages
+            ).items():
+                record_renders(session, paths, file_hash)
+    except Exception as exc:
+        logger.exception(f"Rendering the pages of document {document.id} failed")
+        session.rollback()
+        page_render_job_crud.retry_or_fail_render_job(session, job, str(exc))
+        return
+    page_render_job_crud.set_render_job_status(session, job, PageRenderStatus.DONE)
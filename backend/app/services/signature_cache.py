@@ -0,0 +1,127 @@
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from functools import lru_cache
+
+import fitz
+from reportlab.lib.utils import ImageReader
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SignatureAppearanceCache:
+    """
+    Process-wide LRU of decoded signature appearances, bounded by a byte
+    budget rather than a number of entries.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key, loader):
+        """
+        Return the cached value for ``key``, calling ``loader`` on a miss.
+        ``loader`` returns the value and its size in bytes.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+        self.misses += 1
+        value, size = loader()
+        if size <= self.max_bytes:
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+signature_cache = SignatureAppearanceCache(settings.SIGNATURE_CACHE_MAX_BYTES)
+
+# Digests of the signature images last seen, one entry per image version
+IMAGE_DIGEST_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=IMAGE_DIGEST_CACHE_SIZE)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def signature_image_digest(image_path: str) -> str:
+    """
+    SHA-256 of a signature image, only recomputed when the file changes.
+    """
+    stat = os.stat(image_path)
+    return _file_digest(image_path, stat.st_mtime_ns, stat.st_size)
+
+
+def signature_key(signatory) -> tuple:
+    if signatory.signature_image:
+        return (signatory.id, signature_image_digest(signatory.signature_image))
+    return (signatory.id, f"{signatory.first_name} {signatory.last_name}")
+
+
+def signature_form_name(signatory) -> str:
+    """
+    Name of the form XObject holding a signatory's appearance in a document.
+    """
+    signatory_id, appearance = signature_key(signatory)
+    digest = hashlib.sha256(appearance.encode()).hexdigest()[:16]
+    return f"Signature{signatory_id}_{digest}"
+
+
+def get_signature_image_reader(signatory) -> ImageReader:
+    """
+    Decoded reportlab image of a signatory's signature.
+    """
+
+    def load():
+        logger.info(f"Decoding signature image {signatory.signature_image}")
+        reader = ImageReader(signatory.signature_image)
+        width, height = reader.getSize()
+        # The decoded RGB data, and at most one byte per pixel for the soft
+        # mask of a transparent image, stay with the reader
+        size = len(reader.getRGBData()) + width * height
+        return reader, size
+
+    return signature_cache.get(("reportlab", *signature_key(signatory)), load)
+
+
+def get_signature_pixmap(signatory) -> fitz.Pixmap:
+    """
+    Decoded PyMuPDF pixmap of a signatory's signature.
+    """
+
+    def load():
+        logger.info(f"Decoding signature image {signatory.signature_image}")
+        pixmap = fitz.Pixmap(signatory.signature_image)
+        return pixmap, len(pixmap.samples_mv)
+
+    return signature_cache.get(("pymupdf", *signature_key(signatory)), load)
@@ -0,0 +1,351 @@
+import hashlib
+import io
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from pathlib import Path
+
+import fitz
+
+from app.core.config import settings
+from app.models.models import FieldType
+from app.services.signature_cache import get_signature_pixmap, signature_key
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+HANDWRITING_FONT_FILE = "static/fonts/Allura-Regular.ttf"
+HANDWRITING_FONT_SIZE = 24
+# The trailer, holding the /ID of the file, is always within its last bytes
+TRAILER_SEARCH_SIZE = 4096
+# MuPDF rejects longer passwords, and the 128-bit standard security handler
+# only uses the first 32 bytes of one anyway
+OWNER_PASSWORD_LENGTH = 32
+# MuPDF writes each /ID entry as a hexadecimal or as a literal string,
+# depending on its bytes
+PDF_STRING_PATTERN = rb"(?:<[0-9A-Fa-f\s]*>|\((?:\\.|[^\\()])*\))"
+TRAILER_ID_PATTERN = re.compile(
+    rb"/ID\s*\[\s*(%s)\s*(%s)\s*\]" % (PDF_STRING_PATTERN, PDF_STRING_PATTERN),
+    re.DOTALL,
+)
+
+
+def group_fields_by_page(placements):
+    """
+    Group (field, signatory) placements by their 1-indexed page number.
+    """
+    pages = defaultdict(list)
+    for field, signatory in placements:
+        pages[field.page].append((field, signatory))
+    return dict(sorted(pages.items()))
+
+
+def copy_file_with_hash(source_path, output_path):
+    """
+    Copy ``source_path`` to ``output_path`` in fixed-size chunks and return
+    the running SHA-256 of the copied bytes.
+    """
+    sha256 = hashlib.sha256()
+    with open(source_path, "rb") as src, open(output_path, "wb") as dst:
+        for chunk in iter(lambda: src.read(HASH_CHUNK_SIZE), b""):
+            dst.write(chunk)
+            sha256.update(chunk)
+    return sha256
+
+
+def update_hash_from_file(sha256, file_path, offset=0):
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256
+
+
+def document_file_id(source_path, placements, source_sha256=None) -> bytes:
+    """
+    16 bytes identifying a stamped copy, derived from the source file and the
+    placements, so that stamping the same document twice produces the same
+    bytes. ``source_sha256`` saves reading the source again when its hash is
+    already at hand.
+    """
+    if source_sha256 is None:
+        source_sha256 = update_hash_from_file(hashlib.sha256(), source_path)
+    sha256 = source_sha256.copy()
+    sha256.update(repr(placements).encode())
+    return sha256.digest()[:16]
+
+
+def pdf_owner_password() -> str:
+    """
+    Owner password of the signed copies, derived from ``SECRET_KEY`` so that
+    it fits the length every PDF library accepts, whatever the key.
+    """
+    digest = hashlib.sha256(f"pdf-owner:{settings.SECRET_KEY}".encode())
+    return digest.hexdigest()[:OWNER_PASSWORD_LENGTH]
+
+
+def pin_trailer_id(pdf_path, file_id: bytes) -> None:
+    """
+    Overwrite, in place, the second /ID entry MuPDF draws at random on every
+    save. The trailer comes after the cross-reference table, so rewriting it
+    moves no offset even when the entry changes length.
+    """
+    with open(pdf_path, "r+b") as f:
+        f.seek(0, os.SEEK_END)
+        tail_offset = max(f.tell() - TRAILER_SEARCH_SIZE, 0)
+        f.seek(tail_offset)
+        tail = f.read()
+        matches = list(TRAILER_ID_PATTERN.finditer(tail))
+        if not matches:
+            raise ValueError(f"No trailer /ID found in {pdf_path}")
+        match = matches[-1]
+        f.seek(tail_offset + match.start(2))
+        f.write(b"<" + file_id.hex().upper().encode() + b">")
+        f.write(tail[match.end(2) :])
+        f.truncate()
+
+
+class TailDeferringHashWriter:
+    """
+    Write-only binary sink hashing the bytes written to ``stream`` as they
+    go, except for the last ``tail_size`` ones, which may still be rewritten
+    in place once the write is over: the caller hashes them from
+    ``hashed_bytes`` on after that.
+    """
+
+    def __init__(self, stream, tail_size):
+        self.stream = stream
+        self.tail_size = tail_size
+        self.sha256 = hashlib.sha256()
+        self.pending = bytearray()
+        self.hashed_bytes = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.pending += data
+        excess = len(self.pending) - self.tail_size
+        if excess > 0:
+            self.sha256.update(self.pending[:excess])
+            del self.pending[:excess]
+            self.hashed_bytes += excess
+        return len(data)
+
+    def tell(self):
+        return self.hashed_bytes + len(self.pending)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # Looked for by PyMuPDF, which writes sequentially
+        position = {os.SEEK_SET: 0, os.SEEK_CUR: self.tell(), os.SEEK_END: self.tell()}
+        if position[whence] + offset != self.tell():
+            raise io.UnsupportedOperation("seek")
+        return self.tell()
+
+
+class StampingBackend(ABC):
+    """
+    Draws document fields onto PDFs and writes the stamped or signed copy.
+
+    Field coordinates are in PDF points with the origin at the bottom-left
+    corner of the page, whatever the backend. On pages turned by their
+    /Rotate entry they are taken on the page as displayed, upright, as the
+    signers see and place them.
+    """
+
+    name: str
+
+    @abstractmethod
+    def draw_doc_field(self, target, field, signatory):
+        """
+        Draw one field on ``target``, the backend specific drawing surface.
+        """
+
+    @abstractmethod
+    def stamp(self, source_path, output_path, placements, page_boxes=None):
+        """
+        Write a copy of ``source_path`` carrying all the placements to
+        ``output_path`` and return that path.
+
+        ``page_boxes`` maps page numbers to their known ``PageGeometry``, the
+        backend reads it from the PDF when it is not given.
+        """
+
+    @abstractmethod
+    def finalize(self, source_path, output_path, placements, page_boxes=None):
+        """
+        Write the signed, permission-restricted copy of ``source_path`` to
+        ``output_path`` and return its SHA-256. Finalizing the same source
+        with the same placements always produces the same bytes.
+        """
+
+
+class PyMuPDFStampingBackend(StampingBackend):
+    """
+    Draws the fields straight onto the pages with PyMuPDF.
+
+    Without encryption the stamped copy is saved as an incremental update:
+    the original bytes are copied as they are and only the new objects are
+    appended. An incremental update cannot add encryption, so signed copies
+    are fully saved when ``SIGNED_PDF_ENCRYPTION`` is on, MuPDF then copies
+    the untouched streams without decoding them. Either way the bulk of the
+    output is hashed as it is written, only the appended update or the
+    rewritten trailer is read back.
+    """
+
+    name = "pymupdf"
+
+    def __init__(self):
+        # xref of each signature image already embedded in the document being
+        # stamped, later placements only reference it
+        self.signature_xrefs = {}
+
+    def draw_doc_field(self, target, field, signatory):
+        logger.info(f"Drawing field type: {field.type}")
+        if field.type == FieldType.SIGNATURE:
+            self.draw_signature_field(target, field, signatory)
+        elif field.type in (FieldType.TEXT, FieldType.READ_ONLY_TEXT):
+            self.draw_string(target, field.x, field.y, field.text)
+        elif field.type == FieldType.MENTION:
+            self.draw_string(target, field.x, field.y, f"{field.mention}")
+        elif field.type == FieldType.CHECKBOX:
+            self.draw_checkbox_field(target, field)
+        elif field.type == FieldType.RADIO_GROUP:
+            self.draw_radio_group_field(target, field)
+
+    @staticmethod
+    def to_page_point(page, x, y):
+        # PyMuPDF measures y downwards from the top of the page as displayed,
+        # and draws in the coordinates of the page before its rotation
+        return fitz.Point(x, page.rect.height - y) * page.derotation_matrix
+
+    def draw_string(self, page, x, y, text, fontsize=12, **font):
+        if not text:
+            return
+        font.setdefault("fontname", "helv")
+        page.insert_text(
+            self.to_page_point(page, x, y),
+            text,
+            fontsize=fontsize,
+            rotate=page.rotation,
+            **font,
+        )
+
+    def draw_signature_field(self, page, field, signatory):
+        if signatory.signature_image:
+            top = page.rect.height - field.y - field.height
+            rect = (
+                fitz.Rect(field.x, top, field.x + field.width, top + field.height)
+                * page.derotation_matrix
+            )
+            key = signature_key(signatory)
+            if key in self.signature_xrefs:
+                page.insert_image(
+                    rect,
+                    xref=self.signature_xrefs[key],
+                    keep_proportion=False,
+                    rotate=page.rotation,
+                )
+            else:
+                self.signature_xrefs[key] = page.insert_image(
+                    rect,
+                    pixmap=get_signature_pixmap(signatory),
+                    keep_proportion=False,
+                    rotate=page.rotation,
+                )
+        else:
+            self.draw_string(
+                page,
+                field.x,
+                field.y,
+                f"{signatory.first_name} {signatory.last_name}",
+                fontsize=HANDWRITING_FONT_SIZE,
+                fontname="Handwriting",
+                fontfile=HANDWRITING_FONT_FILE,
+            )
+
+    def draw_checkbox_field(self, page, field):
+        if field.checked:
+            left, bottom = field.x, field.y
+            right, top = left + field.size / 2, bottom + field.size / 2
+            page.draw_line(
+                self.to_page_point(page, left, bottom),
+                self.to_page_point(page, right, top),
+            )
+            page.draw_line(
+                self.to_page_point(page, left, top),
+                self.to_page_point(page, right, bottom),
+            )
+
+    def draw_radio_group_field(self, page, field):
+        for radio in field.radios:
+            center = self.to_page_point(page, radio.x, radio.y)
+            page.draw_circle(center, radio.size / 2)
+            if radio.checked:
+                page.draw_circle(center, radio.size / 4, fill=(0, 0, 0))
+
+    def draw_placements(self, document, placements):
+        self.signature_xrefs = {}
+        for page_number, page_placements in group_fields_by_page(placements).items():
+            page = document[page_number - 1]
+            for field, signatory in page_placements:
+                self.draw_doc_field(page, field, signatory)
+
+    @staticmethod
+    def ensure_trailer_id(document, file_id: bytes) -> None:
+        # The first /ID entry keys the encryption, MuPDF only draws one at
+        # random when the source has none
+        if document.xref_get_key(-1, "ID")[0] != "array":
+            document.xref_set_key(-1, "ID", f"[<{file_id.hex()}><{file_id.hex()}>]")
+
+    def stamp_incrementally(self, source_path, output_path, placements):
+        Path(output_path).parent.mkdir(exist_ok=True)
+        sha256 = copy_file_with_hash(source_path, output_path)
+        file_id = document_file_id(source_path, placements, source_sha256=sha256)
+        original_size = Path(output_path).stat().st_size
+        document = fitz.open(output_path)
+        try:
+            self.draw_placements(document, placements)
+            self.ensure_trailer_id(document, file_id)
+            document.save(
+                output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP
+            )
+        finally:
+            document.close()
+        pin_trailer_id(output_path, file_id)
+        # Only the appended update still has to be hashed
+        return update_hash_from_file(sha256, output_path, offset=original_size)
+
+    def stamp(self, source_path, output_path, placements, page_boxes=None):
+        self.stamp_incrementally(source_path, output_path, placements)
+        logger.info(f"Written updated PDF to {output_path}")
+        return Path(output_path)
+
+    def finalize(self, source_path, output_path, placements, page_boxes=None):
+        if not settings.SIGNED_PDF_ENCRYPTION:
+            sha256 = self.stamp_incrementally(source_path, output_path, placements)
+            logger.info(f"Written signed PDF to {output_path}")
+            return sha256.hexdigest()
+
+        Path(output_path).parent.mkdir(exist_ok=True)
+        file_id = document_file_id(source_path, placements)
+        document = fitz.open(source_path)
+        try:
+            self.draw_placements(document, placements)
+            self.ensure_trailer_id(document, file_id)
+            with open(output_path, "wb") as output_stream:
+                # Hashed while written, but for the trailer pinned after
+                sink = TailDeferringHashWriter(output_stream, TRAILER_SEARCH_SIZE)
+                document.save(
+                    sink,
+                    encryption=fitz.PDF_ENCRYPT_RC4_128,
+                    owner_pw=pdf_owner_password(),
+                    user_pw="",
+                    permissions=fitz.PDF_PERM_PRINT | fitz.PDF_PERM_PRINT_HQ,
+                )
+        finally:
+            document.close()
+        pin_trailer_id(output_path, file_id)
+        logger.info(f"Written signed PDF to {output_path}")
+        sha256 = update_hash_from_file(sink.sha256, output_path, sink.hashed_bytes)
+        return sha256.hexdigest()
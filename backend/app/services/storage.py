@@ -0,0 +1,407 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from pathlib import Path
+from urllib.parse import quote
+
+from app.core.config import settings
+from app.services.file_service import UPLOAD_DIR
+from app.services.file_utils import atomic_output
+from app.services.page_cache import EVICTION_TARGET_RATIO
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+# Local copies of the files of a remote backend, for the libraries that read
+# them from disk. Stored files never change, so these never go stale; the
+# least recently used are evicted past STORAGE_CACHE_MAX_BYTES.
+STORAGE_CACHE_DIR = UPLOAD_DIR / "storage_cache"
+# Copies used this recently may still be being read, and are never evicted
+CACHE_GRACE_SECONDS = 5 * 60
+
+_storage: "StorageBackend | None" = None
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def evict_local_cache(
+    cache_dir: Path, max_bytes: int, keep: tuple[Path, ...] = ()
+) -> int:
+    """
+    Delete the least recently used files of ``cache_dir``, by modification
+    time, until it fits in ``max_bytes`` again, never the ``keep`` ones nor
+    those used in the last ``CACHE_GRACE_SECONDS``, and return the number of
+    files deleted.
+    """
+    files = []
+    total_size = 0
+    for root, _dirs, names in os.walk(cache_dir):
+        for name in names:
+            if name.startswith("."):
+                # Being written
+                continue
+            path = Path(root) / name
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+    if total_size <= max_bytes:
+        return 0
+
+    target_size = max_bytes * EVICTION_TARGET_RATIO
+    recently_used = time.time() - CACHE_GRACE_SECONDS
+    evicted = 0
+    for mtime, size, path in sorted(files):
+        if total_size <= target_size or mtime > recently_used:
+            break
+        if path in keep:
+            continue
+        path.unlink(missing_ok=True)
+        total_size -= size
+        evicted += 1
+        # Drop the shard directories once they are empty
+        for parent in path.parents:
+            if parent == cache_dir:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+    logger.info(f"Evicted {evicted} local copies, {total_size} bytes left")
+    return evicted
+
+
+class StorageBackend(ABC):
+    """
+    Keeps the stored files, documents and their signed copies, under keys
+    such as ``blobs/ab/cd/<sha256>``. Stored files are written once and never
+    modified.
+    """
+
+    name: str
+    # Whether ``local_path`` is the stored file itself rather than a copy,
+    # which the API then serves straight from disk
+    is_local: bool = False
+
+    @abstractmethod
+    def put(self, key: str, source_path: Path, move: bool = False) -> None:
+        """
+        Store the local file ``source_path`` under ``key``, moving it rather
+        than copying it with ``move``.
+        """
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """
+        Whole content of ``key``. Raises ``FileNotFoundError`` when missing.
+        """
+
+    @abstractmethod
+    def stream(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> Iterator[bytes]:
+        """
+        Content of ``key`` from byte ``start`` to byte ``end`` included, or to
+        its end, in chunks. Raises ``FileNotFoundError`` when missing.
+        """
+
+    @abstractmethod
+    def size(self, key: str) -> int | None:
+        """
+        Size of ``key`` in bytes, ``None`` when missing.
+        """
+
+    def exists(self, key: str) -> bool:
+        return self.size(key) is not None
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Delete ``key``, if stored.
+        """
+
+    @abstractmethod
+    def presign(
+        self,
+        key: str,
+        expires_in: int,
+        filename: str | None = None,
+        media_type: str | None = None,
+    ) -> str | None:
+        """
+        URL downloading ``key`` without credentials for ``expires_in``
+        seconds, ``None`` when the backend cannot issue one.
+        """
+
+    @abstractmethod
+    def local_path(self, key: str) -> Path:
+        """
+        Path of a local copy of ``key``, for the libraries reading files from
+        disk. It does not exist when ``key`` is missing.
+        """
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Files on the local disk, under ``root``. API nodes then need a shared
+    volume to scale out.
+    """
+
+    name = "local"
+    is_local = True
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+    def put(self, key: str, source_path: Path, move: bool = False) -> None:
+        path = self.local_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if move:
+            os.replace(source_path, path)
+            return
+        with atomic_output(path) as temp_path:
+            try:
+                # Stored files are never modified, so a link is as good as a
+                # copy
+                os.link(source_path, temp_path)
+            except OSError:
+                shutil.copyfile(source_path, temp_path)
+
+    def get(self, key: str) -> bytes:
+        return self.local_path(key).read_bytes()
+
+    def stream(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> Iterator[bytes]:
+        with open(self.local_path(key), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = STREAM_CHUNK_SIZE
+                if remaining is not None:
+                    size = min(size, remaining)
+                    remaining -= size
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def size(self, key: str) -> int | None:
+        try:
+            return self.local_path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str) -> None:
+        self.local_path(key).unlink(missing_ok=True)
+
+    def presign(
+        self,
+        key: str,
+        expires_in: int,
+        filename: str | None = None,
+        media_type: str | None = None,
+    ) -> str | None:
+        # Served by the API itself
+        return None
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Objects of an S3 bucket, on AWS or on any S3-compatible store such as
+    MinIO, shared by all the API nodes. Files read from disk, to render or
+    stamp them, are downloaded once per node to ``cache_dir``, which is kept
+    under ``cache_max_bytes``.
+    """
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        cache_dir: Path,
+        endpoint_url: str | None = None,
+        region: str | None = None,
+        access_key_id: str | None = None,
+        secret_access_key: str | None = None,
+        cache_max_bytes: int | None = None,
+        client=None,
+    ):
+        self.bucket = bucket
+        self.cache_dir = Path(cache_dir)
+        self.cache_max_bytes = cache_max_bytes
+        self._cache_lock = threading.Lock()
+        # Bytes this process added to the cache since it last evicted, as
+        # many as the budget to check it on the first addition
+        self._cache_bytes_added = cache_max_bytes or 0
+        if client is None:
+            # Only needed with this backend
+            import boto3
+            from botocore.config import Config
+
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                region_name=region,
+                aws_access_key_id=access_key_id,
+                aws_secret_access_key=secret_access_key,
+                config=Config(
+                    signature_version="s3v4",
+                    # Buckets of self-hosted stores rarely have a DNS name
+                    s3={"addressing_style": "path" if endpoint_url else "auto"},
+                ),
+            )
+        self.client = client
+
+    @staticmethod
+    def is_missing(error: Exception) -> bool:
+        response = getattr(error, "response", None) or {}
+        code = response.get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def get_object(self, key: str, **kwargs) -> dict:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key, **kwargs)
+        except Exception as e:
+            if self.is_missing(e):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def local_path(self, key: str) -> Path:
+        path = self.cache_dir / key
+        try:
+            # Marks the copy as recently used
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+        try:
+            with atomic_output(path) as temp_path:
+                self.client.download_file(self.bucket, key, str(temp_path))
+        except Exception as e:
+            if not self.is_missing(e):
+                raise
+            return path
+        self.add_to_cache(path)
+        return path
+
+    def add_to_cache(self, path: Path) -> None:
+        """
+        Account for a new local copy, evicting the least recently used ones
+        once this process added a tenth of the budget since it last did. Each
+        process evicting on its own additions, the cache may briefly go over
+        by that much per process.
+        """
+        if not self.cache_max_bytes:
+            return
+        with self._cache_lock:
+            self._cache_bytes_added += path.stat().st_size
+            due = self._cache_bytes_added >= self.cache_max_bytes * (
+                1 - EVICTION_TARGET_RATIO
+            )
+            if due:
+                self._cache_bytes_added = 0
+        if due:
+            evict_local_cache(self.cache_dir, self.cache_max_bytes, keep=(path,))
+
+    def put(self, key: str, source_path: Path, move: bool = False) -> None:
+        self.client.upload_file(str(source_path), self.bucket, key)
+        if move:
+            # Kept as the local copy, the file is usually read right after
+            path = self.cache_dir / key
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(source_path, path)
+            self.add_to_cache(path)
+
+    def get(self, key: str) -> bytes:
+        return self.get_object(key)["Body"].read()
+
+    def stream(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        body = self.get_object(key, Range=byte_range)["Body"]
+        try:
+            yield from body.iter_chunks(STREAM_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def size(self, key: str) -> int | None:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except Exception as e:
+            if self.is_missing(e):
+                return None
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        (self.cache_dir / key).unlink(missing_ok=True)
+
+    def presign(
+        self,
+        key: str,
+        expires_in: int,
+        filename: str | None = None,
+        media_type: str | None = None,
+    ) -> str | None:
+        params = {"Bucket": self.bucket, "Key": key}
+        if filename is not None:
+            params["ResponseContentDisposition"] = content_disposition(filename)
+        if media_type is not None:
+            params["ResponseContentType"] = media_type
+        return self.client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=expires_in
+        )
+
+
+def create_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "s3":
+        return S3StorageBackend(
+            settings.STORAGE_S3_BUCKET,
+            STORAGE_CACHE_DIR,
+            endpoint_url=settings.STORAGE_S3_ENDPOINT_URL,
+            region=settings.STORAGE_S3_REGION,
+            access_key_id=settings.STORAGE_S3_ACCESS_KEY_ID,
+            secret_access_key=settings.STORAGE_S3_SECRET_ACCESS_KEY,
+            cache_max_bytes=settings.STORAGE_CACHE_MAX_BYTES,
+        )
+    return LocalStorageBackend(UPLOAD_DIR)
+
+
+def get_storage() -> StorageBackend:
+    """
+    Return the storage backend selected by ``STORAGE_BACKEND``.
+    """
+    global _storage
+    if _storage is None:
+        _storage = create_storage()
+    return _storage
+
+
+def presigned_download_url(
+    key: str, filename: str | None = None, media_type: str | None = None
+) -> str | None:
+    """
+    Presigned URL to redirect downloads of ``key`` to, with
+    ``STORAGE_PRESIGNED_DOWNLOADS`` on a backend issuing them.
+    """
+    if not settings.STORAGE_PRESIGNED_DOWNLOADS:
+        return None
+    return get_storage().presign(
+        key, settings.STORAGE_PRESIGN_EXPIRES_SECONDS, filename, media_type
+    )
@@ -0,0 +1,26 @@
+from pathlib import Path
+
+# Files named after a SHA-256 are spread over SHARD_LEVELS levels of
+# directories named after its next SHARD_WIDTH hex digits: at 256 entries
+# per level, no directory grows large enough to slow down lookups, listings
+# and backups, even with millions of files
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+
+def shard_dir(root: Path, sha256: str) -> Path:
+    """
+    Directory of ``root`` holding the files named after ``sha256``, e.g.
+    ``root/ab/cd`` for ``abcd...``.
+    """
+    for level in range(SHARD_LEVELS):
+        root = root / sha256[level * SHARD_WIDTH : (level + 1) * SHARD_WIDTH]
+    return root
+
+
+def sharded_path(root: Path, sha256: str) -> Path:
+    return shard_dir(root, sha256) / sha256
+
+
+def is_sha256(name: str) -> bool:
+    return len(name) == 64 and all(char in "0123456789abcdef" for char in name)
@@ -0,0 +1,188 @@
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.crud import blob_crud, document_crud, page_cache_crud
+from app.models.models import Document, DocumentStatus
+from app.services import page_cache
+from app.services.blob_store import (
+    blob_key,
+    legacy_document_path,
+    legacy_signed_document_path,
+)
+from app.services.file_service import generate_pdf_hash
+from app.services.storage import get_storage
+from app.services.storage_layout import SHARD_WIDTH, is_sha256, sharded_path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MigrationStats:
+    moved: int = 0
+    missing: int = 0
+    skipped: int = 0
+
+
+def adopt_legacy_file(session: Session, path: Path) -> str | None:
+    """
+    Take a reference to the blob of a file stored before the blob store,
+    copying the file to the storage backend unless the same content already
+    is, and return its SHA-256. The legacy file is left in place for the documents
+    still reading it until the caller commits.
+    """
+    if not path.exists():
+        return None
+    sha256 = generate_pdf_hash(path)
+    # Flushed first: the locked blob row cannot lose its last reference, and
+    # its file, while the file is copied
+    blob_crud.acquire_blob(session, sha256, path.stat().st_size)
+    session.flush()
+    storage = get_storage()
+    if not storage.exists(blob_key(sha256)):
+        storage.put(blob_key(sha256), path)
+    return sha256
+
+
+def remove_legacy_file(
+    session: Session, document: Document, path: Path, signed: bool
+) -> None:
+    # Files were named after their owner and name, so documents uploaded
+    # again under the same name shared theirs
+    if not document_crud.count_documents_sharing_legacy_file(session, document, signed):
+        path.unlink(missing_ok=True)
+
+
+def adopt_document_files(
+    session: Session, document: Document, stats: MigrationStats
+) -> list[tuple[Path, bool]]:
+    legacy_paths = []
+    if document.blob_sha256 is None:
+        path = legacy_document_path(document)
+        document.blob_sha256 = adopt_legacy_file(session, path)
+        if document.blob_sha256 is None:
+            logger.warning(f"File of document {document.id} missing at {path}")
+            stats.missing += 1
+        else:
+            document.file_hash = document.file_hash or document.blob_sha256
+            legacy_paths.append((path, False))
+    if document.status == DocumentStatus.SIGNED and document.signed_blob_sha256 is None:
+        path = legacy_signed_document_path(document)
+        document.signed_blob_sha256 = adopt_legacy_file(session, path)
+        if document.signed_blob_sha256 is None:
+            logger.warning(f"Signed copy of document {document.id} missing at {path}")
+            stats.missing += 1
+        else:
+            legacy_paths.append((path, True))
+    session.add(document)
+    session.commit()
+    return legacy_paths
+
+
+def migrate_document(session: Session, document_id: int, stats: MigrationStats) -> None:
+    """
+    Move the file and signed copy of a document stored before the blob store
+    into it, and point the document at them.
+    """
+    document = document_crud.lock_document(session, document_id)
+    if document is None:
+        # Being updated, the next run picks it up
+        stats.skipped += 1
+        return
+    try:
+        legacy_paths = adopt_document_files(session, document, stats)
+    except IntegrityError:
+        # Somebody else stored the same content at the same time, the next
+        # run picks it up
+        session.rollback()
+        stats.skipped += 1
+        return
+    for path, signed in legacy_paths:
+        remove_legacy_file(session, document, path, signed)
+    stats.moved += len(legacy_paths)
+
+
+def migrate_document_files(
+    session: Session, batch_size: int = 100, pause_seconds: float = 0
+) -> MigrationStats:
+    """
+    Move the files of the documents stored before the blob store into it,
+    ``batch_size`` documents at a time, pausing ``pause_seconds`` in between
+    to leave disk bandwidth to the application. Documents are migrated one
+    transaction each while the application runs: every one of them reads
+    from its old path until it is committed and from the store after.
+    Documents whose file is missing are logged and left as they are.
+    """
+    stats = MigrationStats()
+    after_id = 0
+    while documents := document_crud.get_documents_with_legacy_files(
+        session, after_id, batch_size
+    ):
+        for document_id in [document.id for document in documents]:
+            migrate_document(session, document_id, stats)
+        after_id = documents[-1].id
+        logger.info(
+            f"Migrated the files of documents up to {after_id}: {stats.moved} "
+            f"moved, {stats.missing} missing, {stats.skipped} skipped"
+        )
+        time.sleep(pause_seconds)
+    return stats
+
+
+def legacy_page_cache_dirs() -> list[Path]:
+    """
+    Directories of the page cache holding the images of one file, laid out
+    as ``ab/<sha256>`` before it was sharded over two levels.
+    """
+    if not page_cache.PAGE_CACHE_DIR.exists():
+        return []
+    return [
+        file_dir
+        for prefix_dir in sorted(page_cache.PAGE_CACHE_DIR.iterdir())
+        if prefix_dir.is_dir() and len(prefix_dir.name) == SHARD_WIDTH
+        for file_dir in sorted(prefix_dir.iterdir())
+        if is_sha256(file_dir.name)
+    ]
+
+
+def migrate_page_cache_dir(session: Session, old_dir: Path) -> None:
+    new_dir = sharded_path(page_cache.PAGE_CACHE_DIR, old_dir.name)
+    old_prefix = f"{page_cache.page_cache_key(old_dir)}/"
+    new_prefix = f"{page_cache.page_cache_key(new_dir)}/"
+    if new_dir.exists():
+        # Rendered again since the layout changed
+        shutil.rmtree(old_dir, ignore_errors=True)
+        page_cache_crud.delete_entries_with_prefix(
+            session, settings.PAGE_CACHE_NODE_NAME, old_prefix
+        )
+    else:
+        new_dir.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(old_dir, new_dir)
+        page_cache_crud.move_entries(
+            session, settings.PAGE_CACHE_NODE_NAME, old_prefix, new_prefix
+        )
+    session.commit()
+
+
+def migrate_page_cache(
+    session: Session, batch_size: int = 100, pause_seconds: float = 0
+) -> int:
+    """
+    Move the page images cached under the unsharded layout to the sharded
+    one, along with their index entries, one file at a time, and return the
+    number of files whose images were moved.
+    """
+    old_dirs = legacy_page_cache_dirs()
+    for count, old_dir in enumerate(old_dirs, start=1):
+        migrate_page_cache_dir(session, old_dir)
+        if count % batch_size == 0:
+            logger.info(f"Moved the cached pages of {count} files")
+            time.sleep(pause_seconds)
+    return len(old_dirs)
@@ -0,0 +1,101 @@
+import logging
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import anyio
+from fastapi import HTTPException
+from sqlmodel import Session
+from starlette.requests import ClientDisconnect
+
+from app.crud import upload_session_crud
+from app.models.models import UploadSession
+from app.services.file_service import (
+    PDF_HEADER,
+    PDF_HEADER_SEARCH_BYTES,
+    UPLOAD_DIR,
+    SavedUpload,
+    generate_pdf_hash,
+    not_a_pdf,
+)
+
+logger = logging.getLogger(__name__)
+
+# Chunks received so far, one file per upload session
+UPLOAD_SESSIONS_DIR = UPLOAD_DIR / "uploads"
+
+
+def upload_part_path(upload_id: str) -> Path:
+    return UPLOAD_SESSIONS_DIR / f"{upload_id}.part"
+
+
+def check_pdf_header(part_path: Path, size: int) -> None:
+    with open(part_path, "rb") as part_file:
+        head = part_file.read(min(PDF_HEADER_SEARCH_BYTES, size))
+    if PDF_HEADER not in head:
+        raise not_a_pdf()
+
+
+async def append_upload_chunk(
+    upload_session: UploadSession, chunks: AsyncIterator[bytes]
+) -> int:
+    """
+    Append the bytes of a chunk, sent from ``upload_session.offset``, to the
+    part file of the session and return the new offset. A client that
+    disconnects keeps the bytes received until then and resumes from there.
+    """
+    part_path = upload_part_path(upload_session.id)
+    part_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path.touch()
+    offset = upload_session.offset
+    async with await anyio.open_file(part_path, "r+b") as part_file:
+        # Bytes past the recorded offset belong to a chunk whose end never
+        # got recorded, the client sends them again
+        await part_file.truncate(offset)
+        await part_file.seek(offset)
+        try:
+            async for chunk in chunks:
+                if offset + len(chunk) > upload_session.size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"The upload is {upload_session.size} bytes long",
+                    )
+                await part_file.write(chunk)
+                offset += len(chunk)
+        except ClientDisconnect:
+            logger.info(f"Upload {upload_session.id} interrupted at {offset} bytes")
+    # Reject other files than PDFs as soon as their header is in
+    header_size = min(PDF_HEADER_SEARCH_BYTES, upload_session.size)
+    if upload_session.offset < header_size <= offset:
+        await anyio.to_thread.run_sync(check_pdf_header, part_path, header_size)
+    return offset
+
+
+def assemble_upload(upload_session: UploadSession) -> SavedUpload:
+    """
+    Check and hash the complete file of an upload session, and return its
+    path, SHA-256 and size, ready to be moved into the blob store.
+    """
+    part_path = upload_part_path(upload_session.id)
+    check_pdf_header(part_path, upload_session.size)
+    file_hash = generate_pdf_hash(part_path)
+    return SavedUpload(str(part_path), file_hash, upload_session.size)
+
+
+def delete_upload_session(session: Session, upload_session: UploadSession) -> None:
+    upload_part_path(upload_session.id).unlink(missing_ok=True)
+    upload_session_crud.delete_upload_session(session, upload_session)
+
+
+def expire_upload_sessions(session: Session) -> int:
+    """
+    Delete the upload sessions past their TTL and their part files, and
+    return how many there were.
+    """
+    expired = 0
+    while upload_sessions := upload_session_crud.get_expired_upload_sessions(session):
+        for upload_session in upload_sessions:
+            delete_upload_session(session, upload_session)
+        expired += len(upload_sessions)
+    if expired:
+        logger.info(f"Deleted {expired} expired upload sessions")
+    return expired
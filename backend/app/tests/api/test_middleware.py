@@ -0,0 +1,29 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api.middleware import MULTIPART_OVERHEAD_BYTES, UploadSizeLimitMiddleware
+
+
+def create_client(max_upload_bytes: int) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(
+        UploadSizeLimitMiddleware,
+        path_prefix="/documents",
+        max_upload_bytes=max_upload_bytes,
+    )
+
+    @app.post("/documents/")
+    @app.post("/other/")
+    async def upload(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_announced_oversize_uploads_are_rejected() -> None:
+    client = create_client(max_upload_bytes=0)
+    body = bytes(MULTIPART_OVERHEAD_BYTES + 1)
+
+    assert client.post("/documents/", content=body).status_code == 413
+    assert client.post("/other/", content=body).json() == {"size": len(body)}
+    assert client.post("/documents/", content=body[:-1]).status_code == 200
@@ -0,0 +1,169 @@
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api.responses import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    cached_file_response,
+    stored_file_response,
+    strong_etag,
+)
+from app.core.config import settings
+from app.services import storage
+
+CONTENT = bytes(range(256)) * 4
+ETAG = strong_etag("0123456789abcdef")
+
+
+@pytest.fixture()
+def client(tmp_path: Path) -> TestClient:
+    file_path = tmp_path / "page.png"
+    file_path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.get("/file")
+    def read_file(request: Request, immutable: bool = False):
+        return cached_file_response(
+            request, file_path, ETAG, "image/png", immutable=immutable
+        )
+
+    return TestClient(app)
+
+
+def test_full_response_carries_validators(client: TestClient) -> None:
+    response = client.get("/file")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == ETAG
+    assert response.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+    assert response.headers["accept-ranges"] == "bytes"
+    assert (
+        client.get("/file", params={"immutable": True}).headers["cache-control"]
+        == IMMUTABLE_CACHE_CONTROL
+    )
+
+
+@pytest.mark.parametrize("if_none_match", [ETAG, f'"other", W/{ETAG}', "*"])
+def test_matching_etag_is_not_modified(client: TestClient, if_none_match: str) -> None:
+    response = client.get("/file", headers={"if-none-match": if_none_match})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == ETAG
+
+
+def test_stale_etag_gets_the_file(client: TestClient) -> None:
+    response = client.get("/file", headers={"if-none-match": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+@pytest.mark.parametrize(
+    "range_header, start, end",
+    [
+        ("bytes=0-99", 0, 99),
+        ("bytes=1000-", 1000, 1023),
+        ("bytes=-24", 1000, 1023),
+        ("bytes=1000-5000", 1000, 1023),
+    ],
+)
+def test_byte_ranges(
+    client: TestClient, range_header: str, start: int, end: int
+) -> None:
+    response = client.get("/file", headers={"range": range_header})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[start : end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+def test_unsatisfiable_range(client: TestClient) -> None:
+    response = client.get("/file", headers={"range": "bytes=2000-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {"range": "bytes=0-9,20-29"},
+        {"range": "bytes=0-9", "if-range": '"stale"'},
+    ],
+)
+def test_ignored_ranges_get_the_whole_file(client: TestClient, headers: dict) -> None:
+    response = client.get("/file", headers=headers)
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+class RemoteStorageBackend(storage.LocalStorageBackend):
+    """
+    Local files served like those of a remote backend, through the API or
+    presigned URLs.
+    """
+
+    is_local = False
+
+    def presign(self, key, expires_in, filename=None, media_type=None):
+        return f"https://storage.example.com/{key}?expires={expires_in}"
+
+
+@pytest.fixture()
+def stored_client(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    backend = RemoteStorageBackend(tmp_path)
+    (tmp_path / "document.pdf").write_bytes(CONTENT)
+    monkeypatch.setattr(storage, "_storage", backend)
+    app = FastAPI()
+
+    @app.get("/stored/{key}")
+    def read_stored_file(request: Request, key: str):
+        return stored_file_response(
+            request, key, ETAG, "application/pdf", filename="contract.pdf"
+        )
+
+    return TestClient(app)
+
+
+def test_stored_files_are_streamed_from_the_backend(stored_client: TestClient) -> None:
+    response = stored_client.get("/stored/document.pdf")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == ETAG
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["content-disposition"] == (
+        'attachment; filename="contract.pdf"'
+    )
+
+    response = stored_client.get("/stored/document.pdf", headers={"range": "bytes=-24"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[1000:]
+    assert response.headers["content-range"] == f"bytes 1000-1023/{len(CONTENT)}"
+    assert stored_client.get("/stored/missing.pdf").status_code == 404
+
+
+def test_stored_files_are_redirected_to_presigned_urls(
+    stored_client: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "STORAGE_PRESIGNED_DOWNLOADS", True)
+
+    response = stored_client.get("/stored/document.pdf", follow_redirects=False)
+
+    assert response.status_code == 307
+    assert response.headers["location"] == (
+        "https://storage.example.com/document.pdf"
+        f"?expires={settings.STORAGE_PRESIGN_EXPIRES_SECONDS}"
+    )
+    response = stored_client.get(
+        "/stored/document.pdf", headers={"if-none-match": ETAG}
+    )
+    assert response.status_code == 304
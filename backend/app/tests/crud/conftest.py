@@ -0,0 +1,24 @@
+from collections.abc import Generator
+
+import pytest
+from sqlmodel import Session
+
+from app.crud import document_crud
+from app.models.models import Document
+from app.services.file_utils import PageGeometry
+from app.tests.utils.document import create_random_document
+
+
+@pytest.fixture()
+def document(db: Session) -> Generator[Document, None, None]:
+    """
+    Two page Letter document, the second page turned a quarter.
+    """
+    pages = [
+        PageGeometry(page_number=1, width=612, height=792),
+        PageGeometry(page_number=2, width=612, height=792, rotation=90),
+    ]
+    document = create_random_document(db, pages=pages)
+    yield document
+    # Owners are deleted along with the session, their documents first
+    document_crud.delete_document(db, document_id=document.id)
@@ -0,0 +1,24 @@
+import hashlib
+
+from sqlmodel import Session
+
+from app.crud import blob_crud
+
+
+def test_blobs_are_locked_once_unreferenced(db: Session) -> None:
+    sha256 = hashlib.sha256(b"contract").hexdigest()
+    for _ in range(2):
+        blob_crud.acquire_blob(db, sha256, 8)
+        db.commit()
+
+    assert blob_crud.release_blob(db, sha256) is False
+    db.commit()
+    assert blob_crud.lock_unreferenced_blob(db, sha256) is None
+    assert blob_crud.release_blob(db, sha256) is True
+    db.commit()
+
+    blob = blob_crud.lock_unreferenced_blob(db, sha256)
+    assert blob.ref_count == 0
+    blob_crud.delete_blob(db, blob)
+    db.commit()
+    assert blob_crud.get_blob(db, sha256) is None
@@ -0,0 +1,26 @@
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from app.crud.field_crud import validate_field_placement
+from app.models.models import Document, FieldType
+from app.schemas.schemas import FieldCreate
+
+
+def text_field(page: int, x: int, y: int) -> FieldCreate:
+    return FieldCreate(type=FieldType.TEXT, page=page, x=x, y=y, width=50, height=20)
+
+
+def test_fields_are_placed_on_pages_as_displayed(
+    db: Session, document: Document
+) -> None:
+    validate_field_placement(db, document, text_field(1, 100, 700))
+    # The rotated page is displayed 792pt wide and 612pt high
+    validate_field_placement(db, document, text_field(2, 700, 100))
+
+    with pytest.raises(HTTPException) as error:
+        validate_field_placement(db, document, text_field(2, 100, 700))
+    assert error.value.status_code == 400
+    assert "(792.0 x 612.0)" in error.value.detail
+    with pytest.raises(HTTPException):
+        validate_field_placement(db, document, text_field(3, 100, 100))
@@ -0,0 +1,23 @@
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.crud import page_render_job_crud
+from app.models.models import Document, PageRenderJob, PageRenderStatus
+
+
+def test_render_jobs_locked_by_another_worker_are_skipped(
+    db: Session, document: Document
+) -> None:
+    job = page_render_job_crud.enqueue_page_render(db, document)
+
+    with Session(engine) as worker:
+        statement = (
+            select(PageRenderJob).where(PageRenderJob.id == job.id).with_for_update()
+        )
+        worker.exec(statement).one()
+        assert page_render_job_crud.claim_next_render_job(db) is None
+        worker.rollback()
+
+    claimed = page_render_job_crud.claim_next_render_job(db)
+    assert claimed.id == job.id
+    assert (claimed.status, claimed.attempts) == (PageRenderStatus.RUNNING, 1)
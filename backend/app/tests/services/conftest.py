@@ -0,0 +1,37 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.services import blob_store, file_service, page_cache, storage, upload_service
+
+
+@pytest.fixture()
+def session() -> Generator[Session, None, None]:
+    """
+    Throwaway in-memory database for the services. Row locks are no-ops on
+    sqlite, the locking queries run against Postgres in ``app/tests/crud``.
+    """
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture()
+def upload_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(file_service, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(blob_store, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(blob_store, "INCOMING_DIR", tmp_path / "blobs" / "incoming")
+    monkeypatch.setattr(upload_service, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(upload_service, "UPLOAD_SESSIONS_DIR", tmp_path / "uploads")
+    monkeypatch.setattr(page_cache, "PAGE_CACHE_DIR", tmp_path / "page_cache")
+    monkeypatch.setattr(storage, "_storage", storage.LocalStorageBackend(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture()
+def page_cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(page_cache, "PAGE_CACHE_DIR", tmp_path / "page_cache")
+    return tmp_path / "page_cache"
@@ -0,0 +1,95 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+from sqlmodel import Session
+
+from app.models.models import Blob
+from app.services import blob_store
+from app.services.file_service import SavedUpload, generate_pdf_hash
+from app.tests.utils.pdf import create_pdf
+
+
+def upload(content: bytes) -> SavedUpload:
+    path = blob_store.incoming_path()
+    path.write_bytes(content)
+    return SavedUpload(str(path), generate_pdf_hash(path), len(content))
+
+
+def test_duplicate_uploads_are_stored_once(
+    tmp_path: Path, upload_dir: Path, session: Session
+) -> None:
+    content = create_pdf(tmp_path / "contract.pdf", pages=2).read_bytes()
+    first, second = upload(content), upload(content)
+
+    keys = [blob_store.store_upload(session, saved) for saved in (first, second)]
+
+    sha256 = first.sha256
+    assert keys == [f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"] * 2
+    assert (tmp_path / keys[0]).read_bytes() == content
+    assert list((upload_dir / "blobs" / "incoming").iterdir()) == []
+    blob = session.get(Blob, sha256)
+    assert (blob.ref_count, blob.size_bytes) == (2, len(content))
+
+
+def test_blobs_are_deleted_with_their_last_reference(
+    tmp_path: Path, upload_dir: Path, session: Session
+) -> None:
+    content = create_pdf(tmp_path / "contract.pdf", pages=1).read_bytes()
+    saved = upload(content)
+    blob_store.store_upload(session, saved)
+    path = blob_store.blob_path(saved.sha256)
+    blob_store.store_upload(session, upload(content))
+    documents = [SimpleNamespace(blob_sha256=saved.sha256) for _ in range(2)]
+
+    blob_store.release_document_blob(session, documents[0])
+    session.commit()
+    assert path.exists()
+    assert session.get(Blob, saved.sha256).ref_count == 1
+
+    blob_store.release_document_blob(session, documents[1])
+    session.commit()
+    assert not path.exists()
+    assert session.get(Blob, saved.sha256) is None
+
+
+def test_blobs_released_in_a_rolled_back_transaction_are_kept(
+    tmp_path: Path, upload_dir: Path, session: Session
+) -> None:
+    content = create_pdf(tmp_path / "contract.pdf", pages=1).read_bytes()
+    saved = upload(content)
+    blob_store.store_upload(session, saved)
+    path = blob_store.blob_path(saved.sha256)
+
+    blob_store.release_blob(session, saved.sha256)
+    session.rollback()
+    session.commit()
+
+    assert path.read_bytes() == content
+    assert session.get(Blob, saved.sha256).ref_count == 1
+
+
+def test_unreferenced_blobs_left_by_a_crash_are_swept(
+    tmp_path: Path, upload_dir: Path, session: Session
+) -> None:
+    content = create_pdf(tmp_path / "contract.pdf", pages=1).read_bytes()
+    saved = upload(content)
+    blob_store.store_upload(session, saved)
+    path = blob_store.blob_path(saved.sha256)
+    blob_store.release_blob(session, saved.sha256)
+    # Committed, but the process died before deleting the file
+    session.info.pop(blob_store.RELEASED_BLOBS)
+    session.commit()
+    assert path.exists()
+
+    assert blob_store.delete_unreferenced_blobs(session) == 1
+
+    assert not path.exists()
+    assert session.get(Blob, saved.sha256) is None
+
+
+def test_documents_are_found_by_hash(tmp_path: Path, upload_dir: Path) -> None:
+    stored = SimpleNamespace(owner_id=1, file="contract.pdf", blob_sha256="ab" * 32)
+    legacy = SimpleNamespace(owner_id=1, file="contract.pdf", blob_sha256=None)
+
+    assert blob_store.document_file_path(stored) == blob_store.blob_path("ab" * 32)
+    assert blob_store.document_file_path(legacy) == tmp_path / "1_contract.pdf"
@@ -0,0 +1,141 @@
+import hashlib
+import io
+from pathlib import Path
+from types import SimpleNamespace
+
+import anyio
+import PyPDF2
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.models.models import FieldType
+from app.services import file_service
+from app.tests.utils.pdf import create_pdf
+
+
+def _text_field(page: int, text: str) -> SimpleNamespace:
+    return SimpleNamespace(type=FieldType.TEXT, page=page, x=100, y=700, text=text)
+
+
+def test_group_fields_by_page() -> None:
+    placements = [
+        (_text_field(3, "c"), None),
+        (_text_field(1, "a"), None),
+        (_text_field(3, "d"), None),
+    ]
+    grouped = file_service.group_fields_by_page(placements)
+    assert list(grouped) == [1, 3]
+    assert [field.text for field, _ in grouped[3]] == ["c", "d"]
+
+
+def test_add_fields_to_pdf_stamps_all_fields_in_one_pass(upload_dir: Path) -> None:
+    create_pdf(upload_dir / "1_contract.pdf", pages=4)
+    placements = [
+        (_text_field(1, "first-page-field"), None),
+        (_text_field(3, "third-page-field"), None),
+        (_text_field(3, "another-third-page-field"), None),
+    ]
+
+    signed_path = file_service.add_fields_to_pdf("contract.pdf", placements, 1)
+
+    assert signed_path == upload_dir / "signed_documents" / "1_contract.pdf"
+    reader = PyPDF2.PdfReader(signed_path)
+    assert len(reader.pages) == 4
+    assert "first-page-field" in reader.pages[0].extract_text()
+    assert "third-page-field" not in reader.pages[1].extract_text()
+    third_page = reader.pages[2].extract_text()
+    assert "third-page-field" in third_page
+    assert "another-third-page-field" in third_page
+
+
+def test_add_fields_to_pdf_restamps_from_original(upload_dir: Path) -> None:
+    create_pdf(upload_dir / "1_contract.pdf", pages=1)
+    placements = [(_text_field(1, "stamped-once"), None)]
+
+    file_service.add_fields_to_pdf("contract.pdf", placements, 1)
+    signed_path = file_service.add_fields_to_pdf("contract.pdf", placements, 1)
+
+    text = PyPDF2.PdfReader(signed_path).pages[0].extract_text()
+    assert text.count("stamped-once") == 1
+
+
+def test_hashing_writer_tees_written_bytes(tmp_path: Path) -> None:
+    output_path = tmp_path / "out.bin"
+    with open(output_path, "wb") as f:
+        sink = file_service.HashingWriter(f)
+        sink.write(b"hello ")
+        sink.write(b"world")
+        assert sink.tell() == 11
+
+    assert sink.hexdigest() == hashlib.sha256(output_path.read_bytes()).hexdigest()
+
+
+def test_finalize_pdf_encrypts_and_hashes_in_one_write(tmp_path: Path) -> None:
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=2)
+    output_path = tmp_path / "signed_documents" / "contract.pdf"
+    placements = [(_text_field(2, "finalized-field"), None)]
+
+    pdf_hash = file_service.finalize_pdf(source_path, output_path, placements)
+
+    assert pdf_hash == file_service.generate_pdf_hash(output_path)
+    reader = PyPDF2.PdfReader(output_path)
+    assert reader.is_encrypted
+    reader.decrypt("")
+    assert "finalized-field" in reader.pages[1].extract_text()
+
+
+def test_copy_upload_hashes_and_counts_in_chunks(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(file_service, "UPLOAD_CHUNK_SIZE", 1000)
+    source_path = create_pdf(tmp_path / "source.pdf", pages=3)
+    output_path = tmp_path / "1_contract.pdf"
+
+    with open(source_path, "rb") as source:
+        upload = file_service.copy_upload(source, output_path, 10**6)
+
+    assert upload == (
+        str(output_path),
+        file_service.generate_pdf_hash(source_path),
+        source_path.stat().st_size,
+    )
+    assert output_path.read_bytes() == source_path.read_bytes()
+    assert sorted(tmp_path.iterdir()) == [output_path, source_path]
+
+
+@pytest.mark.parametrize(
+    "content, max_bytes, status_code",
+    [
+        (b"%PDF-1.7\n" + bytes(50000), 4096, 413),
+        (b"PK\x03\x04" + bytes(50000), 10**6, 415),
+        (b"%PD", 10**6, 415),
+    ],
+)
+def test_copy_upload_rejects_early(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    content: bytes,
+    max_bytes: int,
+    status_code: int,
+) -> None:
+    monkeypatch.setattr(file_service, "UPLOAD_CHUNK_SIZE", 1024)
+    source = io.BytesIO(content)
+
+    with pytest.raises(HTTPException) as exc_info:
+        file_service.copy_upload(source, tmp_path / "1_contract.pdf", max_bytes)
+
+    assert exc_info.value.status_code == status_code
+    # Rejected from the first chunks on, without reading the whole upload
+    assert source.tell() <= 5 * 1024
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_save_file_streams_the_upload(upload_dir: Path) -> None:
+    content = create_pdf(upload_dir / "source.pdf", pages=1).read_bytes()
+    upload = UploadFile(io.BytesIO(content), filename="contract.pdf")
+
+    saved = anyio.run(file_service.save_file, upload, upload_dir / "incoming")
+
+    assert saved.path == str(upload_dir / "incoming")
+    assert saved.sha256 == hashlib.sha256(content).hexdigest()
+    assert saved.size == len(content)
@@ -0,0 +1,249 @@
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import fitz
+import pytest
+from sqlmodel import Session
+
+from app import utils
+from app.core.config import settings
+from app.crud import finalization_job_crud
+from app.models.models import (
+    FieldType,
+    FinalizationJob,
+    FinalizationJobDocument,
+    FinalizationJobStatus,
+)
+from app.services import finalization_service
+from app.services.blob_store import signed_document_filename
+from app.services.file_service import generate_pdf_hash
+from app.services.finalization_service import (
+    DocumentFinalizationTask,
+    FieldDescriptor,
+    finalize_document_file,
+)
+from app.tests.utils.pdf import create_pdf
+
+
+def _task(tmp_path: Path) -> DocumentFinalizationTask:
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=5)
+    return DocumentFinalizationTask(
+        document_id=1,
+        source_path=str(source_path),
+        output_path=str(tmp_path / "signed" / "contract.pdf"),
+        placements=[
+            (
+                FieldDescriptor(
+                    type=FieldType.TEXT, page=4, x=100, y=700, text="large"
+                ),
+                None,
+            )
+        ],
+    )
+
+
+def test_generate_pdf_hash_hashes_in_chunks(tmp_path: Path) -> None:
+    path = tmp_path / "blob.pdf"
+    content = b"%PDF-" + bytes(range(256)) * 10_000
+    path.write_bytes(content)
+    assert generate_pdf_hash(path) == hashlib.sha256(content).hexdigest()
+
+
+@pytest.mark.parametrize("encryption", [False, True])
+@pytest.mark.parametrize("threshold, backend", [(10**9, "reportlab"), (0, "pymupdf")])
+def test_large_documents_use_the_streaming_backend(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    threshold: int,
+    backend: str,
+    encryption: bool,
+) -> None:
+    monkeypatch.setattr(settings, "STAMPING_BACKEND", "reportlab")
+    monkeypatch.setattr(settings, "SIGNED_PDF_ENCRYPTION", encryption)
+    monkeypatch.setattr(settings, "FINALIZATION_STREAMING_THRESHOLD_BYTES", threshold)
+    task = _task(tmp_path)
+
+    assert (
+        finalization_service.select_stamping_backend(task.source_path).name == backend
+    )
+    result = finalize_document_file(task)
+
+    assert result.signed_hash == generate_pdf_hash(task.output_path)
+    assert result.peak_memory_bytes > 0
+    with fitz.open(task.output_path) as document:
+        assert bool(document.metadata["encryption"]) == encryption
+        assert document.page_count == 5
+        assert "large" in document[3].get_text()
+
+
+@pytest.mark.parametrize("backend", ["reportlab", "pymupdf"])
+@pytest.mark.parametrize("encryption", [False, True])
+def test_finalization_is_idempotent(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, backend: str, encryption: bool
+) -> None:
+    monkeypatch.setattr(settings, "STAMPING_BACKEND", backend)
+    monkeypatch.setattr(settings, "SIGNED_PDF_ENCRYPTION", encryption)
+    task = _task(tmp_path)
+
+    first = finalize_document_file(task)
+    first_bytes = Path(task.output_path).read_bytes()
+    second = finalize_document_file(task)
+
+    assert first.signed_hash == second.signed_hash
+    assert Path(task.output_path).read_bytes() == first_bytes
+    assert list(Path(task.output_path).parent.iterdir()) == [Path(task.output_path)]
+
+
+def test_failed_finalization_keeps_the_previous_signed_copy(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    task = _task(tmp_path)
+    finalize_document_file(task)
+    signed_bytes = Path(task.output_path).read_bytes()
+
+    def crash(*args):
+        Path(args[1]).write_bytes(b"%PDF-half-written")
+        raise RuntimeError("worker crashed")
+
+    monkeypatch.setattr(
+        finalization_service,
+        "select_stamping_backend",
+        lambda source_path: SimpleNamespace(name="crashing", finalize=crash),
+    )
+    with pytest.raises(RuntimeError):
+        finalize_document_file(task)
+
+    assert Path(task.output_path).read_bytes() == signed_bytes
+    assert list(Path(task.output_path).parent.iterdir()) == [Path(task.output_path)]
+
+
+def test_long_documents_keep_their_job_alive() -> None:
+    heartbeats = []
+    with ThreadPoolExecutor() as pool:
+        futures = [pool.submit(time.sleep, delay) for delay in (0, 0.35)]
+
+        completed = list(
+            finalization_service.as_completed_with_heartbeat(
+                futures, lambda: heartbeats.append(time.monotonic()), 0.1
+            )
+        )
+
+    assert completed == futures
+    assert len(heartbeats) >= 2
+
+
+@pytest.mark.parametrize(
+    "attempts, status",
+    [(1, FinalizationJobStatus.RUNNING), (3, FinalizationJobStatus.FAILED)],
+)
+def test_abandoned_jobs_are_claimed_until_their_last_attempt(
+    monkeypatch: pytest.MonkeyPatch,
+    session: Session,
+    attempts: int,
+    status: FinalizationJobStatus,
+) -> None:
+    monkeypatch.setattr(settings, "FINALIZATION_MAX_ATTEMPTS", 3)
+    stale = datetime.now() - timedelta(
+        seconds=settings.FINALIZATION_JOB_TIMEOUT_SECONDS + 1
+    )
+    job = FinalizationJob(
+        signature_request_id=1,
+        status=FinalizationJobStatus.RUNNING,
+        attempts=attempts,
+        updated_at=stale,
+    )
+    job.documents = [
+        FinalizationJobDocument(document_id=1, status=FinalizationJobStatus.RUNNING)
+    ]
+    session.add(job)
+    session.commit()
+
+    claimed = finalization_job_crud.claim_next_job(session)
+
+    session.refresh(job)
+    assert job.status == job.documents[0].status == status
+    if status == FinalizationJobStatus.FAILED:
+        assert claimed is None
+        assert job.attempts == attempts
+    else:
+        assert claimed.id == job.id
+        assert job.attempts == attempts + 1
+
+
+def test_signed_copies_are_attached_under_their_document_name(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Signed copies are stored under their hash
+    signed_path = tmp_path / hashlib.sha256(b"signed").hexdigest()
+    signed_path.write_bytes(b"%PDF-1.7 signed")
+    sent = []
+    monkeypatch.setattr(utils, "send_email", lambda **email: sent.append(email))
+    signature_request = SimpleNamespace(
+        id=1,
+        name="Contract",
+        status=SimpleNamespace(value="completed"),
+        sender=SimpleNamespace(email="sender@example.com"),
+        signatories=[SimpleNamespace(email="signer@example.com")],
+    )
+    document = SimpleNamespace(file="contract 2026.pdf", title="Contract")
+
+    finalization_service.notify_signature_request_completed(
+        signature_request, [(signed_document_filename(document), signed_path)]
+    )
+
+    assert [email["attachments"] for email in sent] == [
+        [("contract 2026_signed.pdf", b"%PDF-1.7 signed", "application/pdf")]
+    ] * 2
+
+
+def test_failed_jobs_are_retried_without_stopping_the_worker(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    from app import finalization_worker
+
+    def run_finalization_job(session, job):
+        raise ConnectionRefusedError("SMTP server unreachable")
+
+    retried = []
+    monkeypatch.setattr(
+        finalization_worker, "run_finalization_job", run_finalization_job
+    )
+    monkeypatch.setattr(
+        finalization_job_crud,
+        "retry_or_fail_job",
+        lambda session, job, error: retried.append((job.id, error)),
+    )
+    rollbacks = []
+    session = SimpleNamespace(rollback=lambda: rollbacks.append(True))
+
+    finalization_worker.run_job(session, SimpleNamespace(id=7))
+
+    assert rollbacks == [True]
+    assert retried == [(7, "SMTP server unreachable")]
+
+
+def test_completion_is_notified_to_every_reachable_party(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def send_email(**email):
+        if email["email_to"] == "sender@example.com":
+            raise ConnectionRefusedError("SMTP server unreachable")
+        sent.append(email["email_to"])
+
+    sent = []
+    monkeypatch.setattr(utils, "send_email", send_email)
+    signature_request = SimpleNamespace(
+        id=1,
+        name="Contract",
+        status=SimpleNamespace(value="completed"),
+        sender=SimpleNamespace(email="sender@example.com"),
+        signatories=[SimpleNamespace(email="signer@example.com")],
+    )
+
+    finalization_service.notify_signature_request_completed(signature_request, [])
+
+    assert sent == ["signer@example.com"]
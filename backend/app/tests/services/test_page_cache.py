@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.services import page_cache, render_service
+from app.services.file_service import generate_pdf_hash
+from app.tests.utils.pdf import create_pdf
+
+SCREEN = render_service.RENDER_TIERS["screen"]
+
+
+def test_page_images_are_counted_and_shared(
+    tmp_path: Path, page_cache_dir: Path, session: Session
+) -> None:
+    first_pdf = create_pdf(tmp_path / "1_contract.pdf", pages=2)
+    # The same file uploaded by another user under another title
+    second_pdf = tmp_path / "2_renamed.pdf"
+    second_pdf.write_bytes(first_pdf.read_bytes())
+    file_hash = generate_pdf_hash(first_pdf)
+
+    first = render_service.get_page_image(session, first_pdf, file_hash, 1, SCREEN)
+    second = render_service.get_page_image(
+        session, second_pdf, generate_pdf_hash(second_pdf), 1, SCREEN
+    )
+
+    assert first == second
+    stats = page_cache.page_cache_stats(session)
+    assert stats["entries"] == 1
+    assert stats["bytes"] == first.stat().st_size
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 0)
+
+
+def test_least_recently_served_pages_are_evicted(
+    tmp_path: Path,
+    page_cache_dir: Path,
+    session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=4)
+    file_hash = generate_pdf_hash(pdf_path)
+    paths = [
+        render_service.get_page_image(session, pdf_path, file_hash, n, SCREEN)
+        for n in range(1, 4)
+    ]
+    # Page 1 was served last, page 2 is the least recently served one
+    for age, path in zip([0, 30, 20], paths, strict=True):
+        entry = page_cache.get_cache_entry(session, path)
+        entry.last_accessed_at = datetime.now() - timedelta(minutes=age)
+        session.add(entry)
+    session.commit()
+    page_size = max(path.stat().st_size for path in paths)
+    monkeypatch.setattr(settings, "PAGE_CACHE_MAX_BYTES", int(page_size * 3.5))
+
+    fourth = render_service.get_page_image(session, pdf_path, file_hash, 4, SCREEN)
+
+    assert [path.exists() for path in paths] == [True, False, True]
+    assert fourth.exists()
+    stats = page_cache.page_cache_stats(session)
+    assert stats["entries"] == 3
+    assert stats["bytes"] <= settings.PAGE_CACHE_MAX_BYTES
+    assert stats["evictions"] == 1
+
+
+def test_eviction_removes_empty_directories(
+    tmp_path: Path,
+    page_cache_dir: Path,
+    session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    first_pdf = create_pdf(tmp_path / "1_contract.pdf", pages=1)
+    second_pdf = create_pdf(tmp_path / "2_contract.pdf", pages=2)
+    first_hash = generate_pdf_hash(first_pdf)
+    render_service.get_page_image(session, first_pdf, first_hash, 1, SCREEN)
+    monkeypatch.setattr(settings, "PAGE_CACHE_MAX_BYTES", 1)
+
+    render_service.get_page_image(
+        session, second_pdf, generate_pdf_hash(second_pdf), 1, SCREEN
+    )
+
+    assert not (page_cache_dir / first_hash[:2] / first_hash).exists()
+
+
+def test_nodes_only_index_and_evict_their_own_pages(
+    tmp_path: Path,
+    page_cache_dir: Path,
+    session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=2)
+    file_hash = generate_pdf_hash(pdf_path)
+    monkeypatch.setattr(settings, "PAGE_CACHE_NODE_NAME", "node-a")
+    first = render_service.get_page_image(session, pdf_path, file_hash, 1, SCREEN)
+    monkeypatch.setattr(settings, "PAGE_CACHE_NODE_NAME", "node-b")
+    monkeypatch.setattr(settings, "PAGE_CACHE_MAX_BYTES", 1)
+
+    render_service.get_page_image(session, pdf_path, file_hash, 2, SCREEN)
+
+    assert page_cache.page_cache_stats(session)["entries"] == 1
+    assert page_cache.get_cache_entry(session, first) is None
+    monkeypatch.setattr(settings, "PAGE_CACHE_NODE_NAME", "node-a")
+    assert page_cache.get_cache_entry(session, first) is not None
+    assert first.exists()
@@ -0,0 +1,143 @@
+import os
+import threading
+from collections.abc import Generator
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+
+from app.services.render_scheduler import (
+    RenderPriority,
+    RenderQueueFull,
+    RenderScheduler,
+)
+
+
+@pytest.fixture()
+def executor() -> Generator[ThreadPoolExecutor, None, None]:
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def blocked_render(gate: threading.Event, result: str) -> str:
+    gate.wait(timeout=5)
+    return result
+
+
+def test_queued_renders_start_by_priority(executor: ThreadPoolExecutor) -> None:
+    scheduler = RenderScheduler(executor, max_concurrency=1, max_queue_depth=10)
+    gate = threading.Event()
+    started = []
+
+    def render(key: str) -> str:
+        started.append(key)
+        return key
+
+    running = scheduler.submit("running", RenderPriority.VIEW, blocked_render, gate, "")
+    futures = [
+        scheduler.submit("prefetch", RenderPriority.PREFETCH, render, "prefetch"),
+        scheduler.submit("view", RenderPriority.VIEW, render, "view"),
+        scheduler.submit("first", RenderPriority.FIRST_PAGE, render, "first"),
+    ]
+    stats = scheduler.stats()
+    assert (stats["running"], stats["queued"]) == (1, 3)
+    assert stats["queued_by_priority"] == {"first_page": 1, "view": 1, "prefetch": 1}
+
+    gate.set()
+
+    running.result(timeout=5)
+    assert [future.result(timeout=5) for future in futures] == [
+        "prefetch",
+        "view",
+        "first",
+    ]
+    assert started == ["first", "view", "prefetch"]
+    stats = scheduler.stats()
+    assert (stats["running"], stats["queued"], stats["completed"]) == (0, 0, 4)
+
+
+def test_duplicate_renders_are_shared_and_moved_up(
+    executor: ThreadPoolExecutor,
+) -> None:
+    scheduler = RenderScheduler(executor, max_concurrency=1, max_queue_depth=10)
+    gate = threading.Event()
+    calls = []
+
+    def render(key: str) -> str:
+        calls.append(key)
+        return key
+
+    scheduler.submit("running", RenderPriority.VIEW, blocked_render, gate, "")
+    scheduler.submit("other", RenderPriority.VIEW, render, "other")
+    prefetch = scheduler.submit("page", RenderPriority.PREFETCH, render, "page")
+    view = scheduler.submit("page", RenderPriority.FIRST_PAGE, render, "page")
+
+    assert view is prefetch
+    gate.set()
+    assert view.result(timeout=5) == "page"
+    assert calls == ["page", "other"]
+    assert scheduler.stats()["deduplicated"] == 1
+
+
+def test_full_queue_drops_prefetches_then_rejects(
+    executor: ThreadPoolExecutor,
+) -> None:
+    scheduler = RenderScheduler(executor, max_concurrency=1, max_queue_depth=1)
+    gate = threading.Event()
+    scheduler.submit("running", RenderPriority.VIEW, blocked_render, gate, "")
+    prefetch = scheduler.submit(
+        "prefetch", RenderPriority.PREFETCH, blocked_render, gate, ""
+    )
+
+    view = scheduler.submit("view", RenderPriority.VIEW, blocked_render, gate, "view")
+
+    with pytest.raises(RenderQueueFull):
+        prefetch.result(timeout=5)
+    with pytest.raises(RenderQueueFull):
+        scheduler.submit("other", RenderPriority.VIEW, blocked_render, gate, "")
+    gate.set()
+    assert view.result(timeout=5) == "view"
+    stats = scheduler.stats()
+    assert (stats["dropped"], stats["rejected"], stats["completed"]) == (1, 1, 2)
+
+
+def test_failed_renders_free_their_slot(executor: ThreadPoolExecutor) -> None:
+    scheduler = RenderScheduler(executor, max_concurrency=1, max_queue_depth=10)
+
+    def fail() -> None:
+        raise IndexError("No such page")
+
+    with pytest.raises(IndexError):
+        scheduler.submit("missing", RenderPriority.VIEW, fail).result(timeout=5)
+    assert (
+        scheduler.submit("next", RenderPriority.VIEW, str, 1).result(timeout=5) == "1"
+    )
+    stats = scheduler.stats()
+    assert (stats["failed"], stats["completed"], stats["running"]) == (1, 1, 0)
+
+
+def test_broken_executors_are_replaced() -> None:
+    executors = []
+
+    def create_executor() -> ProcessPoolExecutor:
+        executors.append(ProcessPoolExecutor(max_workers=1))
+        return executors[-1]
+
+    scheduler = RenderScheduler(
+        create_executor(), 1, 10, executor_factory=create_executor
+    )
+    try:
+        # A render process killed, as by the OOM killer
+        with pytest.raises(BrokenExecutor):
+            scheduler.submit("huge", RenderPriority.VIEW, os._exit, 1).result(
+                timeout=30
+            )
+
+        assert (
+            scheduler.submit("next", RenderPriority.VIEW, str, 1).result(timeout=30)
+            == "1"
+        )
+        assert len(executors) == 2
+        assert scheduler.stats()["executors_replaced"] == 1
+    finally:
+        for executor in executors:
+            executor.shutdown()
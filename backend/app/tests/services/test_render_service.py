@@ -0,0 +1,402 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import fitz
+import pytest
+from PIL import Image, ImageChops
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.crud import page_render_job_crud
+from app.models.models import FieldType, PageRenderJob, PageRenderStatus
+from app.services import blob_store, page_cache, render_service, storage
+from app.services.file_service import generate_pdf_hash, get_stamping_backend
+from app.services.file_utils import (
+    RenderTier,
+    TilePyramid,
+    convert_pdf_to_images,
+    render_pdf_page,
+    render_pdf_tile,
+    split_into_ranges,
+)
+from app.tests.utils.pdf import create_pdf
+
+SCREEN = render_service.RENDER_TIERS["screen"]
+A1 = (1684, 2384)
+
+
+def test_render_page_renders_only_the_requested_page(
+    tmp_path: Path, page_cache_dir: Path
+) -> None:
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=200)
+    file_hash = generate_pdf_hash(pdf_path)
+
+    page_path = render_service.render_page(pdf_path, file_hash, 150, SCREEN)
+
+    assert page_path == (
+        page_cache_dir
+        / file_hash[:2]
+        / file_hash[2:4]
+        / file_hash
+        / SCREEN.key
+        / f"page_150.{SCREEN.extension}"
+    )
+    assert [path.name for path in page_path.parent.iterdir()] == [page_path.name]
+
+
+@pytest.mark.parametrize(
+    "tier, size",
+    [
+        (RenderTier(name="thumbnail", width=160, image_format="webp"), (160, 208)),
+        (RenderTier(name="screen", width=1024, image_format="png"), (1024, 1326)),
+        (RenderTier(name="zoom", dpi=144, image_format="webp"), (1224, 1584)),
+    ],
+)
+def test_render_page_tiers(
+    tmp_path: Path, page_cache_dir: Path, tier: RenderTier, size: tuple[int, int]
+) -> None:
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=1)
+
+    page_path = render_service.render_page(pdf_path, "ab" * 32, 1, tier)
+
+    with Image.open(page_path) as image:
+        assert image.format == tier.image_format.upper()
+        assert image.size == size
+    assert tier.pixel_size(612, 792) == size
+
+
+def test_render_page_serves_cached_pages(tmp_path: Path, page_cache_dir: Path) -> None:
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=2)
+    file_hash = generate_pdf_hash(pdf_path)
+    first = render_service.render_page(pdf_path, file_hash, 1, SCREEN)
+    rendered_at = first.stat().st_mtime_ns
+
+    pdf_path.unlink()
+    assert render_service.render_page(pdf_path, file_hash, 1, SCREEN) == first
+    assert first.stat().st_mtime_ns == rendered_at
+
+
+def test_render_page_rejects_missing_pages(
+    tmp_path: Path, page_cache_dir: Path
+) -> None:
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=2)
+    with pytest.raises(IndexError):
+        render_service.render_page(pdf_path, generate_pdf_hash(pdf_path), 3, SCREEN)
+
+
+def test_render_document_pages_warms_missing_pages(
+    tmp_path: Path, page_cache_dir: Path
+) -> None:
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=3)
+    file_hash = generate_pdf_hash(pdf_path)
+    render_service.render_page(pdf_path, file_hash, 2, SCREEN)
+
+    rendered = render_service.render_document_pages(pdf_path, file_hash)
+
+    assert len(rendered) == 3 * len(settings.PAGE_PRERENDER_TIERS) - 1
+    tier_dirs = sorted(
+        (page_cache_dir / file_hash[:2] / file_hash[2:4] / file_hash).iterdir()
+    )
+    assert [tier_dir.name for tier_dir in tier_dirs] == sorted(
+        render_service.RENDER_TIERS[name].key for name in settings.PAGE_PRERENDER_TIERS
+    )
+    for tier_dir in tier_dirs:
+        assert len(list(tier_dir.iterdir())) == 3
+
+
+def test_document_page_manifest() -> None:
+    document = SimpleNamespace(
+        id=7,
+        file_hash="ab" * 32,
+        page_count=2,
+        pages=[
+            SimpleNamespace(page_number=1, width=612, height=792, rotation=0),
+            SimpleNamespace(page_number=2, width=612, height=792, rotation=90),
+        ],
+    )
+
+    manifest = render_service.document_page_manifest(document, "token")
+
+    assert [page["page_number"] for page in manifest] == [1, 2]
+    version = render_service.page_image_version("ab" * 32, SCREEN)
+    assert manifest[0]["screen"]["url"] == (
+        f"/api/v1/documents/7/pages/1?tier=screen&v={version}&token=token"
+    )
+    assert set(manifest[0]) == {"page_number", *render_service.RENDER_TIERS}
+    # The rotated page is rendered landscape
+    assert manifest[1]["thumbnail"]["width"] == settings.PAGE_THUMBNAIL_WIDTH
+    assert manifest[1]["thumbnail"]["height"] < settings.PAGE_THUMBNAIL_WIDTH
+    assert (
+        render_service.document_page_manifest(
+            SimpleNamespace(page_count=None, file_hash=None), "token"
+        )
+        is None
+    )
+
+
+def test_split_into_ranges() -> None:
+    assert split_into_ranges(list(range(1, 11)), 3) == [
+        [1, 2, 3, 4],
+        [5, 6, 7, 8],
+        [9, 10],
+    ]
+    assert split_into_ranges([1], 4) == [[1]]
+    assert split_into_ranges([], 4) == []
+
+
+def test_render_document_pages_splits_large_documents_across_the_pool(
+    tmp_path: Path, page_cache_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "RENDER_PROCESS_POOL_SIZE", 2)
+    monkeypatch.setattr(settings, "RENDER_PARALLEL_MIN_PAGES", 4)
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=6)
+    file_hash = generate_pdf_hash(pdf_path)
+    serial_dir = tmp_path / "serial"
+    convert_pdf_to_images(pdf_path, serial_dir)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        monkeypatch.setattr(render_service, "_render_pool", executor)
+        render_service.render_document_pages(
+            pdf_path, file_hash, [RenderTier(name="default", dpi=72)]
+        )
+
+    for page_number in range(1, 7):
+        cache_path = page_cache.page_cache_path(
+            file_hash, page_number, RenderTier(name="default", dpi=72)
+        )
+        assert (
+            cache_path.read_bytes()
+            == (serial_dir / f"page_{page_number}.png").read_bytes()
+        )
+
+
+def test_broken_render_pool_is_replaced(
+    tmp_path: Path, page_cache_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "RENDER_PROCESS_POOL_SIZE", 2)
+    monkeypatch.setattr(settings, "RENDER_PARALLEL_MIN_PAGES", 4)
+    pdf_path = create_pdf(tmp_path / "1_contract.pdf", pages=6)
+
+    def submit(*args):
+        raise BrokenProcessPool("A render process was killed")
+
+    shutdowns = []
+    broken_pool = SimpleNamespace(
+        submit=submit, shutdown=lambda wait: shutdowns.append(wait)
+    )
+    monkeypatch.setattr(render_service, "_render_pool", broken_pool)
+
+    with pytest.raises(BrokenProcessPool):
+        render_service.render_document_pages(
+            pdf_path, generate_pdf_hash(pdf_path), [RenderTier(name="default", dpi=72)]
+        )
+
+    assert shutdowns == [False]
+    assert render_service._render_pool is None
+
+
+@pytest.mark.parametrize(
+    "attempts, status",
+    [(1, PageRenderStatus.RUNNING), (3, PageRenderStatus.FAILED)],
+)
+def test_abandoned_render_jobs_are_claimed_until_their_last_attempt(
+    monkeypatch: pytest.MonkeyPatch,
+    session: Session,
+    attempts: int,
+    status: PageRenderStatus,
+) -> None:
+    monkeypatch.setattr(settings, "RENDER_MAX_ATTEMPTS", 3)
+    stale = datetime.now() - timedelta(seconds=settings.RENDER_JOB_TIMEOUT_SECONDS + 1)
+    job = PageRenderJob(
+        document_id=1,
+        status=PageRenderStatus.RUNNING,
+        attempts=attempts,
+        updated_at=stale,
+    )
+    session.add(job)
+    session.commit()
+
+    claimed = page_render_job_crud.claim_next_render_job(session)
+
+    session.refresh(job)
+    assert job.status == status
+    if status == PageRenderStatus.FAILED:
+        assert claimed is None
+        assert job.attempts == attempts
+    else:
+        assert claimed.id == job.id
+        assert job.attempts == attempts + 1
+
+
+@pytest.mark.parametrize("rotation", [0, 90])
+def test_tiles_add_up_to_the_page(tmp_path: Path, rotation: int) -> None:
+    pdf_path = create_pdf(tmp_path / "1_plan.pdf", pages=1, pagesize=A1)
+    pyramid = TilePyramid(tile_size=256, max_dpi=72)
+    with fitz.open(pdf_path) as pdf_document:
+        page = pdf_document[0]
+        page.set_rotation(rotation)
+        width, height = page.rect.width, page.rect.height
+        assert pyramid.level_count(width, height) == 5
+        level = 3
+        zoom = pyramid.zoom(level, width, height)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        expected = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        assert expected.size == pyramid.pixel_size(level, width, height)
+
+        stitched = Image.new("RGB", expected.size)
+        columns, rows = pyramid.grid(level, width, height)
+        for column in range(columns):
+            for row in range(rows):
+                tile_path = render_pdf_tile(
+                    pdf_document,
+                    1,
+                    pyramid,
+                    level,
+                    column,
+                    row,
+                    tmp_path / f"{column}_{row}.png",
+                )
+                with Image.open(tile_path) as tile:
+                    # Rendering a tile never takes more than a tile of memory
+                    assert tile.width <= 256 and tile.height <= 256
+                    stitched.paste(tile, (column * 256, row * 256))
+        with pytest.raises(IndexError):
+            render_pdf_tile(
+                pdf_document, 1, pyramid, level, columns, 0, tmp_path / "x.png"
+            )
+
+    assert ImageChops.difference(stitched, expected).getbbox() is None
+
+
+def test_render_tile_is_cached(tmp_path: Path, page_cache_dir: Path) -> None:
+    pdf_path = create_pdf(tmp_path / "1_plan.pdf", pages=1, pagesize=A1)
+    file_hash = generate_pdf_hash(pdf_path)
+
+    tile_path = render_service.render_tile(pdf_path, file_hash, 1, 2, 1, 1)
+
+    assert tile_path == page_cache.tile_cache_path(
+        file_hash, 1, render_service.TILE_PYRAMID, 2, 1, 1
+    )
+    with Image.open(tile_path) as tile:
+        assert tile.size == (256, 256)
+    pdf_path.unlink()
+    assert render_service.render_tile(pdf_path, file_hash, 1, 2, 1, 1) == tile_path
+
+
+def test_large_format_pages_are_tiled_in_the_manifest() -> None:
+    document = SimpleNamespace(
+        id=7,
+        file_hash="ab" * 32,
+        page_count=2,
+        pages=[
+            SimpleNamespace(page_number=1, width=612, height=792, rotation=0),
+            SimpleNamespace(page_number=2, width=A1[0], height=A1[1], rotation=90),
+        ],
+    )
+
+    letter_page, plan_page = render_service.document_page_manifest(document, "token")
+
+    assert "tiles" not in letter_page
+    assert "zoom" not in plan_page
+    tiles = plan_page["tiles"]
+    assert tiles["url"].startswith("/api/v1/documents/7/pages/2/tiles/{level}/")
+    assert tiles["levels"][0]["columns"] == tiles["levels"][0]["rows"] == 1
+    # The rotated plan is rendered landscape
+    deepest = tiles["levels"][-1]
+    assert deepest["width"] > deepest["height"]
+    assert deepest["width"] == math.ceil(A1[1] * settings.PAGE_TILE_MAX_DPI / 72)
+
+
+@pytest.mark.parametrize("backend", ["reportlab", "pymupdf"])
+def test_signed_preview_only_renders_stamped_pages(
+    tmp_path: Path,
+    page_cache_dir: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    backend: str,
+) -> None:
+    monkeypatch.setattr(storage, "_storage", storage.LocalStorageBackend(tmp_path))
+    tier = RenderTier(name="preview", width=200)
+    pdf_path = create_pdf(tmp_path / "envelope.pdf", pages=30)
+    file_hash = generate_pdf_hash(pdf_path)
+    source_path = blob_store.blob_path(file_hash)
+    source_path.parent.mkdir(parents=True)
+    pdf_path.rename(source_path)
+    stamped_pages = {3, 17, 30}
+    placements = [
+        (
+            SimpleNamespace(
+                type=FieldType.TEXT, page=page, x=100, y=700, text="signed"
+            ),
+            None,
+        )
+        for page in sorted(stamped_pages)
+    ]
+    signed_hash = get_stamping_backend(backend).finalize(
+        source_path, tmp_path / "signed.pdf", placements
+    )
+    signed_path = blob_store.blob_path(signed_hash)
+    signed_path.parent.mkdir(parents=True)
+    (tmp_path / "signed.pdf").rename(signed_path)
+    document = SimpleNamespace(
+        owner_id=1,
+        file="envelope.pdf",
+        file_hash=file_hash,
+        blob_sha256=file_hash,
+        signed_blob_sha256=signed_hash,
+        page_count=30,
+        signature_details=SimpleNamespace(signed_hash=signed_hash),
+    )
+    # The render workers cache the original on upload
+    render_service.render_document_pages(source_path, file_hash, [tier])
+
+    rendered = render_service.render_signed_preview(document, stamped_pages, [tier])
+
+    assert rendered[file_hash] == []
+    assert rendered[signed_hash] == [
+        page_cache.page_cache_path(signed_hash, page, tier)
+        for page in sorted(stamped_pages)
+    ]
+    # Untouched pages of the signed copy look the same as the original ones
+    with fitz.open(signed_path) as signed_document:
+        render_pdf_page(signed_document, 4, tmp_path / "page_4.png", tier)
+    assert (tmp_path / "page_4.png").read_bytes() == page_cache.page_cache_path(
+        file_hash, 4, tier
+    ).read_bytes()
+    assert render_service.signed_page_source(document, 4, stamped_pages) == (
+        source_path,
+        file_hash,
+    )
+    assert render_service.signed_page_source(document, 17, stamped_pages) == (
+        signed_path,
+        signed_hash,
+    )
+
+
+def test_signed_preview_manifest() -> None:
+    document = SimpleNamespace(
+        id=7,
+        file_hash="ab" * 32,
+        page_count=2,
+        signature_details=SimpleNamespace(signed_hash="cd" * 32),
+        pages=[
+            SimpleNamespace(page_number=1, width=612, height=792, rotation=0),
+            SimpleNamespace(page_number=2, width=612, height=792, rotation=0),
+        ],
+    )
+
+    untouched, stamped = render_service.document_page_manifest(
+        document, "token", stamped_pages={2}
+    )
+
+    assert untouched["screen"]["url"] == (
+        "/api/v1/documents/7/signed-pages/1?tier=screen"
+        f"&v={render_service.page_image_version('ab' * 32, SCREEN)}&token=token"
+    )
+    assert stamped["screen"]["url"] == (
+        "/api/v1/documents/7/signed-pages/2?tier=screen"
+        f"&v={render_service.page_image_version('cd' * 32, SCREEN)}&token=token"
+    )
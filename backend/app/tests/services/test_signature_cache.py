@@ -0,0 +1,99 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import fitz
+import pytest
+
+from app.models.models import FieldType
+from app.services import signature_cache
+from app.services.file_service import get_stamping_backend
+from app.services.signature_cache import SignatureAppearanceCache
+from app.tests.utils.pdf import create_pdf
+
+
+def _signature_image(path: Path) -> Path:
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 20), False)
+    pixmap.clear_with(0)
+    pixmap.save(path)
+    return path
+
+
+def test_cache_evicts_least_recently_used_over_budget() -> None:
+    cache = SignatureAppearanceCache(max_bytes=100)
+    cache.get("a", lambda: ("A", 40))
+    cache.get("b", lambda: ("B", 40))
+    assert cache.get("a", lambda: ("unused", 0)) == "A"
+    cache.get("c", lambda: ("C", 40))
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("b", lambda: ("B again", 40)) == "B again"
+    assert cache.stats()["hits"] == 1
+    assert cache.current_bytes <= 100
+
+
+def test_cache_skips_values_larger_than_budget() -> None:
+    cache = SignatureAppearanceCache(max_bytes=10)
+    assert cache.get("big", lambda: ("BIG", 11)) == "BIG"
+    assert cache.stats()["entries"] == 0
+
+
+def test_image_digests_follow_file_changes_within_their_bound(tmp_path: Path) -> None:
+    image_path = _signature_image(tmp_path / "signature.png")
+    digest = signature_cache.signature_image_digest(str(image_path))
+    assert signature_cache.signature_image_digest(str(image_path)) == digest
+
+    image_path.write_bytes(image_path.read_bytes() + b"\0")
+    assert signature_cache.signature_image_digest(str(image_path)) != digest
+    info = signature_cache._file_digest.cache_info()
+    assert info.maxsize == signature_cache.IMAGE_DIGEST_CACHE_SIZE
+    assert info.currsize <= info.maxsize
+
+
+@pytest.mark.parametrize("backend", ["reportlab", "pymupdf"])
+def test_signature_image_is_embedded_once_per_document(
+    tmp_path: Path, backend: str
+) -> None:
+    misses = signature_cache.signature_cache.stats()["misses"]
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=3)
+    signatory = SimpleNamespace(
+        id=1,
+        first_name="Jane",
+        last_name="Doe",
+        signature_image=str(_signature_image(tmp_path / "signature.png")),
+    )
+    placements = [
+        (
+            SimpleNamespace(
+                type=FieldType.SIGNATURE, page=page, x=100, y=100, width=80, height=40
+            ),
+            signatory,
+        )
+        for page in (1, 2, 3, 3)
+    ]
+    output_path = tmp_path / backend / "contract.pdf"
+
+    get_stamping_backend(backend).stamp(source_path, output_path, placements)
+
+    with fitz.open(output_path) as document:
+        image_xrefs = {image[0] for page in document for image in page.get_images()}
+    assert len(image_xrefs) == 1
+    assert signature_cache.signature_cache.stats()["misses"] == misses + 1
+
+
+def test_signature_images_are_charged_for_their_decoded_size(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cache = SignatureAppearanceCache(max_bytes=1 << 20)
+    monkeypatch.setattr(signature_cache, "signature_cache", cache)
+    signatory = SimpleNamespace(
+        id=1,
+        first_name="Jane",
+        last_name="Doe",
+        signature_image=str(_signature_image(tmp_path / "signature.png")),
+    )
+
+    reader = signature_cache.get_signature_image_reader(signatory)
+
+    assert reader.getSize() == (40, 20)
+    # RGB data and room for a soft mask
+    assert cache.stats()["bytes"] == 40 * 20 * 4
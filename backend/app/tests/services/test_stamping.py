@@ -0,0 +1,192 @@
+import hashlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import fitz
+import pytest
+
+from app.core.config import settings
+from app.models.models import FieldType
+from app.services.file_service import get_stamping_backend
+from app.services.file_utils import extract_page_geometry
+from app.services.stamping import document_file_id, pdf_owner_password
+from app.tests.utils.pdf import create_pdf
+
+PLACEMENTS = [
+    (
+        SimpleNamespace(type=FieldType.TEXT, page=2, x=100, y=700, text="equivalent"),
+        None,
+    ),
+    (
+        SimpleNamespace(
+            type=FieldType.CHECKBOX, page=1, x=300, y=300, size=20, checked=True
+        ),
+        None,
+    ),
+]
+
+
+def _word_position(pdf_path: Path, word: str) -> tuple[int, float, float]:
+    with fitz.open(pdf_path) as document:
+        for page in document:
+            for x0, y0, *_, text, _block, _line, _word in page.get_text("words"):
+                if text == word:
+                    return page.number, x0, y0
+    raise AssertionError(f"{word} not found in {pdf_path}")
+
+
+def test_backends_stamp_equivalent_output(tmp_path: Path) -> None:
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=3)
+    positions = []
+    for name in ("reportlab", "pymupdf"):
+        output_path = tmp_path / name / "contract.pdf"
+        get_stamping_backend(name).stamp(source_path, output_path, PLACEMENTS)
+        with fitz.open(output_path) as document:
+            assert document.page_count == 3
+            assert document[0].get_drawings()
+        positions.append(_word_position(output_path, "equivalent"))
+
+    (page_a, x_a, y_a), (page_b, x_b, y_b) = positions
+    assert page_a == page_b == 1
+    assert x_a == pytest.approx(x_b, abs=2)
+    assert y_a == pytest.approx(y_b, abs=2)
+
+
+@pytest.mark.parametrize("recorded_geometry", [False, True])
+def test_backends_follow_each_page_media_box(
+    tmp_path: Path, recorded_geometry: bool
+) -> None:
+    source_path = tmp_path / "mixed.pdf"
+    with fitz.open() as document:
+        document.new_page(width=612, height=792)
+        offset_page = document.new_page(width=842, height=1191)
+        offset_page.set_mediabox(fitz.Rect(30, 40, 872, 1231))
+        document.save(source_path)
+    page_boxes = None
+    if recorded_geometry:
+        page_boxes = {
+            page.page_number: page for page in extract_page_geometry(source_path)
+        }
+        assert page_boxes[2].width == 842 and page_boxes[2].origin_x == 30
+    placements = [
+        (SimpleNamespace(type=FieldType.TEXT, page=2, x=100, y=1100, text="top"), None)
+    ]
+
+    positions = []
+    for name in ("reportlab", "pymupdf"):
+        output_path = tmp_path / name / "mixed.pdf"
+        get_stamping_backend(name).stamp(
+            source_path, output_path, placements, page_boxes
+        )
+        page_number, x0, y0 = _word_position(output_path, "top")
+        assert page_number == 1
+        positions.append((x0, y0))
+    (reportlab_x, reportlab_y), (pymupdf_x, pymupdf_y) = positions
+    assert reportlab_x == pytest.approx(pymupdf_x, abs=1)
+    assert reportlab_y == pytest.approx(pymupdf_y, abs=1)
+    # 1100pt above the bottom of a 1191pt high page
+    assert reportlab_y < 100
+
+
+@pytest.mark.parametrize("rotation", [90, 180, 270])
+def test_backends_stamp_rotated_pages_upright(tmp_path: Path, rotation: int) -> None:
+    source_path = tmp_path / "rotated.pdf"
+    with fitz.open() as document:
+        document.new_page(width=612, height=792).set_rotation(rotation)
+        document.save(source_path)
+    placements = [
+        (
+            SimpleNamespace(type=FieldType.TEXT, page=1, x=100, y=500, text="upright"),
+            None,
+        )
+    ]
+
+    for name in ("reportlab", "pymupdf"):
+        output_path = tmp_path / name / "rotated.pdf"
+        get_stamping_backend(name).stamp(source_path, output_path, placements)
+        with fitz.open(output_path) as document:
+            page = document[0]
+            (line,) = [
+                line
+                for block in page.get_text("dict")["blocks"]
+                for line in block["lines"]
+            ]
+            # Text is extracted before the rotation of the page
+            direction = fitz.Point(line["dir"]) * page.rotation_matrix
+            direction -= fitz.Point(0, 0) * page.rotation_matrix
+            bbox = fitz.Rect(line["bbox"]) * page.rotation_matrix
+            assert tuple(direction) == pytest.approx((1, 0), abs=1e-6)
+            assert bbox.x0 == pytest.approx(100, abs=2)
+            # Baseline 500pt above the bottom of the page as displayed
+            assert page.rect.height - bbox.y1 == pytest.approx(500, abs=4)
+
+
+def test_pymupdf_backend_appends_incremental_update(tmp_path: Path) -> None:
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=2)
+    output_path = tmp_path / "signed_documents" / "contract.pdf"
+
+    get_stamping_backend("pymupdf").stamp(source_path, output_path, PLACEMENTS)
+
+    original = source_path.read_bytes()
+    assert output_path.read_bytes().startswith(original)
+
+
+def test_pymupdf_backend_finalize_returns_output_hash(tmp_path: Path) -> None:
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=2)
+    output_path = tmp_path / "signed_documents" / "contract.pdf"
+
+    pdf_hash = get_stamping_backend("pymupdf").finalize(
+        source_path, output_path, PLACEMENTS
+    )
+
+    assert pdf_hash == hashlib.sha256(output_path.read_bytes()).hexdigest()
+    with fitz.open(output_path) as document:
+        assert document.metadata["encryption"]
+
+
+@pytest.mark.parametrize("backend", ["reportlab", "pymupdf"])
+def test_signed_copies_open_with_the_owner_password_of_any_secret_key(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, backend: str
+) -> None:
+    monkeypatch.setattr(settings, "SIGNED_PDF_ENCRYPTION", True)
+    monkeypatch.setattr(settings, "SECRET_KEY", "k" * 86)
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=2)
+    output_path = tmp_path / "signed_documents" / "contract.pdf"
+
+    get_stamping_backend(backend).finalize(source_path, output_path, PLACEMENTS)
+
+    with fitz.open(output_path) as document:
+        # Owner rights are reported as 4, user rights as 2
+        assert document.authenticate(pdf_owner_password()) == 4
+
+
+def test_pypdf2_encryption_is_keyed_by_the_pinned_file_id(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Guards the PyPDF2 internals encrypt_pdf_writer relies on
+    monkeypatch.setattr(settings, "SIGNED_PDF_ENCRYPTION", True)
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=2)
+    output_path = tmp_path / "signed_documents" / "contract.pdf"
+
+    get_stamping_backend("reportlab").finalize(source_path, output_path, PLACEMENTS)
+
+    file_id = document_file_id(source_path, PLACEMENTS).hex().upper()
+    with fitz.open(output_path) as document:
+        assert not document.needs_pass
+        assert document.xref_get_key(-1, "ID") == ("array", f"[<{file_id}><{file_id}>]")
+        assert "equivalent" in document[1].get_text()
+
+
+def test_pymupdf_backend_hashes_incremental_finalization(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "SIGNED_PDF_ENCRYPTION", False)
+    source_path = create_pdf(tmp_path / "contract.pdf", pages=2)
+    output_path = tmp_path / "signed_documents" / "contract.pdf"
+
+    pdf_hash = get_stamping_backend("pymupdf").finalize(
+        source_path, output_path, PLACEMENTS
+    )
+
+    assert pdf_hash == hashlib.sha256(output_path.read_bytes()).hexdigest()
+    assert output_path.read_bytes().startswith(source_path.read_bytes())
@@ -0,0 +1,159 @@
+import os
+import time
+from collections.abc import Generator
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.services import storage
+
+KEY = "blobs/ab/cd/abcd"
+CONTENT = bytes(range(256)) * 16
+
+
+@pytest.fixture()
+def s3_endpoint() -> Generator[str, None, None]:
+    # S3-compatible store standing in for S3 or MinIO
+    server_module = pytest.importorskip("moto.server")
+    server = server_module.ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture(params=["local", "s3"])
+def backend(request: pytest.FixtureRequest, tmp_path: Path) -> storage.StorageBackend:
+    if request.param == "local":
+        return storage.LocalStorageBackend(tmp_path / "files")
+    backend = storage.S3StorageBackend(
+        "documents",
+        tmp_path / "cache",
+        endpoint_url=request.getfixturevalue("s3_endpoint"),
+        region="us-east-1",
+        access_key_id="test",
+        secret_access_key="test",
+    )
+    backend.client.create_bucket(Bucket="documents")
+    return backend
+
+
+def test_stored_files_are_read_back(
+    tmp_path: Path, backend: storage.StorageBackend
+) -> None:
+    source = tmp_path / "source.pdf"
+    source.write_bytes(CONTENT)
+
+    backend.put(KEY, source)
+
+    assert source.exists()
+    assert backend.size(KEY) == len(CONTENT)
+    assert backend.get(KEY) == CONTENT
+    assert b"".join(backend.stream(KEY)) == CONTENT
+    assert b"".join(backend.stream(KEY, 10, 99)) == CONTENT[10:100]
+    assert b"".join(backend.stream(KEY, 4000)) == CONTENT[4000:]
+    assert backend.local_path(KEY).read_bytes() == CONTENT
+
+
+def test_moved_files_are_kept_as_local_copies(
+    tmp_path: Path, backend: storage.StorageBackend
+) -> None:
+    source = tmp_path / "source.pdf"
+    source.write_bytes(CONTENT)
+
+    backend.put(KEY, source, move=True)
+
+    assert not source.exists()
+    assert backend.local_path(KEY).read_bytes() == CONTENT
+    assert backend.get(KEY) == CONTENT
+
+
+def test_deleted_files_are_missing(
+    tmp_path: Path, backend: storage.StorageBackend
+) -> None:
+    source = tmp_path / "source.pdf"
+    source.write_bytes(CONTENT)
+    backend.put(KEY, source)
+    local_path = backend.local_path(KEY)
+
+    backend.delete(KEY)
+    backend.delete(KEY)
+
+    assert not backend.exists(KEY)
+    assert not local_path.exists()
+    assert not backend.local_path(KEY).exists()
+    with pytest.raises(FileNotFoundError):
+        backend.get(KEY)
+    with pytest.raises(FileNotFoundError):
+        b"".join(backend.stream(KEY))
+
+
+def test_presigned_urls_download_without_credentials(
+    tmp_path: Path, backend: storage.StorageBackend
+) -> None:
+    source = tmp_path / "source.pdf"
+    source.write_bytes(CONTENT)
+    backend.put(KEY, source)
+
+    url = backend.presign(KEY, 60, "contrat signé.pdf", "application/pdf")
+
+    if backend.is_local:
+        assert url is None
+        return
+    response = httpx.get(url)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["content-disposition"] == (
+        "attachment; filename*=utf-8''contrat%20sign%C3%A9.pdf"
+    )
+
+
+def test_least_recently_used_local_copies_are_evicted(tmp_path: Path) -> None:
+    now = time.time()
+    paths = []
+    # Oldest first, the last one used too recently to be evicted
+    for index, age in enumerate((3600, 1800, 900, 60)):
+        path = tmp_path / f"{index:02x}" / "ab" / f"blob{index}"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (now - age, now - age))
+        paths.append(path)
+    (tmp_path / "00" / "ab" / ".blob.tmp").write_bytes(b"x" * 100)
+
+    assert storage.evict_local_cache(tmp_path, 400) == 0
+    assert storage.evict_local_cache(tmp_path, 250, keep=(paths[0],)) == 2
+
+    assert [path.exists() for path in paths] == [True, False, False, True]
+    assert not (tmp_path / "01").exists()
+
+
+def test_remote_local_copies_stay_within_their_budget(
+    tmp_path: Path, s3_endpoint: str
+) -> None:
+    backend = storage.S3StorageBackend(
+        "documents",
+        tmp_path / "cache",
+        endpoint_url=s3_endpoint,
+        region="us-east-1",
+        access_key_id="test",
+        secret_access_key="test",
+        cache_max_bytes=len(CONTENT) * 2,
+    )
+    backend.client.create_bucket(Bucket="documents")
+    keys = [f"blobs/{index:02x}/cd/blob{index}" for index in range(3)]
+    long_ago = time.time() - storage.CACHE_GRACE_SECONDS - 60
+    for key in keys:
+        source = tmp_path / "source.pdf"
+        source.write_bytes(CONTENT)
+        backend.put(key, source, move=True)
+        os.utime(backend.cache_dir / key, (long_ago, long_ago))
+
+    assert [(backend.cache_dir / key).exists() for key in keys] == [
+        False,
+        False,
+        True,
+    ]
+    # Evicted copies are downloaded again
+    assert backend.local_path(keys[0]).read_bytes() == CONTENT
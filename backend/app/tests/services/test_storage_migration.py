@@ -0,0 +1,85 @@
+from pathlib import Path
+
+from sqlmodel import Session
+
+from app.models.models import (
+    Blob,
+    Document,
+    DocumentStatus,
+)
+from app.services import (
+    blob_store,
+    page_cache,
+    render_service,
+    storage_migration,
+)
+from app.services.file_service import generate_pdf_hash
+from app.tests.utils.pdf import create_pdf
+
+SCREEN = render_service.RENDER_TIERS["screen"]
+
+
+def add_document(
+    session: Session, file: str, status: DocumentStatus = DocumentStatus.DRAFT
+) -> Document:
+    document = Document(title=file, file=file, status=status, owner_id=1, file_url=file)
+    session.add(document)
+    session.commit()
+    return document
+
+
+def test_legacy_files_are_moved_into_the_blob_store(
+    upload_dir: Path, session: Session
+) -> None:
+    content = create_pdf(upload_dir / "1_contract.pdf", pages=2).read_bytes()
+    (upload_dir / "1_copy.pdf").write_bytes(content)
+    signed_content = create_pdf(
+        upload_dir / "signed_documents" / "1_contract.pdf", pages=2
+    ).read_bytes()
+    signed = add_document(session, "contract.pdf", DocumentStatus.SIGNED)
+    # Uploaded again under the same name, the file was shared
+    draft = add_document(session, "contract.pdf")
+    copy = add_document(session, "copy.pdf")
+    missing = add_document(session, "missing.pdf")
+
+    stats = storage_migration.migrate_document_files(session, batch_size=2)
+
+    assert (stats.moved, stats.missing, stats.skipped) == (4, 1, 0)
+    for document in (signed, draft, copy, missing):
+        session.refresh(document)
+    file_hash = generate_pdf_hash(blob_store.blob_path(signed.blob_sha256))
+    assert signed.blob_sha256 == draft.blob_sha256 == copy.blob_sha256 == file_hash
+    assert signed.file_hash == file_hash
+    assert blob_store.document_file_path(copy).read_bytes() == content
+    assert blob_store.signed_document_path(signed).read_bytes() == signed_content
+    assert session.get(Blob, file_hash).ref_count == 3
+    assert session.get(Blob, signed.signed_blob_sha256).ref_count == 1
+    assert missing.blob_sha256 is None
+    assert list(upload_dir.glob("*.pdf")) == []
+    assert list((upload_dir / "signed_documents").iterdir()) == []
+
+    assert storage_migration.migrate_document_files(session).moved == 0
+
+
+def test_cached_pages_are_moved_to_the_sharded_layout(
+    upload_dir: Path, session: Session
+) -> None:
+    pdf_path = create_pdf(upload_dir / "1_contract.pdf", pages=2)
+    file_hash = generate_pdf_hash(pdf_path)
+    new_path = render_service.get_page_image(session, pdf_path, file_hash, 1, SCREEN)
+    # Cached before the layout was sharded
+    old_dir = upload_dir / "page_cache" / file_hash[:2] / file_hash
+    new_path.parents[1].rename(old_dir)
+    old_path = old_dir / SCREEN.key / new_path.name
+    entry = page_cache.get_cache_entry(session, new_path)
+    entry.key = page_cache.page_cache_key(old_path)
+    session.add(entry)
+    session.commit()
+
+    assert storage_migration.migrate_page_cache(session) == 1
+
+    assert new_path.exists()
+    assert not old_dir.exists()
+    assert page_cache.get_cache_entry(session, new_path)
+    assert page_cache.get_cache_entry(session, old_path) is None
+    assert storage_migration.migrate_page_cache(session) == 0
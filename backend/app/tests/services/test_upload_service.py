@@ -0,0 +1,103 @@
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import anyio
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+from starlette.requests import ClientDisconnect
+
+from app.crud import upload_session_crud
+from app.models.models import UploadSession
+from app.services import blob_store, upload_service
+from app.services.file_service import generate_pdf_hash
+from app.tests.utils.pdf import create_pdf
+
+
+def create_upload_session(session: Session, size: int) -> UploadSession:
+    return upload_session_crud.create_upload_session(
+        session,
+        owner_id=1,
+        title="Contract",
+        status="draft",
+        filename="contract.pdf",
+        size=size,
+    )
+
+
+async def send(chunks: list[bytes], disconnect: bool = False) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+    if disconnect:
+        raise ClientDisconnect()
+
+
+def append(upload_session: UploadSession, chunks: list[bytes], **kwargs) -> int:
+    return anyio.run(
+        upload_service.append_upload_chunk, upload_session, send(chunks, **kwargs)
+    )
+
+
+def test_interrupted_upload_resumes_from_its_offset(
+    tmp_path: Path, upload_dir: Path, session: Session
+) -> None:
+    content = create_pdf(tmp_path / "source.pdf", pages=20).read_bytes()
+    upload_session = create_upload_session(session, len(content))
+    first_part = [content[:1000], content[1000:3000]]
+
+    offset = append(upload_session, first_part, disconnect=True)
+    upload_session_crud.set_upload_offset(session, upload_session, offset)
+    # Bytes written past the offset the server recorded are sent again
+    with open(upload_service.upload_part_path(upload_session.id), "ab") as part:
+        part.write(b"unrecorded")
+    offset = append(upload_session, [content[3000:]])
+    upload_session_crud.set_upload_offset(session, upload_session, offset)
+    upload = upload_service.assemble_upload(upload_session)
+    blob_store.store_upload(session, upload)
+    blob_path = blob_store.blob_path(upload.sha256)
+
+    assert offset == len(content)
+    assert upload.sha256 == generate_pdf_hash(tmp_path / "source.pdf")
+    assert blob_path.read_bytes() == content
+    assert not upload_service.upload_part_path(upload_session.id).exists()
+
+
+@pytest.mark.parametrize(
+    "chunks, size, status_code",
+    [
+        ([b"%PDF-1.7\n", bytes(100)], 50, 413),
+        ([b"PK\x03\x04" + bytes(2000)], 10**6, 415),
+    ],
+)
+def test_bad_chunks_are_rejected(
+    upload_dir: Path,
+    session: Session,
+    chunks: list[bytes],
+    size: int,
+    status_code: int,
+) -> None:
+    upload_session = create_upload_session(session, size)
+
+    with pytest.raises(HTTPException) as exc_info:
+        append(upload_session, chunks)
+
+    assert exc_info.value.status_code == status_code
+
+
+def test_expired_upload_sessions_are_deleted(
+    upload_dir: Path, session: Session
+) -> None:
+    expired = create_upload_session(session, 10**6)
+    append(expired, [b"%PDF-1.7\n"])
+    expired.expires_at = datetime.now() - timedelta(seconds=1)
+    session.add(expired)
+    session.commit()
+    active = create_upload_session(session, 10**6)
+
+    assert upload_session_crud.get_upload_session(session, expired.id) is None
+    assert upload_service.expire_upload_sessions(session) == 1
+
+    assert session.get(UploadSession, expired.id) is None
+    assert not upload_service.upload_part_path(expired.id).exists()
+    assert upload_session_crud.get_upload_session(session, active.id) == active
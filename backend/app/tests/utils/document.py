@@ -0,0 +1,23 @@
+from sqlmodel import Session
+
+from app.crud import document_crud
+from app.models.models import Document, DocumentStatus
+from app.schemas.schemas import DocumentCreate
+from app.services.file_utils import PageGeometry
+from app.tests.utils.user import create_random_user
+from app.tests.utils.utils import random_lower_string
+
+
+def create_random_document(
+    db: Session, pages: list[PageGeometry] | None = None
+) -> Document:
+    user = create_random_user(db)
+    owner_id = user.id
+    assert owner_id is not None
+    document_in = DocumentCreate(
+        title=random_lower_string(),
+        file=f"{random_lower_string()}.pdf",
+        status=DocumentStatus.DRAFT,
+        owner_id=owner_id,
+    )
+    return document_crud.create_document(db, obj_in=document_in, pages=pages)
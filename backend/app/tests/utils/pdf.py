@@ -0,0 +1,14 @@
+from pathlib import Path
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+
+def create_pdf(path: Path, pages: int = 1, pagesize: tuple = letter) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    can = canvas.Canvas(str(path), pagesize=pagesize)
+    for page_number in range(1, pages + 1):
+        can.drawString(72, 72, f"Page {page_number}")
+        can.showPage()
+    can.save()
+    return path
@@ -145,7 +145,7 @@ def send_signature_request_notification_email(
     signature_request_name: str,
     signature_request_id: str,
     status: str,
-    documents: Optional[List[Path]] = None,  # Type hint corrected
+    documents: Optional[List[Tuple[str, Path]]] = None,  # (filename, path) pairs
 ) -> emails.Message:
     subject = f"""Signature Request Status Update for \
     '{signature_request_name}' with id: '{signature_request_id}'"""
@@ -153,9 +153,9 @@ def send_signature_request_notification_email(
     # Prepare email attachments
     attachments = []
     if documents is not None:  # Check if documents is not None before iterating
-        for document_path in documents:
+        for filename, document_path in documents:
             with open(document_path, "rb") as f:
-                attachments.append((document_path.name, f.read(), "application/pdf"))
+                attachments.append((filename, f.read(), "application/pdf"))
 
     # Mapping status to user-friendly messages
     status_messages = {
@@ -0,0 +1,59 @@
+"""
+Compare two finalization benchmark reports stage by stage:
+
+    python -m benchmarks.compare baseline.json candidate.json
+
+Exits with status 1 when a stage got slower, or used more memory, than the
+allowed threshold.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+METRICS = ["wall_time_seconds", "peak_rss_bytes", "bytes_written"]
+
+
+def load_results(path: Path) -> tuple[str | None, dict]:
+    report = json.loads(path.read_text())
+    results = {
+        (result["case"], result["stage"]): result for result in report["results"]
+    }
+    return report.get("commit"), results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Relative increase reported as a regression (default: 0.2)",
+    )
+    args = parser.parse_args()
+
+    baseline_commit, baseline = load_results(args.baseline)
+    candidate_commit, candidate = load_results(args.candidate)
+    print(f"baseline:  {baseline_commit}\ncandidate: {candidate_commit}\n")
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        ratios = []
+        for metric in METRICS:
+            before, after = baseline[key][metric], candidate[key][metric]
+            ratio = after / before if before else 1.0
+            ratios.append(f"{metric}={ratio:6.2f}x")
+            if metric != "bytes_written" and ratio > 1 + args.threshold:
+                regressions += 1
+        print(f"{key[0]:32} {key[1]:24} {' '.join(ratios)}")
+
+    if regressions:
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
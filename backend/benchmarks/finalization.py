@@ -0,0 +1,279 @@
+"""
+Benchmark the signing hot path on synthetic envelopes.
+
+Every stage of the finalization pipeline runs for every case of the matrix in
+a freshly spawned process, without SMTP or HTTP, and the wall time, peak RSS
+and bytes written of each run are reported as JSON:
+
+    python -m benchmarks.finalization --output results.json
+
+Run it from the ``backend`` directory with the usual settings environment.
+Results of two commits can be compared with ``benchmarks.compare``.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import platform
+import queue
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+from app.services.file_service import (
+    apply_pdf_security,
+    generate_pdf_hash,
+    get_stamping_backend,
+)
+from app.services.file_utils import convert_pdf_to_images
+from benchmarks.synthetic import (
+    create_placements,
+    create_scanned_pdf,
+    create_signature_image,
+    create_vector_pdf,
+)
+
+DEFAULT_PAGES = [1, 10, 100, 500]
+DEFAULT_FIELDS = [1, 20, 200]
+QUICK_PAGES = [1, 20]
+QUICK_FIELDS = [1, 20]
+CONTENTS = ["vector", "scanned"]
+STAGES = [
+    "add_fields_to_pdf",
+    "apply_pdf_security",
+    "generate_pdf_hash",
+    "finalize",
+    "convert_pdf_to_images",
+]
+# A stage taking longer, or whose process dies, fails the run instead of
+# hanging it
+DEFAULT_STAGE_TIMEOUT_SECONDS = 3600
+
+
+@dataclass(frozen=True)
+class Case:
+    pages: int
+    fields: int
+    content: str
+    signature_image: bool
+
+    @property
+    def key(self) -> str:
+        image = "image" if self.signature_image else "font"
+        return f"{self.content}-{self.pages}p-{self.fields}f-{image}"
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def path_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(child.stat().st_size for child in path.rglob("*") if child.is_file())
+    return path.stat().st_size
+
+
+def run_stage(stage: str, backend: str, case: Case, workdir: Path) -> Path | None:
+    """
+    Run one stage and return what it wrote, if anything.
+    """
+    source_path = workdir / "source.pdf"
+    signature_image = workdir / "signature.png" if case.signature_image else None
+    placements = create_placements(
+        case.pages, case.fields, str(signature_image) if signature_image else None
+    )
+    if stage == "add_fields_to_pdf":
+        return get_stamping_backend(backend).stamp(
+            source_path, workdir / "out" / "stamped.pdf", placements
+        )
+    if stage == "apply_pdf_security":
+        apply_pdf_security(str(workdir / "out" / "secured.pdf"))
+        return workdir / "out" / "secured.pdf"
+    if stage == "generate_pdf_hash":
+        generate_pdf_hash(str(workdir / "out" / "secured.pdf"))
+        return None
+    if stage == "finalize":
+        get_stamping_backend(backend).finalize(
+            source_path, workdir / "out" / "signed.pdf", placements
+        )
+        return workdir / "out" / "signed.pdf"
+    if stage == "convert_pdf_to_images":
+        convert_pdf_to_images(source_path, workdir / "out" / "images")
+        return workdir / "out" / "images"
+    raise ValueError(f"Unknown stage {stage}")
+
+
+def measure_stage(stage: str, backend: str, case: Case, workdir: Path, results) -> None:
+    baseline_rss = peak_rss_bytes()
+    start = time.perf_counter()
+    output = run_stage(stage, backend, case, workdir)
+    wall_time = time.perf_counter() - start
+    results.put(
+        {
+            "wall_time_seconds": round(wall_time, 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "baseline_rss_bytes": baseline_rss,
+            "bytes_written": path_size(output) if output else 0,
+        }
+    )
+
+
+def prepare_case(case: Case, workdir: Path) -> None:
+    workdir.mkdir(parents=True, exist_ok=True)
+    (workdir / "out").mkdir(exist_ok=True)
+    if case.content == "scanned":
+        create_scanned_pdf(workdir / "source.pdf", case.pages)
+    else:
+        create_vector_pdf(workdir / "source.pdf", case.pages)
+    if case.signature_image:
+        create_signature_image(workdir / "signature.png")
+
+
+def prepare_stage(stage: str, backend: str, case: Case, workdir: Path) -> None:
+    """
+    Write the input of a stage that reads the output of an earlier one, so
+    that every stage can be benchmarked on its own.
+    """
+    out = workdir / "out"
+    if stage in ("apply_pdf_security", "generate_pdf_hash"):
+        if not (out / "stamped.pdf").exists():
+            run_stage("add_fields_to_pdf", backend, case, workdir)
+    if stage == "apply_pdf_security":
+        # apply_pdf_security rewrites its input in place
+        shutil.copyfile(out / "stamped.pdf", out / "secured.pdf")
+    if stage == "generate_pdf_hash" and not (out / "secured.pdf").exists():
+        shutil.copyfile(out / "stamped.pdf", out / "secured.pdf")
+        run_stage("apply_pdf_security", backend, case, workdir)
+
+
+def wait_for_measurement(process, results, stage: str, timeout: float) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            pass
+        if not process.is_alive():
+            # The measurement may have landed right before the process exited
+            try:
+                return results.get(timeout=1)
+            except queue.Empty:
+                raise RuntimeError(
+                    f"Stage {stage} exited with code {process.exitcode} "
+                    "without reporting"
+                ) from None
+        if time.monotonic() > deadline:
+            process.terminate()
+            process.join()
+            raise RuntimeError(f"Stage {stage} did not finish within {timeout}s")
+
+
+def benchmark_case(
+    case: Case,
+    backend: str,
+    stages: list[str],
+    workdir: Path,
+    stage_timeout: float = DEFAULT_STAGE_TIMEOUT_SECONDS,
+) -> list[dict]:
+    prepare_case(case, workdir)
+    context = multiprocessing.get_context("spawn")
+    measurements = []
+    for stage in stages:
+        prepare_stage(stage, backend, case, workdir)
+        results = context.Queue()
+        process = context.Process(
+            target=measure_stage, args=(stage, backend, case, workdir, results)
+        )
+        process.start()
+        measurement = wait_for_measurement(process, results, stage, stage_timeout)
+        process.join()
+        measurements.append(
+            {"case": case.key, **asdict(case), "stage": stage, **measurement}
+        )
+        print(
+            f"{case.key:32} {stage:24} {measurement['wall_time_seconds']:10.3f}s "
+            f"{measurement['peak_rss_bytes'] / 2**20:9.1f} MiB",
+            file=sys.stderr,
+        )
+    shutil.rmtree(workdir)
+    return measurements
+
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=parse_int_list, default=None)
+    parser.add_argument("--fields", type=parse_int_list, default=None)
+    parser.add_argument("--contents", default=",".join(CONTENTS))
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--backend", default="reportlab")
+    parser.add_argument(
+        "--quick", action="store_true", help="Run a small matrix, e.g. in CI"
+    )
+    parser.add_argument(
+        "--stage-timeout",
+        type=float,
+        default=DEFAULT_STAGE_TIMEOUT_SECONDS,
+        help="Seconds after which a stage fails the run",
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--workdir", type=Path, default=None)
+    args = parser.parse_args()
+
+    pages = args.pages or (QUICK_PAGES if args.quick else DEFAULT_PAGES)
+    fields = args.fields or (QUICK_FIELDS if args.quick else DEFAULT_FIELDS)
+    stages = args.stages.split(",")
+    cases = [
+        Case(pages=p, fields=f, content=content, signature_image=image)
+        for p, f, content, image in itertools.product(
+            pages, fields, args.contents.split(","), (False, True)
+        )
+    ]
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="finalization-bench-"))
+    results = []
+    for case in cases:
+        results.extend(
+            benchmark_case(
+                case, args.backend, stages, workdir / case.key, args.stage_timeout
+            )
+        )
+
+    report = {
+        "commit": current_commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stamping_backend": args.backend,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark full-document page rasterization across process pool sizes.
+
+Every page of synthetic vector and scanned documents is rendered once per
+pool size, and the wall time and speedup over a single process are reported
+as JSON:
+
+    python -m benchmarks.rasterization --pages 100,300 --output results.json
+
+Run it from the ``backend`` directory with the usual settings environment.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from app.services.file_utils import convert_pdf_to_images
+from benchmarks.finalization import current_commit, parse_int_list
+from benchmarks.synthetic import create_scanned_pdf, create_vector_pdf
+
+DEFAULT_PAGES = [100, 300]
+CONTENTS = ["vector", "scanned"]
+
+
+def default_pool_sizes() -> list[int]:
+    cores = os.cpu_count() or 1
+    sizes = [1]
+    while sizes[-1] * 2 <= cores:
+        sizes.append(sizes[-1] * 2)
+    if sizes[-1] != cores:
+        sizes.append(cores)
+    return sizes
+
+
+def measure(pdf_path: Path, output_dir: Path, workers: int) -> float:
+    shutil.rmtree(output_dir, ignore_errors=True)
+    if workers == 1:
+        start = time.perf_counter()
+        convert_pdf_to_images(pdf_path, output_dir)
+        return time.perf_counter() - start
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Start the processes up front, a long-lived pool is already warm
+        list(executor.map(abs, range(workers)))
+        start = time.perf_counter()
+        convert_pdf_to_images(pdf_path, output_dir, executor, workers)
+        return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=parse_int_list, default=DEFAULT_PAGES)
+    parser.add_argument("--contents", default=",".join(CONTENTS))
+    parser.add_argument("--pool-sizes", type=parse_int_list, default=None)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    pool_sizes = args.pool_sizes or default_pool_sizes()
+    workdir = Path(tempfile.mkdtemp(prefix="rasterization-bench-"))
+    results = []
+    try:
+        for pages in args.pages:
+            for content in args.contents.split(","):
+                pdf_path = workdir / f"{content}-{pages}p.pdf"
+                if content == "scanned":
+                    create_scanned_pdf(pdf_path, pages)
+                else:
+                    create_vector_pdf(pdf_path, pages)
+                baseline = None
+                for workers in pool_sizes:
+                    wall_time = measure(pdf_path, workdir / "images", workers)
+                    baseline = baseline or wall_time
+                    results.append(
+                        {
+                            "case": f"{content}-{pages}p",
+                            "pages": pages,
+                            "content": content,
+                            "workers": workers,
+                            "wall_time_seconds": round(wall_time, 6),
+                            "speedup": round(baseline / wall_time, 3),
+                        }
+                    )
+                    print(
+                        f"{content}-{pages}p {workers:3} workers "
+                        f"{wall_time:10.3f}s x{baseline / wall_time:.2f}",
+                        file=sys.stderr,
+                    )
+    finally:
+        shutil.rmtree(workdir)
+
+    report = {
+        "commit": current_commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Synthetic envelopes for the finalization benchmarks.
+
+Documents are either vector (text and line art drawn with reportlab) or
+scanned (one full-page raster image per page), and come with fields of every
+``FieldType`` spread over their pages.
+"""
+
+import random
+from pathlib import Path
+
+import fitz
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from app.models.models import FieldType
+from app.services.finalization_service import (
+    FieldDescriptor,
+    RadioDescriptor,
+    SignatoryDescriptor,
+)
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+SCAN_DPI = 100
+
+
+def create_vector_pdf(path: Path, pages: int) -> Path:
+    can = canvas.Canvas(str(path), pagesize=letter)
+    for page_number in range(1, pages + 1):
+        can.setFont("Helvetica", 10)
+        for line in range(50):
+            can.drawString(
+                50, PAGE_HEIGHT - 60 - line * 14, f"Clause {page_number}.{line} " * 6
+            )
+        can.rect(40, 40, PAGE_WIDTH - 80, PAGE_HEIGHT - 80)
+        can.showPage()
+    can.save()
+    return path
+
+
+def create_scanned_pdf(path: Path, pages: int, seed: int = 0) -> Path:
+    rng = random.Random(seed)
+    width = int(PAGE_WIDTH / 72 * SCAN_DPI)
+    height = int(PAGE_HEIGHT / 72 * SCAN_DPI)
+    document = fitz.open()
+    for _ in range(pages):
+        # Noise does not compress, like the grain of a real scan
+        samples = rng.randbytes(width * height)
+        pixmap = fitz.Pixmap(fitz.csGRAY, width, height, samples, False)
+        page = document.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_image(page.rect, stream=pixmap.tobytes("jpeg"))
+    document.save(path)
+    document.close()
+    return path
+
+
+def create_signature_image(path: Path) -> Path:
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 400, 120), False)
+    pixmap.clear_with(255)
+    for x in range(20, 380):
+        y = 60 + int(30 * ((x % 90) / 45 - 1))
+        for dy in range(3):
+            pixmap.set_pixel(x, y + dy, (0, 0, 80))
+    pixmap.save(path)
+    return path
+
+
+def create_placements(
+    pages: int, fields: int, signature_image: str | None, seed: int = 0
+) -> list[tuple[FieldDescriptor, SignatoryDescriptor]]:
+    """
+    Build ``fields`` placements cycling through every field type and spread
+    randomly over the pages of the document.
+    """
+    rng = random.Random(seed)
+    signatory = SignatoryDescriptor(
+        id=1, first_name="Jane", last_name="Doe", signature_image=signature_image
+    )
+    field_types = list(FieldType)
+    placements = []
+    for index in range(fields):
+        field_type = field_types[index % len(field_types)]
+        x = rng.randint(50, int(PAGE_WIDTH) - 200)
+        y = rng.randint(50, int(PAGE_HEIGHT) - 100)
+        field = FieldDescriptor(
+            type=field_type,
+            page=rng.randint(1, pages),
+            x=x,
+            y=y,
+            width=150,
+            height=45,
+            text=f"Field {index}",
+            mention="Read and approved",
+            checked=True,
+            size=16,
+            radios=tuple(
+                RadioDescriptor(x=x + offset, y=y, size=12, checked=offset == 0)
+                for offset in (0, 20, 40)
+            ),
+        )
+        placements.append((field, signatory))
+    return placements
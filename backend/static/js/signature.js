@@ -24,28 +24,135 @@ async function initializeSignaturePage(email, signatureRequestId) {
 	});
 
 	async function updateDocumentDisplay(index) {
-		const urls = JSON.parse(
-			documentLinks[index].dataset.urls.replace(/'/g, '"'),
-		);
+		let pages = JSON.parse(documentLinks[index].dataset.pages);
 		currentDocIndex = index;
-		console.log("Loading images for document index:", index, "URLs:", urls);
-		await loadImages(urls);
+		if (pages.length === 0) {
+			pages = await waitForPages(index);
+			if (currentDocIndex !== index) {
+				return;
+			}
+		}
+		console.log("Loading pages for document index:", index, "Pages:", pages);
+		await loadImages(pages);
 		attachScrollListener(index);
 		updateButtonStates();
 	}
 
-	async function loadImages(urls) {
+	async function waitForPages(index) {
+		// The pages are rendered by a background worker, show a placeholder
+		// and poll until they are ready
+		const link = documentLinks[index];
+		const token = new URLSearchParams(window.location.search).get("token");
+		pdfContainer.innerHTML =
+			'<p class="text-center text-muted mt-5">Preparing the document…</p>';
+		while (true) {
+			const response = await fetch(
+				`/api/v1/signe/document_pages?token=${encodeURIComponent(token)}` +
+					`&document_id=${link.dataset.documentId}`,
+			);
+			const manifest = await response.json();
+			if (manifest.status === "ready") {
+				link.dataset.pages = JSON.stringify(manifest.pages);
+				return manifest.pages;
+			}
+			if (manifest.status === "failed" || !response.ok) {
+				pdfContainer.innerHTML =
+					'<p class="text-center text-danger mt-5">This document could not be displayed.</p>';
+				return [];
+			}
+			await new Promise((resolve) => setTimeout(resolve, 2000));
+		}
+	}
+
+	async function loadImages(pages) {
 		pdfContainer.innerHTML = "";
-		for (const url of urls) {
+		for (const page of pages) {
+			if (page.tiles) {
+				pdfContainer.appendChild(createTiledPage(page));
+				continue;
+			}
+			// Let the browser pick the smallest tier that is sharp at the
+			// size the page is displayed, phones never fetch the zoom tier
 			const img = document.createElement("img");
-			img.src = url;
+			img.src = page.screen.url;
+			img.srcset = ["thumbnail", "screen", "zoom"]
+				.map((tier) => `${page[tier].url} ${page[tier].width}w`)
+				.join(", ");
+			img.sizes = `${pdfContainer.clientWidth}px`;
+			// Known dimensions keep the layout, and the scroll tracking, stable
+			// while the lazily loaded pages come in
+			img.width = page.screen.width;
+			img.height = page.screen.height;
+			img.loading = "lazy";
 			img.style.width = "100%";
-			img.onload = () => console.log("Loaded image:", url);
-			img.onerror = (err) => console.error("Error loading image:", url, err);
+			img.style.height = "auto";
+			img.onload = () => console.log("Loaded page:", page.page_number);
+			retryOnError(img, page.page_number);
 			pdfContainer.appendChild(img);
 		}
 	}
 
+	function retryOnError(img, pageNumber, attempts = 5) {
+		// Under load the server answers 503 to renders it cannot fit in
+		// rather than slowing down, retry them with a growing delay
+		let attempt = 0;
+		img.onerror = (err) => {
+			console.error("Error loading page:", pageNumber, err);
+			if (attempt >= attempts) {
+				return;
+			}
+			const { src, srcset } = img;
+			img.removeAttribute("srcset");
+			img.removeAttribute("src");
+			setTimeout(
+				() => {
+					if (srcset) {
+						img.srcset = srcset;
+					}
+					img.src = src;
+				},
+				2000 * 2 ** attempt++,
+			);
+		};
+	}
+
+	function createTiledPage(page) {
+		// Large-format pages are made of tiles of the first level at least as
+		// sharp as the displayed page, lazily loaded so that only the visible
+		// ones are fetched
+		const { tile_size: tileSize, levels, url } = page.tiles;
+		const displayWidth = pdfContainer.clientWidth * window.devicePixelRatio;
+		let level = levels.findIndex((candidate) => candidate.width >= displayWidth);
+		if (level < 0) {
+			level = levels.length - 1;
+		}
+		const { width, height, columns, rows } = levels[level];
+		const container = document.createElement("div");
+		container.style.position = "relative";
+		container.style.width = "100%";
+		container.style.aspectRatio = `${width} / ${height}`;
+		container.style.backgroundImage = `url("${page.thumbnail.url}")`;
+		container.style.backgroundSize = "100% 100%";
+		for (let row = 0; row < rows; row++) {
+			for (let column = 0; column < columns; column++) {
+				const tile = document.createElement("img");
+				tile.src = url
+					.replace("{level}", level)
+					.replace("{column}", column)
+					.replace("{row}", row);
+				tile.loading = "lazy";
+				retryOnError(tile, page.page_number);
+				tile.style.position = "absolute";
+				tile.style.left = `${((column * tileSize) / width) * 100}%`;
+				tile.style.top = `${((row * tileSize) / height) * 100}%`;
+				tile.style.width = `${(Math.min(tileSize, width - column * tileSize) / width) * 100}%`;
+				tile.style.height = `${(Math.min(tileSize, height - row * tileSize) / height) * 100}%`;
+				container.appendChild(tile);
+			}
+		}
+		return container;
+	}
+
 	function attachScrollListener(index) {
 		console.log(`Attaching scroll listener to document ${index}`);
 		pdfContainer.addEventListener("scroll", () => checkScrollToEnd(index), {
@@ -152,10 +259,9 @@ async function initializeSignaturePage(email, signatureRequestId) {
             verifyOtpBtn.disabled = false;
             if (response.ok) {
                 const data = await response.json();
-                alert(data.message);
                 $("#otpModal").modal("hide");
                 resetModal();
-                window.location.href = "/api/v1/signe/success"; // Redirect to the success page
+                await waitForFinalization(data.job_id);
             } else {
                 const errorData = await response.json();
                 alert(`Failed to verify OTP: ${errorData.detail}`);
@@ -166,6 +272,31 @@ async function initializeSignaturePage(email, signatureRequestId) {
         }
     }
 
+	async function waitForFinalization(jobId) {
+		// The signed documents are produced by a background worker, poll
+		// until it reports the job as done or failed
+		const token = new URLSearchParams(window.location.search).get("token");
+		while (true) {
+			const response = await fetch(
+				`/api/v1/signe/finalization/${jobId}?token=${encodeURIComponent(token)}`,
+			);
+			const job = await response.json();
+			if (!response.ok) {
+				alert(`Failed to follow the signature: ${job.detail}`);
+				return;
+			}
+			if (job.status === "done") {
+				window.location.href = "/api/v1/signe/success"; // Redirect to the success page
+				return;
+			}
+			if (job.status === "failed") {
+				alert(`Failed to finalize the documents: ${job.error}`);
+				return;
+			}
+			await new Promise((resolve) => setTimeout(resolve, 2000));
+		}
+	}
+
 	function resetModal() {
 		otpInput.value = "";
 		otpInput.disabled = true;
@@ -16,6 +16,7 @@ export type { Body_documents_update_document } from './models/Body_documents_upd
 export type { Body_documents_verify_otp } from './models/Body_documents_verify_otp';
 export type { Body_login_login_access_token } from './models/Body_login_login_access_token';
 export type { DocumentOut } from './models/DocumentOut';
+export type { DocumentPageOut } from './models/DocumentPageOut';
 export type { DocumentSignatureDetailsOut } from './models/DocumentSignatureDetailsOut';
 export type { DocumentStatus } from './models/DocumentStatus';
 export type { FieldCreate } from './models/FieldCreate';
@@ -42,6 +43,8 @@ export type { SignatureRequestStatus } from './models/SignatureRequestStatus';
 export type { SignatureRequestUpdate } from './models/SignatureRequestUpdate';
 export type { Token } from './models/Token';
 export type { UpdatePassword } from './models/UpdatePassword';
+export type { UploadSessionCreate } from './models/UploadSessionCreate';
+export type { UploadSessionOut } from './models/UploadSessionOut';
 export type { UserCreate } from './models/UserCreate';
 export type { UserCreateOpen } from './models/UserCreateOpen';
 export type { UserOut } from './models/UserOut';
@@ -59,6 +62,7 @@ export { $Body_documents_update_document } from './schemas/$Body_documents_updat
 export { $Body_documents_verify_otp } from './schemas/$Body_documents_verify_otp';
 export { $Body_login_login_access_token } from './schemas/$Body_login_login_access_token';
 export { $DocumentOut } from './schemas/$DocumentOut';
+export { $DocumentPageOut } from './schemas/$DocumentPageOut';
 export { $DocumentSignatureDetailsOut } from './schemas/$DocumentSignatureDetailsOut';
 export { $DocumentStatus } from './schemas/$DocumentStatus';
 export { $FieldCreate } from './schemas/$FieldCreate';
@@ -85,6 +89,8 @@ export { $SignatureRequestStatus } from './schemas/$SignatureRequestStatus';
 export { $SignatureRequestUpdate } from './schemas/$SignatureRequestUpdate';
 export { $Token } from './schemas/$Token';
 export { $UpdatePassword } from './schemas/$UpdatePassword';
+export { $UploadSessionCreate } from './schemas/$UploadSessionCreate';
+export { $UploadSessionOut } from './schemas/$UploadSessionOut';
 export { $UserCreate } from './schemas/$UserCreate';
 export { $UserCreateOpen } from './schemas/$UserCreateOpen';
 export { $UserOut } from './schemas/$UserOut';
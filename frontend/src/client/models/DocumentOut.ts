@@ -3,6 +3,7 @@
 /* tslint:disable */
 /* eslint-disable */
 
+import type { DocumentPageOut } from './DocumentPageOut';
 import type { DocumentSignatureDetailsOut } from './DocumentSignatureDetailsOut';
 import type { DocumentStatus } from './DocumentStatus';
 import type { UserOut } from './UserOut';
@@ -41,5 +42,13 @@ export type DocumentOut = {
      */
     owner: UserOut;
     signature_details?: (DocumentSignatureDetailsOut | null);
+    /**
+     * Number of pages, unknown for older documents
+     */
+    page_count?: (number | null);
+    /**
+     * Size and rotation of each page
+     */
+    pages?: Array<DocumentPageOut>;
 };
 
@@ -0,0 +1,24 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+export type DocumentPageOut = {
+    /**
+     * 1-indexed page number
+     */
+    page_number: number;
+    /**
+     * Width of the page in PDF points
+     */
+    width: number;
+    /**
+     * Height of the page in PDF points
+     */
+    height: number;
+    /**
+     * Rotation of the page in degrees
+     */
+    rotation?: number;
+};
+
@@ -0,0 +1,26 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+import type { DocumentStatus } from './DocumentStatus';
+
+export type UploadSessionCreate = {
+    /**
+     * Title of the document
+     */
+    title: string;
+    /**
+     * Status of the document
+     */
+    status: DocumentStatus;
+    /**
+     * Name of the uploaded file
+     */
+    filename: string;
+    /**
+     * Size of the file in bytes
+     */
+    size: number;
+};
+
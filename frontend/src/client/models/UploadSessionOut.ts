@@ -0,0 +1,28 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+
+export type UploadSessionOut = {
+    /**
+     * Identifier of the upload session
+     */
+    id: string;
+    /**
+     * Name of the uploaded file
+     */
+    filename: string;
+    /**
+     * Size of the file in bytes
+     */
+    size: number;
+    /**
+     * Bytes received so far
+     */
+    offset: number;
+    /**
+     * Time after which an unfinished upload is deleted
+     */
+    expires_at: string;
+};
+
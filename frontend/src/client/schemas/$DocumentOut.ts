@@ -64,5 +64,21 @@ export const $DocumentOut = {
                 type: 'null',
             }],
         },
+        page_count: {
+            type: 'any-of',
+            description: `Number of pages, unknown for older documents`,
+            contains: [{
+                type: 'number',
+            }, {
+                type: 'null',
+            }],
+        },
+        pages: {
+            type: 'array',
+            description: `Size and rotation of each page`,
+            contains: {
+                type: 'DocumentPageOut',
+            },
+        },
     },
 } as const;
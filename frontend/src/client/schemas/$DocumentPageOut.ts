@@ -0,0 +1,27 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+export const $DocumentPageOut = {
+    properties: {
+        page_number: {
+            type: 'number',
+            description: `1-indexed page number`,
+            isRequired: true,
+        },
+        width: {
+            type: 'number',
+            description: `Width of the page in PDF points`,
+            isRequired: true,
+        },
+        height: {
+            type: 'number',
+            description: `Height of the page in PDF points`,
+            isRequired: true,
+        },
+        rotation: {
+            type: 'number',
+            description: `Rotation of the page in degrees`,
+        },
+    },
+} as const;
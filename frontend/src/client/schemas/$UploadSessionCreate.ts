@@ -0,0 +1,28 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+export const $UploadSessionCreate = {
+    properties: {
+        title: {
+            type: 'string',
+            description: `Title of the document`,
+            isRequired: true,
+        },
+        status: {
+            type: 'DocumentStatus',
+            description: `Status of the document`,
+            isRequired: true,
+        },
+        filename: {
+            type: 'string',
+            description: `Name of the uploaded file`,
+            isRequired: true,
+        },
+        size: {
+            type: 'number',
+            description: `Size of the file in bytes`,
+            isRequired: true,
+        },
+    },
+} as const;
@@ -0,0 +1,34 @@
+/* generated using openapi-typescript-codegen -- do no edit */
+/* istanbul ignore file */
+/* tslint:disable */
+/* eslint-disable */
+export const $UploadSessionOut = {
+    properties: {
+        id: {
+            type: 'string',
+            description: `Identifier of the upload session`,
+            isRequired: true,
+        },
+        filename: {
+            type: 'string',
+            description: `Name of the uploaded file`,
+            isRequired: true,
+        },
+        size: {
+            type: 'number',
+            description: `Size of the file in bytes`,
+            isRequired: true,
+        },
+        offset: {
+            type: 'number',
+            description: `Bytes received so far`,
+            isRequired: true,
+        },
+        expires_at: {
+            type: 'string',
+            description: `Time after which an unfinished upload is deleted`,
+            isRequired: true,
+            format: 'date-time',
+        },
+    },
+} as const;
@@ -6,6 +6,9 @@ import type { Body_documents_send_otp } from '../models/Body_documents_send_otp'
 import type { Body_documents_update_document } from '../models/Body_documents_update_document';
 import type { Body_documents_verify_otp } from '../models/Body_documents_verify_otp';
 import type { DocumentOut } from '../models/DocumentOut';
+import type { Message } from '../models/Message';
+import type { UploadSessionCreate } from '../models/UploadSessionCreate';
+import type { UploadSessionOut } from '../models/UploadSessionOut';
 import { Body_documents_create_document } from "../../client/models/Body_documents_create_document"
 
 import type { CancelablePromise } from '../core/CancelablePromise';
@@ -35,6 +38,134 @@ export class DocumentsService {
         });
     }
 
+    /**
+     * Create Upload Session
+     * Start a resumable upload, for large files over unreliable connections.
+     * @returns UploadSessionOut Successful Response
+     * @throws ApiError
+     */
+    public static createUploadSession({
+        requestBody,
+    }: {
+        requestBody: UploadSessionCreate,
+    }): CancelablePromise<UploadSessionOut> {
+        return __request(OpenAPI, {
+            method: 'POST',
+            url: '/api/v1/documents/uploads',
+            body: requestBody,
+            mediaType: 'application/json',
+            errors: {
+                413: `File too large`,
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Read Upload Session
+     * Progress of a resumable upload: `offset` is where to resume it from.
+     * @returns UploadSessionOut Successful Response
+     * @throws ApiError
+     */
+    public static readUploadSession({
+        uploadId,
+    }: {
+        uploadId: string,
+    }): CancelablePromise<UploadSessionOut> {
+        return __request(OpenAPI, {
+            method: 'GET',
+            url: '/api/v1/documents/uploads/{upload_id}',
+            path: {
+                'upload_id': uploadId,
+            },
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Upload Document Chunk
+     * Append the raw bytes of a chunk to a resumable upload, sent from its
+     * current offset.
+     * @returns UploadSessionOut Successful Response
+     * @throws ApiError
+     */
+    public static uploadDocumentChunk({
+        uploadId,
+        uploadOffset,
+        chunk,
+    }: {
+        uploadId: string,
+        uploadOffset: number,
+        chunk: Blob,
+    }): CancelablePromise<UploadSessionOut> {
+        return __request(OpenAPI, {
+            method: 'PATCH',
+            url: '/api/v1/documents/uploads/{upload_id}',
+            path: {
+                'upload_id': uploadId,
+            },
+            headers: {
+                'Upload-Offset': uploadOffset,
+            },
+            body: chunk,
+            mediaType: 'application/offset+octet-stream',
+            errors: {
+                409: `Offset mismatch`,
+                413: `Chunk past the end of the upload`,
+                415: `Not a PDF`,
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Finalize Document Upload
+     * Create the document of a complete resumable upload.
+     * @returns DocumentOut Successful Response
+     * @throws ApiError
+     */
+    public static finalizeDocumentUpload({
+        uploadId,
+    }: {
+        uploadId: string,
+    }): CancelablePromise<DocumentOut> {
+        return __request(OpenAPI, {
+            method: 'POST',
+            url: '/api/v1/documents/uploads/{upload_id}/finalize',
+            path: {
+                'upload_id': uploadId,
+            },
+            errors: {
+                409: `Upload incomplete`,
+                422: `Validation Error`,
+            },
+        });
+    }
+
+    /**
+     * Cancel Document Upload
+     * @returns Message Successful Response
+     * @throws ApiError
+     */
+    public static cancelDocumentUpload({
+        uploadId,
+    }: {
+        uploadId: string,
+    }): CancelablePromise<Message> {
+        return __request(OpenAPI, {
+            method: 'DELETE',
+            url: '/api/v1/documents/uploads/{upload_id}',
+            path: {
+                'upload_id': uploadId,
+            },
+            errors: {
+                422: `Validation Error`,
+            },
+        });
+    }
+
 
     /**
      * Read Documents
@@ -141,8 +272,10 @@ export class DocumentsService {
      */
     public static downloadDocument({
         documentId,
+        v,
     }: {
         documentId: number,
+        v?: (string | null),
     }): CancelablePromise<any> {
         return __request(OpenAPI, {
             method: 'GET',
@@ -150,6 +283,9 @@ export class DocumentsService {
             path: {
                 'document_id': documentId,
             },
+            query: {
+                'v': v,
+            },
             errors: {
                 422: `Validation Error`,
             },
@@ -163,8 +299,10 @@ export class DocumentsService {
      */
     public static getDocumentFile({
         documentId,
+        v,
     }: {
         documentId: number,
+        v?: (string | null),
     }): CancelablePromise<any> {
         return __request(OpenAPI, {
             method: 'GET',
@@ -172,6 +310,9 @@ export class DocumentsService {
             path: {
                 'document_id': documentId,
             },
+            query: {
+                'v': v,
+            },
             errors: {
                 422: `Validation Error`,
             },